@@ -0,0 +1,80 @@
+"""
+**********
+Benchmarks
+**********
+
+Scripts measuring the hot paths of the business logic against a local 
+database. Run them from the root of the project, e.g.::
+
+    python -m benchmarks.inventory --url postgresql://tickee@localhost/tickee_bench
+
+The scripts fill the database with generated accounts, events and orders, so
+never point them to a database that is in use.
+"""
+from celery import current_app
+from tickee.accounts.processing import create_account
+from tickee.core.currency.manager import lookup_currency_by_iso_code
+from tickee.core.currency.processing import create_currency
+from tickee.events.eventparts.processing import add_eventpart
+from tickee.events.processing import start_event
+from tickee.manage import load_database
+from tickee.subscriptions.models import Subscription, FREE
+from tickee.tickettypes.processing import create_tickettype, link_tickettype_to_event
+import logging
+import sqlahelper
+import tickee.exceptions as ex
+import time
+import transaction
+import uuid
+
+DEFAULT_URL = 'sqlite:///benchmark.db'
+
+Session = sqlahelper.get_session()
+
+
+def setup(url=DEFAULT_URL):
+    """ Connects to the benchmark database and runs celery tasks inline. """
+    logging.basicConfig(level=logging.WARNING)
+    current_app.conf.CELERY_ALWAYS_EAGER = True
+    load_database({'url': url})
+
+
+def seed_tickettype(units, price=0):
+    """ Creates an account with an event and an active tickettype and returns
+    the ids of the account and the tickettype. """
+    try:
+        lookup_currency_by_iso_code("EUR")
+    except ex.CurrencyNotFoundError:
+        create_currency("EUR", "Euro")
+    account = create_account("bench-%s" % uuid.uuid4().hex[:12], "bench@example.com")
+    account.subscription = Subscription(FREE)
+    event = start_event(account.id, "Benchmark")
+    add_eventpart(event.id)
+    tickettype = create_tickettype(price, units)
+    tickettype.is_active = True
+    link_tickettype_to_event(tickettype, event)
+    Session.flush()
+    result = (account.id, tickettype.id)
+    transaction.commit()
+    return result
+
+
+class Timer(object):
+    """ Context manager measuring the wall clock time of a block. """
+    
+    def __enter__(self):
+        self.start = time.time()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.elapsed = time.time() - self.start
+
+
+def report(title, rows):
+    """ Prints a list of (label, value) tuples as a table. """
+    print title
+    print "-" * len(title)
+    width = max(len(label) for label, value in rows)
+    for label, value in rows:
+        print "%s  %s" % (label.ljust(width), value)
+    print
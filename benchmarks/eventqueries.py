@@ -0,0 +1,116 @@
+"""
+Event query benchmark
+=====================
+
+    Seeds an event with 100,000 tickets and compares the event scoped
+    queries joining Ticket, TicketOrder, TicketType,
+    TicketTypeEventPartAssociation and EventPart with the queries filtering
+    on the denormalized ``event_id``. Prints the plan and the timings of
+    both::
+
+        python -m benchmarks.eventqueries --tickets 100000 --repeat 5
+"""
+from benchmarks import DEFAULT_URL, Session, Timer, report, seed_tickettype, setup
+from optparse import OptionParser
+from tickee.accounts.manager import lookup_account_by_id
+from tickee.db.models.eventpart import EventPart
+from tickee.db.models.order import Order
+from tickee.db.models.ticketorder import TicketOrder
+from tickee.db.models.tickettype import TicketType, TicketTypeEventPartAssociation
+from tickee.db.models.user import User
+from tickee.orders.processing import start_order, add_tickets
+from tickee.orders.states import PURCHASED
+from tickee.tickets.models import Ticket
+from tickee.tickets.tasks import create_tickets
+from tickee.tickettypes.manager import lookup_tickettype_by_id
+from tickee.users.processing import create_user
+import transaction
+import uuid
+
+
+def seed_event(tickets, order_size):
+    """ Creates an event with purchased orders for an amount of tickets and
+    returns the id of the event. """
+    account_id, tickettype_id = seed_tickettype(tickets)
+    event_id = lookup_tickettype_by_id(tickettype_id).get_event().id
+    for i in range(0, tickets, order_size):
+        user = create_user("bench-%s@example.com" % uuid.uuid4().hex[:12])
+        order = start_order(user, lookup_account_by_id(account_id))
+        add_tickets(order, tickettype_id, min(order_size, tickets - i))
+        order.checkout()
+        order.purchase()
+        Session.flush()
+        create_tickets(order)
+        transaction.commit()
+    return event_id
+
+
+def queries(event_id):
+    """ Returns (name, joined query, denormalized query) tuples. """
+    return [
+        ("tickets",
+         Session.query(Ticket).join(TicketOrder, TicketType, TicketTypeEventPartAssociation, EventPart)\
+                .filter(EventPart.event_id==event_id),
+         Session.query(Ticket).filter(Ticket.event_id==event_id)),
+        ("visitors",
+         Session.query(User).join(Ticket, TicketOrder, TicketType, TicketTypeEventPartAssociation, EventPart)\
+                .filter(EventPart.event_id==event_id).distinct(),
+         Session.query(User).join(Ticket).filter(Ticket.event_id==event_id).distinct()),
+        ("orders",
+         Session.query(Order).join(TicketOrder, TicketType, TicketTypeEventPartAssociation, EventPart)\
+                .filter(Order.status==PURCHASED).filter(EventPart.event_id==event_id),
+         Session.query(Order).join(TicketOrder)\
+                .filter(Order.status==PURCHASED).filter(TicketOrder.event_id==event_id)),
+    ]
+
+
+def explain(query):
+    """ Returns the plan of the database for a query as a list of lines. """
+    dialect = Session.bind.dialect
+    compiled = query.statement.compile(dialect=dialect)
+    params = compiled.construct_params()
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    if dialect.name == 'postgresql':
+        prefix = "EXPLAIN ANALYZE "
+    else:
+        prefix = "EXPLAIN QUERY PLAN "
+    rows = Session.connection().execute(prefix + unicode(compiled), params)
+    return [" ".join(unicode(column) for column in row) for row in rows]
+
+
+def measure(query, repeat):
+    """ Returns the best time of fetching all rows of a query. """
+    timings = []
+    for i in range(repeat):
+        with Timer() as timer:
+            query.all()
+        timings.append(timer.elapsed)
+        Session.expunge_all()
+    return min(timings)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("--url", default=DEFAULT_URL, help="database url")
+    parser.add_option("--tickets", type="int", default=100000, help="tickets of the event")
+    parser.add_option("--order-size", type="int", default=100, help="tickets per order")
+    parser.add_option("--repeat", type="int", default=5, help="runs per query")
+    options, args = parser.parse_args()
+
+    setup(options.url)
+    event_id = seed_event(options.tickets, options.order_size)
+
+    rows = [("database", options.url), ("tickets", options.tickets)]
+    for name, joined, denormalized in queries(event_id):
+        for label, query in (("joined", joined), ("event_id", denormalized)):
+            report("%s (%s)" % (name, label), [("plan", line) for line in explain(query)])
+        before = measure(joined, options.repeat)
+        after = measure(denormalized, options.repeat)
+        rows.append((name, "%.1f ms joined, %.1f ms event_id, %.1fx"\
+                           % (before * 1000, after * 1000, before / after)))
+    report("event scoped queries: best of %s" % options.repeat, rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Inventory concurrency benchmark
+===============================
+
+    Drives ``tickee.orders.processing.add_tickets`` from a pool of processes
+    against a single tickettype and reports the throughput. Afterwards the
+    inventory counters are compared with the ticketorders to verify that the
+    tickettype was never oversold::
+
+        python -m benchmarks.inventory --processes 8 --orders 250 --shards 8
+"""
+from benchmarks import DEFAULT_URL, Session, Timer, report, seed_tickettype, setup
+from multiprocessing import Pool
+from optparse import OptionParser
+from sqlalchemy.exc import OperationalError, DBAPIError
+from tickee.accounts.manager import lookup_account_by_id
+from tickee.orders.processing import start_order, add_tickets
+from tickee.tickettypes import inventory
+from tickee.tickettypes.manager import lookup_tickettype_by_id
+import tickee.exceptions as ex
+import transaction
+
+
+def order_tickets(job):
+    """ Starts a number of orders each claiming an amount of tickets. Returns
+    the amount of accepted, refused and failed orders. """
+    account_id, tickettype_id, orders, amount = job
+    accepted = refused = failed = 0
+    for i in range(orders):
+        try:
+            account = lookup_account_by_id(account_id)
+            order = start_order(None, account)
+            add_tickets(order, tickettype_id, amount)
+            transaction.commit()
+        except ex.AmountNotAvailableError:
+            transaction.abort()
+            refused += 1
+        except (OperationalError, DBAPIError):
+            # lock timeouts or serialization failures of the database
+            transaction.abort()
+            failed += 1
+        else:
+            accepted += 1
+    return accepted, refused, failed
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("--url", default=DEFAULT_URL, help="database url")
+    parser.add_option("--processes", type="int", default=4)
+    parser.add_option("--orders", type="int", default=100, help="orders per process")
+    parser.add_option("--amount", type="int", default=2, help="tickets per order")
+    parser.add_option("--units", type="int", default=None,
+                      help="units of the tickettype, defaults to 75% of the requested tickets")
+    parser.add_option("--shards", type="int", default=1, help="inventory shards")
+    options, args = parser.parse_args()
+
+    requested = options.processes * options.orders * options.amount
+    units = options.units or requested * 3 / 4
+
+    setup(options.url)
+    account_id, tickettype_id = seed_tickettype(units)
+    if options.shards > 1:
+        inventory.shard(lookup_tickettype_by_id(tickettype_id), options.shards)
+        transaction.commit()
+
+    jobs = [(account_id, tickettype_id, options.orders, options.amount)] * options.processes
+    pool = Pool(options.processes, initializer=setup, initargs=(options.url,))
+    with Timer() as timer:
+        results = pool.map(order_tickets, jobs)
+    pool.close()
+    pool.join()
+    accepted, refused, failed = map(sum, zip(*results))
+
+    tickettype = lookup_tickettype_by_id(tickettype_id)
+    held, purchased = inventory.get_counts(tickettype)
+    ordered_held, ordered_purchased = tickettype.count_ordered_units()
+    Session.remove()
+
+    report("add_tickets: %s processes, %s shards" % (options.processes, options.shards),
+           [("database", options.url),
+            ("units", units),
+            ("orders", options.processes * options.orders),
+            ("accepted", accepted),
+            ("refused", refused),
+            ("failed", failed),
+            ("seconds", "%.2f" % timer.elapsed),
+            ("orders/second", "%.1f" % ((accepted + refused) / timer.elapsed)),
+            ("inventory held", held),
+            ("ticketorders held", ordered_held),
+            ("oversold", "YES" if ordered_held + ordered_purchased > units else "no")])
+    if (held, purchased) != (ordered_held, ordered_purchased):
+        print "WARNING: inventory counters do not match the ticketorders"
+
+
+if __name__ == "__main__":
+    main()
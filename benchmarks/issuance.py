@@ -0,0 +1,63 @@
+"""
+Ticket issuance benchmark
+=========================
+
+    Measures ``tickee.tickets.tasks.create_tickets`` for purchased orders of
+    1, 10, 100 and 1,000 tickets::
+
+        python -m benchmarks.issuance --repeat 5
+"""
+from benchmarks import DEFAULT_URL, Timer, report, seed_tickettype, setup
+from optparse import OptionParser
+from tickee.accounts.manager import lookup_account_by_id
+from tickee.orders.manager import lookup_order_by_id
+from tickee.orders.processing import start_order, add_tickets
+from tickee.tickets.tasks import create_tickets
+from tickee.users.processing import create_user
+import transaction
+import uuid
+
+ORDER_SIZES = (1, 10, 100, 1000)
+
+
+def purchased_order(account_id, tickettype_id, amount):
+    """ Creates a purchased order for an amount of tickets and returns its id. """
+    user = create_user("bench-%s@example.com" % uuid.uuid4().hex[:12])
+    order = start_order(user, lookup_account_by_id(account_id))
+    order.is_gifted = True
+    add_tickets(order, tickettype_id, amount)
+    order.checkout()
+    order.purchase()
+    order_id = order.id
+    transaction.commit()
+    return order_id
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("--url", default=DEFAULT_URL, help="database url")
+    parser.add_option("--repeat", type="int", default=5, help="orders per size")
+    options, args = parser.parse_args()
+
+    setup(options.url)
+    account_id, tickettype_id = seed_tickettype(sum(ORDER_SIZES) * options.repeat)
+
+    rows = [("database", options.url)]
+    for size in ORDER_SIZES:
+        timings = []
+        for i in range(options.repeat):
+            order_id = purchased_order(account_id, tickettype_id, size)
+            order = lookup_order_by_id(order_id)
+            with Timer() as timer:
+                create_tickets(order)
+                transaction.commit()
+            timings.append(timer.elapsed)
+        best = min(timings)
+        rows.append(("%s tickets" % size,
+                     "%.1f ms best, %.1f ms mean, %.0f tickets/second"\
+                     % (best * 1000, sum(timings) / len(timings) * 1000, size / best)))
+    report("create_tickets: %s orders per size" % options.repeat, rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Scanner manifest benchmark
+==========================
+
+    Seeds an event with 50,000 tickets of which a tenth is scanned and
+    measures building its full manifest and a delta after a new order::
+
+        python -m benchmarks.manifest --tickets 50000 --repeat 5
+"""
+from benchmarks import DEFAULT_URL, Session, Timer, report, setup
+from benchmarks.eventqueries import seed_event
+from optparse import OptionParser
+from tickee.scanning.manifest import build_manifest
+from tickee.scanning.models import TicketScan
+from tickee.tickets.models import Ticket
+import transaction
+
+
+def seed_scans(event_id, every):
+    """ Scans every so many tickets of an event. """
+    ticket_ids = [ticket_id for (ticket_id,) in Session.query(Ticket.id)\
+                                                       .filter(Ticket.event_id==event_id)\
+                                                       .order_by(Ticket.id)]
+    for ticket_id in ticket_ids[::every]:
+        scan = TicketScan()
+        scan.ticket_id = ticket_id
+        Session.add(scan)
+    transaction.commit()
+
+
+def measure(repeat, *args, **kwargs):
+    """ Returns the best time of building a manifest and its size. """
+    timings = []
+    for i in range(repeat):
+        with Timer() as timer:
+            data, version = build_manifest(*args, **kwargs)
+        timings.append(timer.elapsed)
+        Session.expunge_all()
+    return min(timings), len(data), version
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("--url", default=DEFAULT_URL, help="database url")
+    parser.add_option("--tickets", type="int", default=50000, help="tickets of the event")
+    parser.add_option("--order-size", type="int", default=100, help="tickets per order")
+    parser.add_option("--scanned-every", type="int", default=10, help="scan every n-th ticket")
+    parser.add_option("--repeat", type="int", default=5, help="runs per manifest")
+    options, args = parser.parse_args()
+
+    setup(options.url)
+    event_id = seed_event(options.tickets, options.order_size)
+    seed_scans(event_id, options.scanned_every)
+
+    elapsed, size, version = measure(options.repeat, event_id)
+    rows = [("database", options.url), ("tickets", options.tickets),
+            ("full", "%.1f ms, %s bytes, version %s" % (elapsed * 1000, size, version))]
+    elapsed, size, version = measure(options.repeat, event_id, since=version)
+    rows.append(("delta", "%.1f ms, %s bytes, version %s" % (elapsed * 1000, size, version)))
+    report("scanner manifest: best of %s" % options.repeat, rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Scanning benchmark
+==================
+
+    Seeds an event with tickets and scans every ticket once through the
+    ``scanning.scan`` entrypoint, then once more to measure the rejection of
+    duplicates, and uploads the same amount of scans in batches through
+    ``scanning.upload``::
+
+        python -m benchmarks.scanning --tickets 5000 --batch-size 1000
+"""
+from benchmarks import DEFAULT_URL, Session, Timer, report, setup
+from benchmarks.eventqueries import seed_event
+from optparse import OptionParser
+from tickee.core.db import execute
+from tickee.scanning.entrypoints import ticket_scan, upload_scans
+from tickee.scanning.models import TicketScan
+from tickee.tickets.models import Ticket
+import time
+import transaction
+
+
+def codes_of_event(event_id):
+    """ Returns the codes of the tickets of an event. """
+    return [ticket.get_code() for ticket in Session.query(Ticket)\
+                                                   .filter(Ticket.event_id==event_id)\
+                                                   .order_by(Ticket.id)]
+
+
+def scan_each(codes):
+    """ Scans the tickets one by one and returns the elapsed time and the 
+    amount of errors. """
+    errors = 0
+    with Timer() as timer:
+        for code in codes:
+            if ticket_scan(None, code, time.time(), dict(device="bench")) is not True:
+                errors += 1
+    return timer.elapsed, errors
+
+
+def upload(event_id, codes, batch_size):
+    """ Uploads the scans of the tickets in batches and returns the elapsed
+    time and the amount of accepted scans. """
+    accepted = 0
+    with Timer() as timer:
+        for i in range(0, len(codes), batch_size):
+            scans = [dict(code=code, timestamp=time.time(), device="bench")
+                     for code in codes[i:i + batch_size]]
+            accepted += upload_scans(None, event_id, scans)['accepted']
+    return timer.elapsed, accepted
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("--url", default=DEFAULT_URL, help="database url")
+    parser.add_option("--tickets", type="int", default=5000, help="tickets of the event")
+    parser.add_option("--order-size", type="int", default=100, help="tickets per order")
+    parser.add_option("--batch-size", type="int", default=1000, help="scans per upload")
+    options, args = parser.parse_args()
+
+    setup(options.url)
+    event_id = seed_event(options.tickets, options.order_size)
+    codes = codes_of_event(event_id)
+
+    rows = [("database", options.url), ("tickets", len(codes))]
+    elapsed, errors = scan_each(codes)
+    rows.append(("scan", "%.0f scans/s, %s errors" % (len(codes) / elapsed, errors)))
+    elapsed, errors = scan_each(codes)
+    rows.append(("scan duplicates", "%.0f scans/s, %s rejected" % (len(codes) / elapsed, errors)))
+    execute(TicketScan.__table__.delete())
+    transaction.commit()
+    elapsed, accepted = upload(event_id, codes, options.batch_size)
+    rows.append(("upload", "%.0f scans/s, %s accepted" % (len(codes) / elapsed, accepted)))
+    report("scanning", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,9 @@ CELERY_RESULT_BACKEND = "amqp"
 CELERY_IMPORTS = (
     'tickee.users.tasks',
     'tickee.orders.tasks',
+    'tickee.paymentproviders.inbox',
+    'tickee.core.mail.outbox',
+    'tickee.core.crm.tasks',
     'tickee.tickets.tasks',
     'tickee.events.tasks',
     'tickee.tickets.entrypoints',
@@ -26,6 +29,7 @@ CELERY_IMPORTS = (
     'tickee.paymentproviders.entrypoints',
     'tickee.users.entrypoints',
     'tickee.subscriptions.entrypoints',
+    'tickee.core.crm.entrypoints',
     'pyramid_oauth2.oauth2.authorization'
 )
 
@@ -34,6 +38,26 @@ CELERYBEAT_SCHEDULE = {
         "task": "tickee.orders.tasks.timeout_sessions",
         "schedule": datetime.timedelta(seconds=30)
     },
+    "issuance-resume": {
+        "task": "tickee.orders.tasks.resume_issuance",
+        "schedule": datetime.timedelta(minutes=1)
+    },
+    "notifications-resume": {
+        "task": "tickee.paymentproviders.inbox.resume_notifications",
+        "schedule": datetime.timedelta(minutes=1)
+    },
+    "availability-flush": {
+        "task": "tickee.tickettypes.tasks.flush_availability",
+        "schedule": datetime.timedelta(seconds=30)
+    },
+    "outbox-dispatch": {
+        "task": "tickee.core.mail.outbox.dispatch_outbox",
+        "schedule": datetime.timedelta(seconds=10)
+    },
+    "crm-rotate": {
+        "task": "tickee.core.crm.tasks.rotate_crm_events",
+        "schedule": datetime.timedelta(days=1)
+    },
     "event-in-48-hours-notification": {
         "task": "routine.event_in_48_hours_reminder",
         "schedule": datetime.timedelta(hours=1)
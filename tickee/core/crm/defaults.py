@@ -0,0 +1,15 @@
+# buffered crm events are written once this amount of events is buffered, or
+# once the oldest buffered event is this amount of seconds old.
+CRM_FLUSH_SIZE = 500
+CRM_FLUSH_INTERVAL = 5
+# while the events cannot be written, at most this amount of events is kept
+# buffered. the oldest events are dropped beyond it.
+CRM_BUFFER_LIMIT = 20000
+
+# events older than this amount of days are summarized per day and moved to
+# the monthly archive tables.
+CRM_DETAIL_RETENTION_DAYS = 90
+
+# amount of events returned by a page of a crm timeline.
+CRM_TIMELINE_LIMIT = 50
+CRM_TIMELINE_MAX_LIMIT = 500
@@ -0,0 +1,76 @@
+from celery.task import task
+from tickee.core import entrypoint
+from tickee.core.crm.defaults import CRM_TIMELINE_LIMIT, CRM_TIMELINE_MAX_LIMIT
+from tickee.core.crm.manager import lookup_timeline, lookup_daily_summaries
+from tickee.core.crm.marshalling import crmdump_to_dict, summary_to_dict, \
+    crmdump_to_cursor, cursor_to_key
+from tickee.core.security.oauth2.manager import lookup_account_for_client
+from tickee.events.permissions import require_event_owner
+from tickee.orders.manager import lookup_order_by_id
+import datetime
+import tickee.exceptions as ex
+
+
+@task(name="crm.timeline")
+@entrypoint()
+def crm_timeline(client_id, object_name=None, object_id=None, since=None, until=None,
+                 cursor=None, limit=CRM_TIMELINE_LIMIT, include_summaries=False):
+    """
+    Returns a page of the events of an object or of a time range, most
+    recent first.
+
+    Args:
+        object_name, object_id (optional):
+            only events of this object, e.g. "order" and its id.
+        since, until (optional):
+            unix timestamps limiting the time range.
+        cursor (optional):
+            the ``next`` cursor of the previous page.
+        limit (optional):
+            maximum amount of events in the page, at most
+            ``CRM_TIMELINE_MAX_LIMIT``.
+        include_summaries (optional):
+            also return the daily summaries of archived events of the object.
+
+    Returns:
+        dict(events=[...], next=<cursor of the next page or None>)
+    """
+    if client_id is not None:
+        require_object_owner(client_id, object_name, object_id)
+
+    since_datetime = until_datetime = None
+    if since is not None:
+        since_datetime = datetime.datetime.utcfromtimestamp(float(since))
+    if until is not None:
+        until_datetime = datetime.datetime.utcfromtimestamp(float(until))
+    before = cursor_to_key(cursor) if cursor else None
+    limit = min(int(limit), CRM_TIMELINE_MAX_LIMIT)
+
+    events = lookup_timeline(object_name, object_id, since_datetime, until_datetime,
+                             before, limit)
+    result = dict(events=map(crmdump_to_dict, events),
+                  next=crmdump_to_cursor(events[-1]) if len(events) == limit else None)
+    if include_summaries and object_id is not None:
+        summaries = lookup_daily_summaries(object_name, object_id,
+                                           since_datetime and since_datetime.date(),
+                                           until_datetime and until_datetime.date())
+        result['summaries'] = map(summary_to_dict, summaries)
+    return result
+
+
+def require_object_owner(client_id, object_name, object_id):
+    """Checks if the account of the requesting client owns the object of a
+    timeline. Timelines of other objects or of all objects are internal."""
+    if object_id is None:
+        raise ex.PermissionDenied("You are not allowed to see this timeline.")
+    if object_name == "event":
+        require_event_owner(client_id, object_id)
+    elif object_name == "order":
+        try:
+            account = lookup_account_for_client(client_id)
+        except ex.AccountNotFoundError:
+            raise ex.PermissionDenied("Your client is not connected to an account.")
+        if lookup_order_by_id(object_id).account_id != account.id:
+            raise ex.PermissionDenied("You are not the owner of the order.")
+    else:
+        raise ex.PermissionDenied("You are not allowed to see this timeline.")
@@ -0,0 +1,53 @@
+from sqlalchemy.sql.expression import and_, or_
+from tickee.core.crm.defaults import CRM_TIMELINE_LIMIT, CRM_TIMELINE_MAX_LIMIT
+from tickee.core.crm.models import CrmDump, CrmDailySummary
+import sqlahelper
+
+Session = sqlahelper.get_session()
+
+
+def lookup_timeline(object_name=None, object_id=None, since=None, until=None,
+                    before=None, limit=CRM_TIMELINE_LIMIT):
+    """
+    Returns a page of crm events, most recent first. Events can be filtered
+    on the object they concern and on the moment they happened.
+
+    Args:
+        object_name, object_id:
+            only events of this kind of object (and this object).
+        since, until:
+            only events logged in this time range (datetimes).
+        before:
+            ``(logged_at, id)`` of the last event of the previous page.
+        limit:
+            maximum amount of events in the page.
+    """
+    limit = min(limit, CRM_TIMELINE_MAX_LIMIT)
+    query = Session.query(CrmDump)
+    if object_name is not None:
+        query = query.filter(CrmDump.object_name==object_name)
+        if object_id is not None:
+            query = query.filter(CrmDump.object_id==object_id)
+    if since is not None:
+        query = query.filter(CrmDump.logged_at >= since)
+    if until is not None:
+        query = query.filter(CrmDump.logged_at < until)
+    if before is not None:
+        logged_at, dump_id = before
+        query = query.filter(or_(CrmDump.logged_at < logged_at,
+                                 and_(CrmDump.logged_at==logged_at,
+                                      CrmDump.id < dump_id)))
+    return query.order_by(CrmDump.logged_at.desc(), CrmDump.id.desc())\
+                .limit(limit).all()
+
+
+def lookup_daily_summaries(object_name, object_id, since=None, until=None):
+    """ Returns the daily summaries of an object, most recent first. """
+    query = Session.query(CrmDailySummary)\
+                   .filter(CrmDailySummary.object_name==object_name)\
+                   .filter(CrmDailySummary.object_id==object_id)
+    if since is not None:
+        query = query.filter(CrmDailySummary.day >= since)
+    if until is not None:
+        query = query.filter(CrmDailySummary.day < until)
+    return query.order_by(CrmDailySummary.day.desc(), CrmDailySummary.action).all()
@@ -0,0 +1,34 @@
+from tickee.core.marshalling import date
+import datetime
+
+CURSOR_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+def crmdump_to_dict(crmdump):
+    """
+    Transforms a ``CrmDump`` object into a dictionary.
+    """
+    result = dict()
+    result['id'] = crmdump.id
+    result['logged_at'] = date(crmdump.logged_at)
+    result['object_name'] = crmdump.object_name
+    result['object_id'] = crmdump.object_id
+    result['data'] = crmdump.json
+    return result
+
+def summary_to_dict(summary):
+    """
+    Transforms a ``CrmDailySummary`` object into a dictionary.
+    """
+    return dict(day=summary.day.isoformat(),
+                action=summary.action,
+                amount=summary.amount)
+
+def crmdump_to_cursor(crmdump):
+    """ Returns the cursor of the page following an event. """
+    return "%s|%s" % (crmdump.logged_at.strftime(CURSOR_FORMAT), crmdump.id)
+
+def cursor_to_key(cursor):
+    """ Returns the (logged_at, id) of the event of a cursor. """
+    logged_at, crmdump_id = cursor.split("|")
+    return datetime.datetime.strptime(logged_at, CURSOR_FORMAT), int(crmdump_id)
@@ -4,8 +4,8 @@ Created on Jun 9, 2011
 @author: Kevin Van Wilder <kevin@tick.ee>
 '''
 
-from sqlalchemy.schema import Column
-from sqlalchemy.types import Integer, String, DateTime
+from sqlalchemy.schema import Column, Index, UniqueConstraint
+from sqlalchemy.types import Integer, String, DateTime, Date
 from tickee.core.db.types import JSONEncodedDict
 import datetime
 import sqlahelper
@@ -15,6 +15,9 @@ Base = sqlahelper.get_base()
 
 class CrmDump(Base):
     """
+    Event that happened to an object. Events older than 
+    ``CRM_DETAIL_RETENTION_DAYS`` are moved to monthly archive tables by
+    ``tickee.core.crm.processing.rotate_crm``.
     """
     
     __tablename__ = 'tickee_crmdump'
@@ -31,4 +34,38 @@ class CrmDump(Base):
         self.object_name = name
         self.object_id = object_id
         self.logged_at = datetime.datetime.utcnow()
-        self.json = dict_object
\ No newline at end of file
+        self.json = dict_object
+
+
+Index('ix_tickee_crmdump_object_logged_at', CrmDump.object_name, CrmDump.object_id, CrmDump.logged_at)
+Index('ix_tickee_crmdump_logged_at', CrmDump.logged_at)
+
+
+class CrmDailySummary(Base):
+    """
+    Amount of events with the same action that happened to an object on a
+    day, kept after the events themselves are archived.
+    """
+    
+    __tablename__ = 'tickee_crm_daily_summaries'
+    __table_args__ = (UniqueConstraint('day', 'object_name', 'object_id', 'action'), {})
+    
+    # Columns
+    
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, index=True)
+    object_name = Column(String)
+    object_id = Column(Integer)
+    action = Column(String)
+    amount = Column(Integer)
+    
+    def __init__(self, day, object_name, object_id, action, amount=0):
+        self.day = day
+        self.object_name = object_name
+        self.object_id = object_id
+        self.action = action
+        self.amount = amount
+
+
+Index('ix_tickee_crm_daily_summaries_object', CrmDailySummary.object_name,
+      CrmDailySummary.object_id, CrmDailySummary.day)
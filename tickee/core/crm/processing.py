@@ -0,0 +1,111 @@
+from sqlalchemy.schema import MetaData, Table, Column
+from sqlalchemy.sql.expression import func
+from sqlalchemy.types import Integer, String, DateTime
+from tickee.core.crm.defaults import CRM_DETAIL_RETENTION_DAYS
+from tickee.core.crm.models import CrmDump, CrmDailySummary
+from tickee.core.db import execute
+from tickee.core.db.types import JSONEncodedDict
+import datetime
+import logging
+import sqlahelper
+import transaction
+
+Session = sqlahelper.get_session()
+
+blogger = logging.getLogger('blm.crm')
+
+crmdump = CrmDump.__table__
+
+# archive tables are not part of the models, they are created when needed
+archive_metadata = MetaData()
+
+
+def get_archive_table(day):
+    """ Returns the archive table of the month of a day, creating it if it
+    does not exist yet. """
+    name = "%s_%04d_%02d" % (crmdump.name, day.year, day.month)
+    archive = archive_metadata.tables.get(name)
+    if archive is None:
+        archive = Table(name, archive_metadata,
+                        Column('id', Integer, primary_key=True),
+                        Column('logged_at', DateTime),
+                        Column('object_name', String),
+                        Column('object_id', Integer),
+                        Column('json', JSONEncodedDict))
+    archive.create(bind=Session.connection(), checkfirst=True)
+    return archive
+
+
+def summarize_day(day):
+    """
+    Adds the amount of events of every action per object of a day to the
+    daily summaries.
+
+    Returns:
+        The amount of summarized events.
+    """
+    start = datetime.datetime.combine(day, datetime.time())
+    end = start + datetime.timedelta(days=1)
+    amounts = dict()
+    events = Session.query(CrmDump.object_name, CrmDump.object_id, CrmDump.json)\
+                    .filter(CrmDump.logged_at >= start)\
+                    .filter(CrmDump.logged_at < end)\
+                    .yield_per(1000)
+    total = 0
+    for object_name, object_id, data in events:
+        action = data.get('action') if isinstance(data, dict) else None
+        key = (object_name, object_id, action)
+        amounts[key] = amounts.get(key, 0) + 1
+        total += 1
+    for (object_name, object_id, action), amount in amounts.iteritems():
+        summary = Session.query(CrmDailySummary)\
+                         .filter(CrmDailySummary.day==day)\
+                         .filter(CrmDailySummary.object_name==object_name)\
+                         .filter(CrmDailySummary.object_id==object_id)\
+                         .filter(CrmDailySummary.action==action).first()
+        if summary is None:
+            summary = CrmDailySummary(day, object_name, object_id, action)
+            Session.add(summary)
+        summary.amount += amount
+    return total
+
+
+def archive_day(day):
+    """
+    Moves the events of a day to the archive table of its month.
+
+    Returns:
+        The amount of archived events.
+    """
+    start = datetime.datetime.combine(day, datetime.time())
+    end = start + datetime.timedelta(days=1)
+    archive = get_archive_table(day)
+    columns = "id, logged_at, object_name, object_id, json"
+    execute("INSERT INTO %s (%s) SELECT %s FROM %s WHERE logged_at >= :start AND logged_at < :end"\
+            % (archive.name, columns, columns, crmdump.name), dict(start=start, end=end))
+    deleted = execute(crmdump.delete().where(crmdump.c.logged_at >= start)\
+                                      .where(crmdump.c.logged_at < end))
+    return deleted.rowcount
+
+
+def rotate_crm(retention_days=CRM_DETAIL_RETENTION_DAYS):
+    """
+    Summarizes and archives the events older than an amount of days, one day
+    per transaction.
+
+    Returns:
+        The amount of archived events.
+    """
+    cutoff = datetime.datetime.utcnow().date() - datetime.timedelta(days=int(retention_days))
+    total = 0
+    while True:
+        oldest = Session.query(func.min(CrmDump.logged_at)).scalar()
+        if oldest is None or oldest.date() >= cutoff:
+            break
+        day = oldest.date()
+        summarize_day(day)
+        archived = archive_day(day)
+        transaction.commit()
+        blogger.info("archived %s crm events of %s" % (archived, day))
+        total += archived
+    return total
@@ -1,8 +1,33 @@
-from tickee.core.crm.models import CrmDump
-import sqlahelper
+from celery.task import task
+from tickee.core.crm.processing import rotate_crm
+from tickee.core.crm.writer import get_writer
+import datetime
+import transaction
+import weakref
 
-Session = sqlahelper.get_session()
+# crm events of the running transactions, handed to the writer on commit
+_pending = weakref.WeakKeyDictionary()
 
 def log_crm(object_name, object_id, data_dict):
-    crmdata = CrmDump(object_name, object_id, data_dict)
-    Session.add(crmdata)
\ No newline at end of file
+    """ Records a crm event. The event is buffered by the crm writer once the
+    current transaction commits, and is dropped if it aborts. """
+    current = transaction.get()
+    entries = _pending.get(current)
+    if entries is None:
+        entries = _pending[current] = []
+        current.addAfterCommitHook(write_after_commit, (entries,))
+    entries.append(dict(logged_at=datetime.datetime.utcnow(),
+                        object_name=object_name,
+                        object_id=object_id,
+                        json=data_dict))
+
+def write_after_commit(success, entries):
+    if success and entries:
+        get_writer().add(entries)
+
+# Asynchronous Tasks
+
+@task(ignore_result=True)
+def rotate_crm_events():
+    """ Summarizes and archives old crm events. """
+    return rotate_crm()
@@ -0,0 +1,225 @@
+"""
+CRM Writer
+==========
+
+    Buffers the crm events of a worker in memory and writes them to
+    ``tickee_crmdump`` in bulk, once ``CRM_FLUSH_SIZE`` events are buffered
+    or the oldest buffered event is ``CRM_FLUSH_INTERVAL`` seconds old. On
+    PostgreSQL the events are written with COPY, other databases receive a
+    single executemany INSERT.
+
+    Every buffered event is first appended to a journal file of the worker
+    in ``settings.CRM_JOURNAL_DIR``, which is emptied after each successful
+    flush. Journals left behind by a worker that stopped before flushing are
+    written to the database by the next writer that starts.
+
+    A failed flush is tried again after ``CRM_FLUSH_INTERVAL`` seconds. While
+    the events cannot be written, the buffer and the journal hold at most
+    ``CRM_BUFFER_LIMIT`` events, the oldest events are dropped beyond it.
+"""
+from StringIO import StringIO
+from tickee.core.crm.defaults import CRM_FLUSH_SIZE, CRM_FLUSH_INTERVAL, \
+    CRM_BUFFER_LIMIT
+from tickee.core.crm.models import CrmDump
+import datetime
+import errno
+import glob
+import logging
+import os
+import simplejson
+import sqlahelper
+import threading
+import tickee.settings
+
+tlogger = logging.getLogger('technical')
+
+crmdump = CrmDump.__table__
+
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+class CrmWriter(object):
+    """ Buffered writer of the crm events of the current process. """
+
+    def __init__(self, journal_dir, flush_size=CRM_FLUSH_SIZE,
+                 flush_interval=CRM_FLUSH_INTERVAL, buffer_limit=CRM_BUFFER_LIMIT):
+        self.journal_dir = journal_dir
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.buffer_limit = buffer_limit
+        self.pid = os.getpid()
+        self.buffer = []
+        self.lock = threading.RLock()
+        self.timer = None
+        if not os.path.isdir(journal_dir):
+            os.makedirs(journal_dir)
+        self.journal_path = os.path.join(journal_dir, "crm-%s.journal" % self.pid)
+        self.recover()
+        self.journal = open(self.journal_path, 'a')
+
+    def add(self, entries):
+        """ Buffers crm events, given as dicts with the columns of a
+        ``CrmDump``. """
+        with self.lock:
+            for entry in entries:
+                self.journal.write(dump_entry(entry) + "\n")
+            self.journal.flush()
+            self.buffer.extend(entries)
+            if len(self.buffer) >= self.flush_size:
+                self.flush()
+            elif self.timer is None:
+                self.schedule_flush()
+            if len(self.buffer) > self.buffer_limit:
+                self.drop_oldest()
+
+    def schedule_flush(self):
+        """ Flushes the buffer after ``flush_interval`` seconds. """
+        self.timer = threading.Timer(self.flush_interval, self.flush)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def drop_oldest(self):
+        """
+        Drops the oldest events of a buffer that grew beyond its limit. Room
+        is made for another ``flush_size`` events, so the journal is not
+        rewritten for every added event.
+        """
+        with self.lock:
+            kept = max(self.buffer_limit - self.flush_size, 0)
+            dropped = len(self.buffer) - kept
+            self.buffer = self.buffer[dropped:]
+            self.journal.seek(0)
+            self.journal.truncate()
+            for entry in self.buffer:
+                self.journal.write(dump_entry(entry) + "\n")
+            self.journal.flush()
+            tlogger.error("dropped %s unwritten crm events, the buffer is full" % dropped)
+
+    def flush(self):
+        """
+        Writes the buffered events to the database. The events stay buffered
+        if writing fails and are written again after ``flush_interval``
+        seconds.
+
+        Returns:
+            The amount of written events.
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.buffer:
+                return 0
+            try:
+                write_entries(self.buffer)
+            except Exception:
+                tlogger.exception("failed writing %s crm events" % len(self.buffer))
+                self.schedule_flush()
+                return 0
+            amount = len(self.buffer)
+            self.buffer = []
+            self.journal.seek(0)
+            self.journal.truncate()
+            tlogger.debug("wrote %s crm events" % amount)
+            return amount
+
+    def recover(self):
+        """
+        Writes the events in the journals of stopped processes to the
+        database.
+
+        Returns:
+            The amount of recovered events.
+        """
+        recovered = 0
+        for path in glob.glob(os.path.join(self.journal_dir, "crm-*.journal")):
+            pid = int(os.path.basename(path)[4:-8])
+            if pid != self.pid and is_running(pid):
+                continue
+            # claim the journal, other writers recovering at the same time
+            # skip it
+            claimed_path = "%s.%s" % (path, self.pid)
+            try:
+                os.rename(path, claimed_path)
+            except OSError:
+                continue
+            with open(claimed_path) as journal:
+                entries = [load_entry(line) for line in journal if line.strip()]
+            if entries:
+                write_entries(entries)
+            os.remove(claimed_path)
+            recovered += len(entries)
+        if recovered:
+            tlogger.warning("recovered %s crm events from journals" % recovered)
+        return recovered
+
+    def close(self):
+        self.flush()
+        self.journal.close()
+
+
+def write_entries(entries):
+    """ Inserts crm events in a transaction of its own. """
+    engine = sqlahelper.get_engine()
+    connection = engine.connect()
+    try:
+        trans = connection.begin()
+        if engine.dialect.name == 'postgresql':
+            copy_entries(connection, entries)
+        else:
+            connection.execute(crmdump.insert(), entries)
+        trans.commit()
+    finally:
+        connection.close()
+
+def copy_entries(connection, entries):
+    """ Inserts crm events using COPY. """
+    data = StringIO()
+    for entry in entries:
+        data.write("\t".join([copy_value(entry['logged_at'].strftime(DATETIME_FORMAT)),
+                              copy_value(entry['object_name']),
+                              copy_value(entry['object_id']),
+                              copy_value(simplejson.dumps(entry['json'], use_decimal=True))]))
+        data.write("\n")
+    data.seek(0)
+    cursor = connection.connection.cursor()
+    cursor.copy_expert("COPY %s (logged_at, object_name, object_id, json) FROM STDIN"
+                       % crmdump.name, data)
+
+def copy_value(value):
+    """ Escapes a value for the text format of COPY. """
+    if value is None:
+        return "\\N"
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t")\
+                     .replace("\n", "\\n").replace("\r", "\\r")
+
+def dump_entry(entry):
+    entry = dict(entry, logged_at=entry['logged_at'].strftime(DATETIME_FORMAT))
+    return simplejson.dumps(entry, use_decimal=True)
+
+def load_entry(line):
+    entry = simplejson.loads(line, use_decimal=True)
+    entry['logged_at'] = datetime.datetime.strptime(entry['logged_at'], DATETIME_FORMAT)
+    return entry
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+# writer of the current process, buffers are not shared with forked workers
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    """ Returns the crm writer of the current process. """
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer.pid != os.getpid():
+            _writer = CrmWriter(tickee.settings.CRM_JOURNAL_DIR)
+        return _writer
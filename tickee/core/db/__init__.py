@@ -0,0 +1,66 @@
+from sqlalchemy import event
+from sqlalchemy.orm import object_mapper
+from sqlalchemy.orm.properties import RelationshipProperty
+from zope.sqlalchemy import mark_changed
+from zope.sqlalchemy.datamanager import _SESSION_STATE
+import sqlahelper
+
+Session = sqlahelper.get_session()
+
+
+def execute(statement, params=None):
+    """
+    Executes a core statement on the current session. Statements executed 
+    this way bypass the unit of work, so a session that joined the zope
+    transaction is marked as changed to make sure the transaction commits
+    them. Sessions outside of it are left to their owner to commit.
+    """
+    result = Session.execute(statement, params)
+    session = Session()
+    if id(session) in _SESSION_STATE:
+        mark_changed(session)
+    return result
+
+
+def enable_sqlite_savepoints(engine):
+    """
+    Stops pysqlite from beginning and committing transactions by itself, 
+    which discards the savepoints of ``Session.begin_nested``. SQLite begins 
+    a transaction for the first savepoint instead.
+    """
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+
+def forget_deleted(model, column, values):
+    """
+    Removes the instances of a model whose rows were deleted by a core
+    statement from the session, i.e. the loaded instances whose column has
+    one of the values. Only the loaded relations of other instances that
+    still refer to them are expired, the rest of the session is untouched.
+
+    Core statements do not see pending changes, so the caller flushes the
+    session before deleting the rows. Otherwise instances added to it would
+    be inserted afterwards, referring to the deleted rows.
+    """
+    values = set(values)
+    deleted = set(instance for instance in Session.identity_map.values()
+                  if isinstance(instance, model) and instance.__dict__.get(column) in values)
+    if not deleted:
+        return
+    for instance in deleted:
+        Session.expunge(instance)
+    for instance in list(Session.identity_map.values()):
+        expired = []
+        for prop in object_mapper(instance).iterate_properties:
+            if not isinstance(prop, RelationshipProperty) \
+               or not issubclass(prop.mapper.class_, model) \
+               or prop.key not in instance.__dict__:
+                continue
+            value = instance.__dict__[prop.key]
+            related = value if prop.uselist else [value]
+            if deleted.intersection(related or []):
+                expired.append(prop.key)
+        if expired:
+            Session.expire(instance, expired)
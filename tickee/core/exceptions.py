@@ -14,4 +14,10 @@ class ApplicationError(Exception):
         if self.message:
             return self.message
         else:
-            return self.__doc__
\ No newline at end of file
+            return self.__doc__
+
+class HttpError(CoreError):
+    """The external service could not be reached or returned an error."""
+    
+class CircuitOpenError(HttpError):
+    """The external service is failing, requests are refused for now."""
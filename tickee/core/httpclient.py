@@ -0,0 +1,212 @@
+"""
+Outbound HTTP
+=============
+
+    Shared client for the requests Tickee makes to payment providers and
+    other external services. Every service gets its own ``HttpClient`` by
+    calling ``get_client``, which keeps:
+
+        -  a pool of keep-alive connections per host, so consecutive
+           requests do not pay a new TCP and TLS handshake;
+        -  connect and read timeouts, so a slow service never pins a worker;
+        -  retries with exponential backoff and jitter for requests that
+           can safely be sent again;
+        -  a circuit breaker that fails requests immediately while the
+           service keeps failing, giving it ``reset_timeout`` seconds to
+           recover before a trial request is let through;
+        -  a latency histogram per endpoint, available through ``statistics``.
+"""
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.exceptions import NewConnectionError
+from tickee.core.exceptions import HttpError, CircuitOpenError
+import logging
+import random
+import requests
+import threading
+import time
+
+tlogger = logging.getLogger('technical')
+
+CONNECT_TIMEOUT = 5 # seconds
+READ_TIMEOUT = 20 # seconds
+RETRIES = 2
+RETRY_BACKOFF = 0.5 # seconds, doubled for every retry
+POOL_SIZE = 10 # connections kept alive per host
+BREAKER_THRESHOLD = 5 # consecutive failures opening the circuit
+BREAKER_RESET_TIMEOUT = 30 # seconds before a trial request is allowed
+
+# upper bounds of the latency histogram buckets in milliseconds
+LATENCY_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class CircuitBreaker(object):
+    """
+    Counts consecutive failures of a service. Once ``threshold`` failures
+    occurred the circuit opens and requests are refused until
+    ``reset_timeout`` seconds have passed. A single trial request is then
+    allowed: it closes the circuit when it succeeds and opens it again when
+    it fails.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        """ Returns True if a request may be sent. """
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.time() - self.opened_at >= self.reset_timeout:
+                # let a single trial request through
+                self.opened_at = time.time()
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.time()
+
+
+class Histogram(object):
+    """ Counts observations in buckets of increasing upper bounds. """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.total += value
+
+    def to_dict(self):
+        bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+        return dict(count=self.count,
+                    mean=self.total / self.count if self.count else 0,
+                    buckets=zip(bounds, self.counts))
+
+
+class HttpClient(object):
+    """ Client of a single external service. """
+
+    def __init__(self, name, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 retries=RETRIES, retry_backoff=RETRY_BACKOFF, pool_size=POOL_SIZE,
+                 breaker=None):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.histograms = dict()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, url, endpoint=None, **kwargs):
+        return self.request('GET', url, endpoint, idempotent=True, **kwargs)
+
+    def post(self, url, data=None, endpoint=None, idempotent=False, **kwargs):
+        return self.request('POST', url, endpoint, idempotent=idempotent, data=data, **kwargs)
+
+    def request(self, method, url, endpoint=None, idempotent=False, **kwargs):
+        """
+        Sends a request to the service and returns the response.
+
+        Requests are only sent again after a failure if they are
+        ``idempotent``, others are only retried when the connection could
+        not be made and nothing was sent. A connection that breaks after the
+        request was sent is not retried, the service may have handled it.
+        Responses with a server error status count as failures.
+
+        Raises:
+            CircuitOpenError: the service is failing and was not contacted.
+            HttpError: the service could not be reached.
+        """
+        endpoint = endpoint or method
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError("%s is unavailable." % self.name)
+            start = time.time()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.ConnectionError as e:
+                error, retry = e, idempotent or failed_to_connect(e)
+            except requests.RequestException as e:
+                error, retry = e, idempotent
+            else:
+                if response.status_code < 500:
+                    self._observe(endpoint, start)
+                    self.breaker.success()
+                    return response
+                error = HttpError("%s answered %s" % (self.name, response.status_code))
+                retry = idempotent
+            self._observe(endpoint, start)
+            self.breaker.failure()
+            if not retry or attempt >= self.retries:
+                tlogger.error("request to %s (%s) failed: %s" % (self.name, endpoint, error))
+                if isinstance(error, HttpError):
+                    raise error
+                raise HttpError("%s could not be reached: %s" % (self.name, error))
+            attempt += 1
+            delay = self.retry_backoff * (2 ** (attempt - 1))
+            time.sleep(delay / 2 + random.uniform(0, delay / 2))
+
+    def _observe(self, endpoint, start):
+        histogram = self.histograms.get(endpoint)
+        if histogram is None:
+            histogram = self.histograms[endpoint] = Histogram()
+        histogram.observe((time.time() - start) * 1000)
+
+
+def failed_to_connect(error):
+    """ Returns True if a ``ConnectionError`` occurred before the request was
+    sent, because no connection to the service could be made. """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+# clients of this process by name
+_clients = dict()
+_clients_lock = threading.Lock()
+
+
+def get_client(name, **options):
+    """ Returns the client of a service, creating it on first use. """
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            client = _clients[name] = HttpClient(name, **options)
+        return client
+
+
+def statistics():
+    """ Returns the latency histograms of all endpoints by service. """
+    return dict((name, dict((endpoint, histogram.to_dict())
+                            for endpoint, histogram in client.histograms.iteritems()))
+                for name, client in _clients.items())
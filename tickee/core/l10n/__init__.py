@@ -44,6 +44,26 @@ def get_translation(reference_id, language="en"):
     else:
         return ""
 
+def get_translation_texts(reference_ids, language="en"):
+    """
+    Returns the translation strings of several resources at once as a 
+    dictionary mapping their reference ids to the strings.
+    """
+    reference_ids = set(reference_ids)
+    texts = dict.fromkeys(reference_ids, "")
+    if reference_ids:
+        translations = Session.query(TextLocalisation.reference_id, TextLocalisation.text)\
+                              .filter(TextLocalisation.reference_id.in_(reference_ids))\
+                              .filter(TextLocalisation.lang==language)\
+                              .order_by(TextLocalisation.id)
+        # the first translation of a resource wins, like ``get_translation``
+        found = set()
+        for reference_id, text in translations:
+            if reference_id not in found:
+                texts[reference_id] = text
+                found.add(reference_id)
+    return texts
+
 def get_translation_object(reference_id, language="en"):
     """
     Returns the TextLocalisation object for a specific resource and language.
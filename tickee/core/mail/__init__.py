@@ -3,22 +3,44 @@ from email.Header import Header
 from email.MIMEText import MIMEText
 from email.Utils import parseaddr, formataddr
 from email.mime.multipart import MIMEMultipart
-from smtplib import SMTP
 from tickee.core.exceptions import CoreError
+from tickee.core.mail.transport import SMTPTransport
 import logging
+import os
 import tickee.settings
 
 tlogger = logging.getLogger('technical')
 
+# transport of the current process, sessions are not shared with forked workers
+_transport = None
+
+def get_transport():
+    """Returns the SMTP transport of the current process."""
+    global _transport
+    if _transport is None or _transport.pid != os.getpid():
+        _transport = SMTPTransport(tickee.settings.SMTP_SERVERS)
+    return _transport
+
 def send_email(sender, recipient, subject, body, body_plain="", noreply=False):
-    """Send an email.
+    """Send an email immediately, see ``build_message`` for the arguments.
+    Mails sent as part of a transaction are queued with 
+    ``tickee.core.mail.outbox.queue_email`` instead."""
+    message = build_message(sender, recipient, subject, body, body_plain)
+
+    # Send the message via one of the configured smtp servers, reusing the
+    # open session of the server. If all servers fail, throw an error
+    if get_transport().send(sender, recipient, message) is None:
+        raise CoreError('Failed sending email.')
+
+def build_message(sender, recipient, subject, body, body_plain=""):
+    """Build the MIME encoded message of an email.
 
     All arguments should be Unicode strings (plain ASCII works as well).
 
     Only the real name part of sender and recipient addresses may contain
     non-ASCII characters.
 
-    The email will be properly MIME encoded and delivered though SMTP.
+    The email will be properly MIME encoded.
 
     The charset of the email will be the first one out of US-ASCII, ISO-8859-1
     and UTF-8 that can represent all the characters occurring in the email.
@@ -59,22 +81,4 @@ def send_email(sender, recipient, subject, body, body_plain="", noreply=False):
     msg['From'] = formataddr((sender_name, sender_addr))
     msg['To'] = formataddr((recipient_name, recipient_addr))
     msg['Subject'] = Header(unicode(subject), header_charset)
-
-    # Send the message via SMTP via one of the configured smtp servers
-    # If all servers fail, throw an error
-    sent = False
-    for smtp_server in tickee.settings.SMTP_SERVERS:
-        try:
-            smtp = SMTP(smtp_server.get('host'), smtp_server.get('port'))
-            smtp.starttls()
-            smtp.login(smtp_server.get('username'), smtp_server.get('password'))
-            smtp.sendmail(sender, recipient, msg.as_string())
-            smtp.quit()
-        except Exception as e:
-            tlogger.error("failed sending mail to '%s' using smtp '%s'" % (recipient, smtp_server.get('name')))
-            continue # continue to the next smtp server
-        else:
-            sent = True
-            break # stop trying to send the mail
-    if not sent:
-        raise CoreError('Failed sending email.')
\ No newline at end of file
+    return msg.as_string()
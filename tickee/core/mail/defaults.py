@@ -0,0 +1,11 @@
+# maximum amount of mails claimed from the outbox per run of the dispatcher.
+OUTBOX_BATCH_SIZE = 200
+
+# a claimed mail that was not sent after this amount of seconds is claimed
+# again, e.g. after a worker was stopped while sending.
+OUTBOX_CLAIM_TIMEOUT = 600
+
+# failed mails are retried after OUTBOX_RETRY_DELAY seconds, doubled for 
+# every failed attempt, and given up after OUTBOX_MAX_ATTEMPTS attempts.
+OUTBOX_RETRY_DELAY = 60
+OUTBOX_MAX_ATTEMPTS = 8
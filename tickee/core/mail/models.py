@@ -0,0 +1,61 @@
+from sqlalchemy.schema import Column, Index
+from sqlalchemy.types import Integer, String, DateTime, Text, Enum
+from tickee.core.mail.states import MAIL_QUEUED, MAIL_SENDING, MAIL_SENT, \
+    MAIL_FAILED
+import datetime
+import sqlahelper
+
+Base = sqlahelper.get_base()
+
+
+class OutboxMail(Base):
+    """
+    Rendered mail waiting to be sent by ``tickee.core.mail.outbox``. Mails 
+    are added in the transaction of the change they announce, so a mail is 
+    only sent if the change is committed.
+    """
+    
+    __tablename__ = 'tickee_mail_outbox'
+    
+    # Columns
+    
+    id = Column(Integer, primary_key=True)
+    sender = Column(String)
+    recipient = Column(String)
+    subject = Column(String)
+    body = Column(Text)
+    body_plain = Column(Text)
+    status = Column(Enum(MAIL_QUEUED, MAIL_SENDING, MAIL_SENT, MAIL_FAILED,
+                         name='mail_states'))
+    # the mail is (re)sent from this moment on
+    send_after = Column(DateTime)
+    attempts = Column(Integer)
+    last_error = Column(String)
+    smtp_server = Column(String)
+    created_at = Column(DateTime)
+    sent_at = Column(DateTime)
+    # object the mail is about, mails are logged to its crm
+    object_name = Column(String)
+    object_id = Column(Integer, index=True)
+    
+    # Constructor
+    
+    def __init__(self, sender, recipient, subject, body, body_plain="", 
+                 object_name=None, object_id=None):
+        self.sender = sender
+        self.recipient = recipient
+        self.subject = subject
+        self.body = body
+        self.body_plain = body_plain
+        self.status = MAIL_QUEUED
+        self.attempts = 0
+        self.created_at = datetime.datetime.utcnow()
+        self.send_after = self.created_at
+        self.object_name = object_name
+        self.object_id = object_id
+    
+    def __repr__(self):
+        return "<OutboxMail %s: %s (%s)>" % (self.id, self.recipient, self.status)
+
+
+Index('ix_tickee_mail_outbox_status_send_after', OutboxMail.status, OutboxMail.send_after)
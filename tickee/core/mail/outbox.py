@@ -0,0 +1,145 @@
+"""
+Mail Outbox
+===========
+
+    Mails are not sent while the change they announce is being made.
+    ``queue_email`` renders nothing and contacts no SMTP server, it only adds
+    an ``OutboxMail`` to the current transaction. Mails of a transaction that
+    is aborted are therefore never sent, and mails of a committed transaction
+    are sent even if a worker stops right after committing.
+
+    ``dispatch_outbox`` drains the outbox in batches over the SMTP sessions
+    of the worker, limited to the rate of each SMTP server. A mail that could
+    not be sent is retried with an increasing delay and is marked as failed
+    after ``OUTBOX_MAX_ATTEMPTS`` attempts. Every mail keeps its own status.
+"""
+from celery.task import task
+from sqlalchemy.sql.expression import or_, and_
+from tickee.core.crm.tasks import log_crm
+from tickee.core.mail import build_message, get_transport
+from tickee.core.mail.defaults import OUTBOX_BATCH_SIZE, OUTBOX_CLAIM_TIMEOUT, \
+    OUTBOX_RETRY_DELAY, OUTBOX_MAX_ATTEMPTS
+from tickee.core.mail.models import OutboxMail
+from tickee.core.mail.states import MAIL_QUEUED, MAIL_SENDING, MAIL_SENT, \
+    MAIL_FAILED
+import datetime
+import logging
+import sqlahelper
+import transaction
+
+Session = sqlahelper.get_session()
+
+tlogger = logging.getLogger('technical')
+
+
+def queue_email(sender, recipient, subject, body, body_plain="",
+                object_name=None, object_id=None):
+    """
+    Adds a mail to the outbox, it is sent once the transaction is committed.
+    The mail is logged to the crm of the object it is about, if any.
+
+    Returns:
+        The ``OutboxMail``.
+    """
+    mail = OutboxMail(sender, recipient, subject, body, body_plain,
+                      object_name, object_id)
+    Session.add(mail)
+    return mail
+
+
+def claim_mails(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Marks a batch of mails that are due as being sent. A claimed mail that
+    is not sent within ``OUTBOX_CLAIM_TIMEOUT`` seconds is claimed again.
+
+    Returns:
+        List of ``OutboxMail`` objects.
+    """
+    now = datetime.datetime.utcnow()
+    mails = Session.query(OutboxMail)\
+                   .filter(or_(OutboxMail.status==MAIL_QUEUED,
+                               OutboxMail.status==MAIL_SENDING))\
+                   .filter(OutboxMail.send_after <= now)\
+                   .order_by(OutboxMail.send_after)\
+                   .limit(batch_size)\
+                   .with_lockmode('update').all()
+    for mail in mails:
+        mail.status = MAIL_SENDING
+        mail.attempts += 1
+        mail.send_after = now + datetime.timedelta(seconds=OUTBOX_CLAIM_TIMEOUT)
+    return mails
+
+
+def deliver(mail):
+    """
+    Sends a claimed mail and records the outcome.
+
+    Returns:
+        True if the mail was sent.
+    """
+    try:
+        message = build_message(mail.sender, mail.recipient, mail.subject,
+                                mail.body, mail.body_plain or "")
+        smtp_server = get_transport().send(mail.sender, mail.recipient, message)
+        if smtp_server is None:
+            raise Exception("no smtp server accepted the mail")
+    except Exception as e:
+        mail.last_error = repr(e)[:255]
+        if mail.attempts >= OUTBOX_MAX_ATTEMPTS:
+            tlogger.error("giving up sending mail %s to '%s'" % (mail.id, mail.recipient))
+            mail.status = MAIL_FAILED
+            if mail.object_name:
+                log_crm(mail.object_name, mail.object_id, dict(action="mail failed",
+                                                               addressee=mail.recipient))
+        else:
+            delay = OUTBOX_RETRY_DELAY * 2 ** (mail.attempts - 1)
+            mail.status = MAIL_QUEUED
+            mail.send_after = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+        return False
+    else:
+        mail.status = MAIL_SENT
+        mail.smtp_server = smtp_server
+        mail.sent_at = datetime.datetime.utcnow()
+        mail.last_error = None
+        if mail.object_name:
+            log_crm(mail.object_name, mail.object_id, dict(action="mailed",
+                                                           addressee=mail.recipient))
+        return True
+
+
+def lookup_mails(object_name, object_id):
+    """ Returns the mails about an object, most recent first. """
+    return Session.query(OutboxMail).filter(and_(OutboxMail.object_name==object_name,
+                                                 OutboxMail.object_id==object_id))\
+                                    .order_by(OutboxMail.created_at.desc()).all()
+
+
+# Asynchronous Tasks
+
+@task(ignore_result=True)
+def dispatch_outbox(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Sends a batch of mails from the outbox, committing the status of every
+    mail once it is sent.
+
+    Returns:
+        The amount of mails that were sent.
+    """
+    mails = claim_mails(batch_size)
+    mail_ids = [mail.id for mail in mails]
+    transaction.commit()
+    sent = 0
+    for mail_id in mail_ids:
+        try:
+            if deliver(Session.query(OutboxMail).get(mail_id)):
+                sent += 1
+            transaction.commit()
+        except Exception:
+            transaction.abort()
+            tlogger.exception("failed dispatching mail %s" % mail_id)
+    if mail_ids:
+        tlogger.info("outbox dispatched %s mails, %s sent" % (len(mail_ids), sent))
+    # continue while the outbox is full
+    if len(mail_ids) == batch_size:
+        dispatch_outbox.delay(batch_size)
+    return sent
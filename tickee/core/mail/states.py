@@ -0,0 +1,5 @@
+# delivery states of a mail in the outbox
+MAIL_QUEUED = "queued"
+MAIL_SENDING = "sending"
+MAIL_SENT = "sent"
+MAIL_FAILED = "failed"
@@ -0,0 +1,89 @@
+"""
+Mail Templates
+==============
+
+    Renders the mail templates in ``tickee/templates`` using a single Jinja
+    environment per process, so every template is parsed and compiled once
+    instead of for every mail. The templates are compiled when a worker
+    starts, and are stored in ``settings.MAIL_TEMPLATE_CACHE_DIR`` if it is
+    set so a restarted worker does not compile them again.
+
+    The time spent rendering each template is available through
+    ``render_timings``.
+"""
+from celery.signals import worker_init
+from jinja2.bccache import FileSystemBytecodeCache
+from jinja2.environment import Environment
+from jinja2.loaders import PackageLoader
+import logging
+import threading
+import tickee.settings
+import time
+
+tlogger = logging.getLogger('technical')
+
+_environment = None
+_timings = dict()
+_lock = threading.Lock()
+
+
+def get_environment():
+    """ Returns the template environment of the current process. """
+    global _environment
+    with _lock:
+        if _environment is None:
+            bytecode_cache = None
+            if tickee.settings.MAIL_TEMPLATE_CACHE_DIR:
+                bytecode_cache = FileSystemBytecodeCache(tickee.settings.MAIL_TEMPLATE_CACHE_DIR)
+            _environment = Environment(loader=PackageLoader('tickee', 'templates'),
+                                       extensions=['jinja2.ext.with_'],
+                                       cache_size=-1, # keep every template
+                                       auto_reload=False,
+                                       bytecode_cache=bytecode_cache)
+        return _environment
+
+
+def precompile():
+    """
+    Compiles all templates.
+
+    Returns:
+        The amount of compiled templates.
+    """
+    env = get_environment()
+    start = time.time()
+    names = env.list_templates()
+    for name in names:
+        env.get_template(name)
+    tlogger.info("compiled %s mail templates in %.1f ms" % (len(names), (time.time() - start) * 1000))
+    return len(names)
+
+
+def render(template_name, **context):
+    """ Renders the template with the context. """
+    template = get_environment().get_template(template_name)
+    start = time.time()
+    result = template.render(**context)
+    elapsed = time.time() - start
+    with _lock:
+        count, total, slowest = _timings.get(template_name, (0, 0.0, 0.0))
+        _timings[template_name] = (count + 1, total + elapsed, max(slowest, elapsed))
+    return result
+
+
+def render_timings():
+    """ Returns the amount of renders and the mean and maximum render time in
+    milliseconds by template. """
+    with _lock:
+        return dict((name, dict(count=count,
+                                mean=total / count * 1000,
+                                max=slowest * 1000))
+                    for name, (count, total, slowest) in _timings.items())
+
+
+@worker_init.connect
+def precompile_on_worker_init(**kwargs):
+    try:
+        precompile()
+    except Exception:
+        tlogger.exception("failed compiling mail templates")
@@ -0,0 +1,177 @@
+"""
+SMTP Transport
+==============
+
+    Keeps an authenticated session open to each of the configured SMTP
+    servers, so consecutive mails sent by a worker share a single TCP, TLS
+    and AUTH handshake. A session is replaced when the server closes it,
+    answers 421, has been idle for ``IDLE_TIMEOUT`` seconds or has sent
+    ``MAX_MESSAGES_PER_SESSION`` mails.
+
+    Every server has a token bucket limiting the amount of mails sent to it
+    to its ``rate`` per second, with bursts of at most ``burst`` mails. A mail
+    waits until the server accepts it.
+
+    A server that fails is skipped for ``RETRY_AFTER`` seconds, during which
+    mails go to the next server in ``SMTP_SERVERS`` without waiting for the
+    failing one to time out. It is only tried when every server is failing.
+"""
+from smtplib import SMTP, SMTPServerDisconnected, SMTPResponseException
+import logging
+import os
+import socket
+import threading
+import time
+
+tlogger = logging.getLogger('technical')
+
+CONNECT_TIMEOUT = 10 # seconds
+IDLE_TIMEOUT = 60 # seconds an open session is reused
+MAX_MESSAGES_PER_SESSION = 100
+RETRY_AFTER = 60 # seconds a failing server is skipped
+RATE = 5 # mails per second sent to a server without a configured rate
+BURST = 20
+
+
+class TokenBucket(object):
+    """ Allows ``rate`` actions per second with bursts of ``burst`` actions. """
+
+    def __init__(self, rate=RATE, burst=BURST):
+        self.rate = float(rate)
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.time()
+
+    def refill(self):
+        now = time.time()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def consume(self):
+        """ Takes a token, waiting until one is available. """
+        self.refill()
+        if self.tokens < 1:
+            time.sleep((1 - self.tokens) / self.rate)
+            self.refill()
+        self.tokens -= 1
+
+
+class SMTPSession(object):
+    """ Authenticated session with a single SMTP server. """
+
+    def __init__(self, server):
+        self.server = server
+        self.smtp = None
+        self.sent = 0
+        self.last_used = None
+
+    def is_open(self):
+        return self.smtp is not None
+
+    def open(self):
+        smtp = SMTP(self.server.get('host'), self.server.get('port'), timeout=CONNECT_TIMEOUT)
+        if self.server.get('tls', True):
+            smtp.starttls()
+        if self.server.get('username'):
+            smtp.login(self.server.get('username'), self.server.get('password'))
+        self.smtp = smtp
+        self.sent = 0
+        self.last_used = time.time()
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except (SMTPServerDisconnected, SMTPResponseException, socket.error):
+                pass
+        self.smtp = None
+
+    def is_stale(self):
+        return self.sent >= MAX_MESSAGES_PER_SESSION \
+            or time.time() - self.last_used >= IDLE_TIMEOUT
+
+    def sendmail(self, sender, recipient, message):
+        """ Sends the message, opening a new session when the current one
+        is closed or closed by the server while sending. """
+        if self.is_open() and self.is_stale():
+            self.close()
+        reconnected = not self.is_open()
+        if reconnected:
+            self.open()
+        try:
+            self.smtp.sendmail(sender, recipient, message)
+        except (SMTPServerDisconnected, socket.error):
+            self.smtp = None
+            if reconnected:
+                raise
+            self.open()
+            self.smtp.sendmail(sender, recipient, message)
+        except SMTPResponseException as e:
+            if e.smtp_code != 421:
+                raise
+            self.close()
+            if reconnected:
+                raise
+            self.open()
+            self.smtp.sendmail(sender, recipient, message)
+        self.sent += 1
+        self.last_used = time.time()
+
+
+class SMTPTransport(object):
+    """ Sends mails through the first healthy server of a list of servers. """
+
+    def __init__(self, servers):
+        self.servers = servers
+        self.pid = os.getpid()
+        self.sessions = dict()
+        self.buckets = dict((server.get('name'), TokenBucket(server.get('rate', RATE),
+                                                             server.get('burst', BURST)))
+                            for server in servers)
+        self.failed_at = dict()
+        self.lock = threading.Lock()
+
+    def get_servers(self):
+        """ Returns the servers in order of preference, failing servers last. """
+        now = time.time()
+        healthy = []
+        failing = []
+        for server in self.servers:
+            failed_at = self.failed_at.get(server.get('name'))
+            if failed_at is not None and now - failed_at < RETRY_AFTER:
+                failing.append(server)
+            else:
+                healthy.append(server)
+        return healthy + failing
+
+    def send(self, sender, recipient, message):
+        """
+        Sends the message through one of the servers.
+
+        Returns:
+            The name of the server that sent the message, None if every
+            server failed.
+        """
+        with self.lock:
+            for server in self.get_servers():
+                name = server.get('name')
+                session = self.sessions.get(name)
+                if session is None:
+                    session = self.sessions[name] = SMTPSession(server)
+                self.buckets[name].consume()
+                try:
+                    session.sendmail(sender, recipient, message)
+                except Exception as e:
+                    tlogger.error("failed sending mail to '%s' using smtp '%s': %s" % (recipient, name, e))
+                    session.close()
+                    self.failed_at[name] = time.time()
+                    continue # continue to the next smtp server
+                else:
+                    self.failed_at.pop(name, None)
+                    return name
+            return None
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
@@ -1,3 +1,4 @@
+from tickee.core import l10n
 import calendar
 import datetime
 import logging
@@ -23,6 +24,40 @@ def timestamp(datetime_obj):
         return None
 
 
+# BATCHES
+
+class Memo(object):
+    """
+    Remembers the results of the lookups shared by a batch of objects that 
+    are marshalled together, e.g. the event of the tickettype of every 
+    ticket, so every lookup is done once per batch.
+    """
+    
+    def __init__(self):
+        self.results = dict()
+    
+    def __call__(self, function, *args):
+        """ Returns the result of the function for the arguments. """
+        key = (function,) + args
+        if key not in self.results:
+            self.results[key] = function(*args)
+        return self.results[key]
+    
+    def prime(self, function, results):
+        """ Remembers results looked up in bulk, given as a dictionary 
+        mapping tuples of arguments to the results. """
+        for args, result in results.iteritems():
+            self.results[(function,) + args] = result
+
+
+def prime_descriptions(memo, objects, language='en'):
+    """ Looks up the descriptions of a batch of objects having a 
+    ``description_ref`` in a single query. """
+    texts = l10n.get_translation_texts([obj.description_ref for obj in objects], language)
+    memo.prime(l10n.get_translation, dict(((reference_id, language), text)
+                                          for reference_id, text in texts.iteritems()))
+
+
 # ERRORS
 
 
@@ -30,6 +65,8 @@ def error(error):
     """ Default approach to generating error messages. """
     result = dict(error=error.error(),
                   error_number=error.error_number)
+    if getattr(error, 'details', None):
+        result['details'] = error.details
     return result
 
 
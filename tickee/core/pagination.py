@@ -0,0 +1,138 @@
+"""
+Pagination
+==========
+
+    List entrypoints return their results a page at a time. A query is
+    ordered on a unique key, e.g. ``(Ticket.created_at, Ticket.id)``, and a
+    page continues after the key of the last item of the previous page, which
+    is handed to the client as an opaque cursor. Unlike offsets, the cost of
+    a page does not grow with its position and rows inserted in the meantime
+    do not shift the pages.
+
+    ``stream`` walks the same keyset in batches to iterate over a result of
+    any size without loading it at once.
+"""
+from functools import partial
+from sqlalchemy.sql.expression import and_, or_
+import base64
+import datetime
+import simplejson
+import tickee.exceptions as ex
+
+PAGE_LIMIT = 100
+PAGE_MAX_LIMIT = 1000
+STREAM_BATCH_SIZE = 500
+
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+def paginate(query, keys, cursor=None, limit=PAGE_LIMIT):
+    """
+    Returns a page of a query ordered on a unique key.
+
+    Args:
+        query:
+            the query, without ordering.
+        keys:
+            the columns of the key, e.g. ``(Ticket.created_at, Ticket.id)``.
+        cursor (optional):
+            the cursor returned with the previous page.
+        limit (optional):
+            the maximum amount of items of the page.
+
+    Returns:
+        (items, cursor of the next page or None)
+
+    Raises:
+        InvalidCursorError
+    """
+    limit = max(1, min(int(limit), PAGE_MAX_LIMIT))
+    if cursor:
+        query = query.filter(after_key(keys, decode_cursor(cursor, len(keys))))
+    # one more than the limit tells if there is a next page
+    items = query.order_by(*keys).limit(limit + 1).all()
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(key_of(items[-1], keys))
+
+
+def stream(query, keys, batch_size=STREAM_BATCH_SIZE):
+    """
+    Iterates over all items of a query ordered on a unique key. The items
+    are fetched one batch at a time, so only a batch has to fit in memory.
+    Eager loading options of the query apply to every batch.
+    """
+    for items in stream_batches(query, keys, batch_size):
+        for item in items:
+            yield item
+
+
+def stream_batches(query, keys, batch_size=STREAM_BATCH_SIZE):
+    """ Iterates over the batches of items fetched by ``stream``. """
+    key = None
+    while True:
+        batch = query
+        if key is not None:
+            batch = batch.filter(after_key(keys, key))
+        items = batch.order_by(*keys).limit(batch_size).all()
+        if items:
+            yield items
+        if len(items) < batch_size:
+            break
+        key = key_of(items[-1], keys)
+
+
+def list_or_page(query, keys, marshal, name, cursor=None, limit=None, batched=False):
+    """
+    Returns all marshalled items of a query if neither a cursor nor a limit
+    is given, otherwise a page of them as ``{name: [...], next: cursor}``.
+    A ``batched`` marshal function transforms a list of items at once.
+    """
+    if not batched:
+        marshal = partial(map, marshal)
+    if cursor is None and limit is None:
+        result = []
+        for items in stream_batches(query, keys):
+            result.extend(marshal(items))
+        return result
+    items, next_cursor = paginate(query, keys, cursor, limit or PAGE_LIMIT)
+    return {name: marshal(items), 'next': next_cursor}
+
+
+def after_key(keys, values):
+    """ Returns the condition selecting the rows ordered after a key. """
+    conditions = []
+    for i in range(len(keys)):
+        equal = [keys[j]==values[j] for j in range(i)]
+        conditions.append(and_(*(equal + [keys[i] > values[i]])))
+    return or_(*conditions)
+
+
+def key_of(item, keys):
+    """ Returns the values of the key of an item. """
+    return [getattr(item, key.key) for key in keys]
+
+
+def encode_cursor(values):
+    """ Encodes the values of a key into an opaque cursor. """
+    encoded = []
+    for value in values:
+        if isinstance(value, datetime.datetime):
+            value = dict(dt=value.strftime(DATETIME_FORMAT))
+        encoded.append(value)
+    return base64.urlsafe_b64encode(simplejson.dumps(encoded)).rstrip("=")
+
+
+def decode_cursor(cursor, length):
+    """ Decodes a cursor into the values of a key of a length. """
+    try:
+        padded = str(cursor) + "=" * (-len(cursor) % 4)
+        values = simplejson.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(values, list) or len(values) != length:
+            raise ValueError("unexpected length")
+        return [datetime.datetime.strptime(value['dt'], DATETIME_FORMAT)
+                if isinstance(value, dict) else value
+                for value in values]
+    except (TypeError, ValueError, KeyError):
+        raise ex.InvalidCursorError()
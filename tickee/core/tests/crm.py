@@ -0,0 +1,145 @@
+from tickee.core.crm import writer
+from tickee.core.crm.manager import lookup_timeline, lookup_daily_summaries
+from tickee.core.crm.models import CrmDump
+from tickee.core.crm.processing import rotate_crm
+from tickee.core.crm.tasks import log_crm
+from tickee.core.crm.writer import CrmWriter
+from tickee.tests import BaseTestCase
+import datetime
+import os
+import shutil
+import sqlahelper
+import tempfile
+import transaction
+
+Session = sqlahelper.get_session()
+
+
+class CrmWriterTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(CrmWriterTestCase, self).setUp()
+        self.journal_dir = tempfile.mkdtemp()
+        self.writer = CrmWriter(self.journal_dir, flush_size=2, flush_interval=3600)
+
+    def tearDown(self):
+        writer._writer = None
+        if self.writer.timer is not None:
+            self.writer.timer.cancel()
+        self.writer.journal.close()
+        shutil.rmtree(self.journal_dir)
+        super(CrmWriterTestCase, self).tearDown()
+
+    def entry(self, object_id=1):
+        return dict(logged_at=datetime.datetime.utcnow(), object_name="order",
+                    object_id=object_id, json=dict(action="add"))
+
+    def journal_lines(self):
+        return open(self.writer.journal_path).readlines()
+
+    def test_buffered_until_size(self):
+        self.writer.add([self.entry()])
+        self.assertEqual(Session.query(CrmDump).count(), 0)
+        self.assertEqual(len(self.journal_lines()), 1)
+        self.writer.add([self.entry()])
+        self.assertEqual(Session.query(CrmDump).count(), 2)
+        self.assertEqual(self.journal_lines(), [])
+
+    def test_flush(self):
+        self.writer.add([self.entry()])
+        self.assertEqual(self.writer.flush(), 1)
+        self.assertEqual(self.writer.flush(), 0)
+        dump = Session.query(CrmDump).one()
+        self.assertEqual(dump.json, dict(action="add"))
+
+    def fail_writes(self):
+        def write_entries(entries):
+            raise IOError("database unavailable")
+        original = writer.write_entries
+        writer.write_entries = write_entries
+        self.addCleanup(setattr, writer, 'write_entries', original)
+
+    def test_failed_flush_is_retried(self):
+        self.fail_writes()
+        self.writer.add([self.entry()])
+        self.assertEqual(self.writer.flush(), 0)
+        self.assertNotEqual(self.writer.timer, None)
+        self.assertEqual(len(self.writer.buffer), 1)
+
+    def test_buffer_limit(self):
+        self.fail_writes()
+        self.writer.buffer_limit = 4
+        for object_id in range(6):
+            self.writer.add([self.entry(object_id)])
+        # room is made for another flush_size events
+        self.assertEqual([entry['object_id'] for entry in self.writer.buffer], [3, 4, 5])
+        self.assertEqual(len(self.journal_lines()), 3)
+
+    def test_recover_journal_of_stopped_process(self):
+        stopped_journal = os.path.join(self.journal_dir, "crm-999999.journal")
+        with open(stopped_journal, 'w') as journal:
+            journal.write(writer.dump_entry(self.entry(5)) + "\n")
+        self.assertEqual(self.writer.recover(), 1)
+        self.assertFalse(os.path.exists(stopped_journal))
+        self.assertEqual(Session.query(CrmDump).one().object_id, 5)
+
+    def test_log_crm_written_on_commit(self):
+        writer._writer = self.writer
+        log_crm("order", 1, dict(action="checkout"))
+        log_crm("order", 1, dict(action="timeout"))
+        self.assertEqual(self.writer.buffer, [])
+        transaction.commit()
+        self.assertEqual(Session.query(CrmDump).count(), 2)
+
+    def test_log_crm_dropped_on_abort(self):
+        writer._writer = self.writer
+        log_crm("order", 1, dict(action="checkout"))
+        transaction.abort()
+        self.assertEqual(self.writer.buffer, [])
+
+
+class CrmTimelineTestCase(BaseTestCase):
+
+    def log(self, object_id, action, days_ago=0, minutes=0):
+        dump = CrmDump("order", object_id, dict(action=action))
+        dump.logged_at = datetime.datetime.utcnow() - datetime.timedelta(days=days_ago, minutes=minutes)
+        Session.add(dump)
+        Session.flush()
+        return dump
+
+    # lookup_timeline
+
+    def test_timeline_of_object(self):
+        self.log(1, "add", minutes=2)
+        self.log(2, "add", minutes=1)
+        update = self.log(1, "update")
+        timeline = lookup_timeline("order", 1)
+        self.assertEqual(len(timeline), 2)
+        self.assertEqual(timeline[0], update)
+
+    def test_timeline_pages(self):
+        dumps = [self.log(1, "update", minutes=i) for i in range(5)]
+        first = lookup_timeline("order", 1, limit=3)
+        self.assertEqual(first, dumps[:3])
+        last = first[-1]
+        second = lookup_timeline("order", 1, before=(last.logged_at, last.id), limit=3)
+        self.assertEqual(second, dumps[3:])
+
+    def test_timeline_of_time_range(self):
+        self.log(1, "add", days_ago=3)
+        recent = self.log(2, "add")
+        since = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+        self.assertEqual(lookup_timeline(since=since), [recent])
+
+    # rotate_crm
+
+    def test_rotate(self):
+        self.log(1, "add", days_ago=200)
+        self.log(1, "update", days_ago=200)
+        self.log(1, "update", days_ago=200)
+        recent_id = self.log(1, "checkout").id
+        self.assertEqual(rotate_crm(90), 3)
+        self.assertEqual([dump.id for dump in Session.query(CrmDump)], [recent_id])
+        summaries = dict((summary.action, summary.amount)
+                         for summary in lookup_daily_summaries("order", 1))
+        self.assertEqual(summaries, dict(add=1, update=2))
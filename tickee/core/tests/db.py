@@ -0,0 +1,134 @@
+from tickee.accounts.processing import create_account
+from tickee.core.currency.processing import create_currency
+from tickee.core.db import execute, forget_deleted
+from tickee.db.models.event import Event
+from tickee.db.models.eventpart import EventPart
+from tickee.db.models.order import Order
+from tickee.db.models.tickettype import TicketType, TicketTypeEventPartAssociation
+from tickee.events.eventparts.processing import add_eventpart
+from tickee.events.processing import start_event, delete_event
+from tickee.orders.processing import start_order, add_tickets, delete_order
+from tickee.scanning.models import TicketScan
+from tickee.scanning.processing import scan_ticket
+from tickee.subscriptions.models import Subscription, FREE
+from tickee.tests import BaseTestCase
+from tickee.tickets.manager import tickets_from_order
+from tickee.tickets.models import Ticket, TicketChange
+from tickee.tickets.tasks import create_tickets
+from tickee.tickettypes.models import TicketTypeInventory, AvailabilityRequest
+from tickee.tickettypes.processing import create_tickettype, link_tickettype_to_event, \
+    delete_tickettype
+from tickee.users.processing import create_user
+import datetime
+import sqlahelper
+import tickee.exceptions as ex
+
+Session = sqlahelper.get_session()
+
+
+class DeleteTestCase(BaseTestCase):
+    """ Set-based deletes and removing their rows from the session. """
+
+    def setUp(self):
+        super(DeleteTestCase, self).setUp()
+        self.user = create_user("user@example.com")
+        create_currency("EUR", "Euro")
+        self.account = create_account("accountname", "email")
+        self.account.subscription = Subscription(FREE)
+        self.event = start_event(self.account.id, "event_name")
+        self.eventpart = add_eventpart(self.event.id)
+        self.tickettype = self.add_tickettype(self.event)
+        self.event2 = start_event(self.account.id, "event_name2")
+        add_eventpart(self.event2.id)
+        self.tickettype2 = self.add_tickettype(self.event2)
+        Session.flush()
+
+    def add_tickettype(self, event):
+        tickettype = create_tickettype(0, 100)
+        tickettype.is_active = True
+        link_tickettype_to_event(tickettype, event)
+        Session.add(AvailabilityRequest(tickettype.id))
+        return tickettype
+
+    def order_tickets(self, tickettype, amount):
+        order = start_order(self.user, self.account)
+        add_tickets(order, tickettype.id, amount)
+        Session.flush()
+        create_tickets(order)
+        return sorted(tickets_from_order(order), key=lambda t: t.id)
+
+    def count(self, model, *criteria):
+        return Session.query(model).filter(*criteria).count()
+
+    # delete_tickettype
+
+    def test_delete_tickettype(self):
+        tickettype_id = self.tickettype.id
+        counts = delete_tickettype(self.tickettype)
+        Session.flush()
+        self.assertEqual(counts, dict(tickettypes=1, associations=1))
+        self.assertEqual(self.count(TicketType, TicketType.id==tickettype_id), 0)
+        self.assertEqual(self.count(TicketTypeEventPartAssociation,
+                                    TicketTypeEventPartAssociation.tickettype_id==tickettype_id), 0)
+        self.assertEqual(self.count(TicketTypeInventory,
+                                    TicketTypeInventory.tickettype_id==tickettype_id), 0)
+        self.assertEqual(self.count(AvailabilityRequest,
+                                    AvailabilityRequest.tickettype_id==tickettype_id), 0)
+        self.assertEqual(list(self.event.get_ticket_types(True, True)), [])
+        # the tickettype of the other event is untouched
+        self.assertEqual(self.count(AvailabilityRequest,
+                                    AvailabilityRequest.tickettype_id==self.tickettype2.id), 1)
+        self.assertEqual(list(self.event2.get_ticket_types(True, True)), [self.tickettype2])
+
+    def test_delete_ordered_tickettype(self):
+        self.order_tickets(self.tickettype, 1)
+        self.assertRaises(ex.TickeeError, delete_tickettype, self.tickettype)
+
+    # delete_event
+
+    def test_delete_event(self):
+        tickets = self.order_tickets(self.tickettype, 2)
+        scan_ticket(tickets[0].get_code(), datetime.datetime.utcnow(), dict())
+        order_id = tickets[0].ticket_order.order_id
+        self.assertEqual(delete_order(tickets[0].ticket_order.order),
+                         dict(tickets=2, ticketorders=1, scans=1))
+        event_id, tickettype_id = self.event.id, self.tickettype.id
+        counts = delete_event(self.event)
+        Session.flush()
+        self.assertEqual(counts, dict(tickettypes=1, associations=1, eventparts=1))
+        self.assertEqual(self.count(Event, Event.id==event_id), 0)
+        self.assertEqual(self.count(EventPart, EventPart.event_id==event_id), 0)
+        self.assertEqual(self.count(Order, Order.id==order_id), 0)
+        self.assertEqual(self.count(Ticket, Ticket.event_id==event_id), 0)
+        self.assertEqual(self.count(TicketScan), 0)
+        self.assertEqual(self.count(TicketType, TicketType.id==tickettype_id), 0)
+        self.assertEqual(self.count(TicketTypeInventory,
+                                    TicketTypeInventory.tickettype_id==tickettype_id), 0)
+        self.assertEqual(self.count(AvailabilityRequest,
+                                    AvailabilityRequest.tickettype_id==tickettype_id), 0)
+        self.assertEqual(self.count(TicketChange, TicketChange.event_id==event_id), 0)
+        # the other event is untouched
+        self.assertEqual(self.count(EventPart, EventPart.event_id==self.event2.id), 1)
+        self.assertEqual(self.count(TicketTypeInventory,
+                                    TicketTypeInventory.tickettype_id==self.tickettype2.id), 1)
+
+    def test_delete_event_with_orders(self):
+        self.order_tickets(self.tickettype, 1)
+        self.assertRaises(ex.TickeeError, delete_event, self.event)
+
+    # forget_deleted
+
+    def test_forget_deleted(self):
+        tickets = self.order_tickets(self.tickettype, 2)
+        scan_ticket(tickets[0].get_code(), datetime.datetime.utcnow(), dict())
+        scan = tickets[0].scans[0]
+        self.assertEqual(len(tickets[1].scans), 0)
+        execute(TicketScan.__table__.delete())
+        self.event.name = "renamed"
+        forget_deleted(TicketScan, 'ticket_id', [tickets[0].id])
+        # unrelated instances and their unflushed changes are kept
+        self.assertTrue(self.event in Session.dirty)
+        self.assertEqual(self.event.name, "renamed")
+        self.assertTrue('scans' in tickets[1].__dict__)
+        self.assertFalse(scan in Session)
+        self.assertEqual(tickets[0].scans, [])
@@ -0,0 +1,99 @@
+from tickee.core.mail.transport import SMTPTransport, TokenBucket
+import asyncore
+import smtpd
+import threading
+import time
+import unittest
+
+
+class StubSMTPServer(smtpd.SMTPServer):
+    """ Stands in for an SMTP server, answering with the responses queued
+    on it and accepting the message when none are left. """
+
+    def __init__(self):
+        smtpd.SMTPServer.__init__(self, ('127.0.0.1', 0), None)
+        self.port = self.socket.getsockname()[1]
+        self.connections = 0
+        self.messages = []
+        self.responses = []
+
+    def handle_accept(self):
+        self.connections += 1
+        smtpd.SMTPServer.handle_accept(self)
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        if self.responses:
+            return self.responses.pop(0)
+        self.messages.append((mailfrom, rcpttos, data))
+
+
+class SMTPTransportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSMTPServer()
+        self.running = True
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+        self.transport = SMTPTransport([dict(name="stub", host='127.0.0.1',
+                                             port=self.server.port, tls=False)])
+
+    def tearDown(self):
+        self.transport.close()
+        self.running = False
+        self.thread.join()
+        asyncore.close_all()
+
+    def serve(self):
+        while self.running:
+            asyncore.loop(timeout=0.01, count=1)
+
+    def send(self, transport=None):
+        return (transport or self.transport).send("tickets@tick.ee", "user@example.com",
+                                                  "Subject: tickets\n\nhello")
+
+    def test_session_reused(self):
+        for i in range(3):
+            self.assertEqual(self.send(), "stub")
+        self.assertEqual(len(self.server.messages), 3)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_reconnect_on_421(self):
+        self.send()
+        self.server.responses = ["421 closing connection"]
+        self.assertEqual(self.send(), "stub")
+        self.assertEqual(len(self.server.messages), 2)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_reconnect_on_disconnect(self):
+        self.send()
+        # the server dropped the connection without telling
+        self.transport.sessions["stub"].smtp.close()
+        self.assertEqual(self.send(), "stub")
+        self.assertEqual(self.server.connections, 2)
+
+    def test_failing_server_skipped(self):
+        transport = SMTPTransport([dict(name="down", host='127.0.0.1', port=1, tls=False),
+                                   dict(name="stub", host='127.0.0.1',
+                                        port=self.server.port, tls=False)])
+        self.assertEqual(self.send(transport), "stub")
+        self.assertTrue("down" in transport.failed_at)
+        self.assertEqual([server['name'] for server in transport.get_servers()],
+                         ["stub", "down"])
+        transport.close()
+
+    def test_all_servers_failing(self):
+        transport = SMTPTransport([dict(name="down", host='127.0.0.1', port=1, tls=False)])
+        self.assertEqual(self.send(transport), None)
+
+
+class TokenBucketTestCase(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=50, burst=2)
+        start = time.time()
+        bucket.consume()
+        bucket.consume()
+        self.assertTrue(time.time() - start < 0.01)
+        bucket.consume()
+        self.assertTrue(time.time() - start >= 0.015)
@@ -0,0 +1,97 @@
+from tickee.core.mail.defaults import OUTBOX_MAX_ATTEMPTS
+from tickee.core.mail.models import OutboxMail
+from tickee.core.mail.outbox import queue_email, claim_mails, dispatch_outbox
+from tickee.core.mail.states import MAIL_QUEUED, MAIL_SENDING, MAIL_SENT, \
+    MAIL_FAILED
+from tickee.core.mail.transport import SMTPTransport
+from tickee.core.tests.mail import StubSMTPServer
+from tickee.tests import BaseTestCase
+import asyncore
+import datetime
+import sqlahelper
+import threading
+import tickee.core.mail
+
+Session = sqlahelper.get_session()
+
+
+class OutboxTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(OutboxTestCase, self).setUp()
+        self.server = StubSMTPServer()
+        self.running = True
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+        self.use_servers(dict(name="stub", host='127.0.0.1', port=self.server.port, tls=False))
+
+    def tearDown(self):
+        tickee.core.mail._transport.close()
+        tickee.core.mail._transport = None
+        self.running = False
+        self.thread.join()
+        asyncore.close_all()
+        super(OutboxTestCase, self).tearDown()
+
+    def serve(self):
+        while self.running:
+            asyncore.loop(timeout=0.01, count=1)
+
+    def use_servers(self, *servers):
+        tickee.core.mail._transport = SMTPTransport(list(servers))
+
+    def queue(self):
+        mail = queue_email("tickets@tick.ee", "user@example.com", "Your tickets",
+                           u"<p>tickets</p>", u"tickets", object_name="order", object_id=1)
+        Session.flush()
+        return mail
+
+    # queue_email
+
+    def test_queue_email(self):
+        mail = self.queue()
+        self.assertEqual(mail.status, MAIL_QUEUED)
+        self.assertEqual(len(self.server.messages), 0)
+
+    # claim_mails
+
+    def test_claim_mails(self):
+        mail = self.queue()
+        self.assertEqual(claim_mails(), [mail])
+        self.assertEqual(mail.status, MAIL_SENDING)
+        self.assertEqual(mail.attempts, 1)
+        # claimed mails are not claimed twice
+        self.assertEqual(claim_mails(), [])
+
+    def test_claim_expired(self):
+        mail = self.queue()
+        claim_mails()
+        mail.send_after = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+        self.assertEqual(claim_mails(), [mail])
+        self.assertEqual(mail.attempts, 2)
+
+    # dispatch_outbox
+
+    def test_dispatch(self):
+        mail = self.queue()
+        self.assertEqual(dispatch_outbox(), 1)
+        self.assertEqual(mail.status, MAIL_SENT)
+        self.assertEqual(mail.smtp_server, "stub")
+        self.assertEqual(len(self.server.messages), 1)
+
+    def test_dispatch_failure_retried(self):
+        self.use_servers(dict(name="down", host='127.0.0.1', port=1, tls=False))
+        mail = self.queue()
+        self.assertEqual(dispatch_outbox(), 0)
+        self.assertEqual(mail.status, MAIL_QUEUED)
+        self.assertTrue(mail.send_after > datetime.datetime.utcnow())
+        self.assertTrue(mail.last_error is not None)
+
+    def test_dispatch_gives_up(self):
+        self.use_servers(dict(name="down", host='127.0.0.1', port=1, tls=False))
+        mail = self.queue()
+        mail.attempts = OUTBOX_MAX_ATTEMPTS - 1
+        dispatch_outbox()
+        self.assertEqual(mail.status, MAIL_FAILED)
+        self.assertEqual(Session.query(OutboxMail).filter(OutboxMail.status==MAIL_QUEUED).count(), 0)
@@ -0,0 +1,68 @@
+from tickee.core.pagination import paginate, stream, list_or_page
+from tickee.db.models.user import User
+from tickee.tests import BaseTestCase
+from tickee.users.processing import create_user
+import datetime
+import sqlahelper
+import tickee.exceptions as ex
+
+Session = sqlahelper.get_session()
+
+
+class PaginationTestCase(BaseTestCase):
+    
+    def setUp(self):
+        super(PaginationTestCase, self).setUp()
+        joined = datetime.datetime(2012, 5, 1, 12, 0, 0, 250)
+        self.users = []
+        for i in range(5):
+            user = create_user("user%s@example.com" % i)
+            # two users joined at the same moment
+            user.date_joined = joined + datetime.timedelta(seconds=min(i, 3))
+            self.users.append(user)
+        Session.flush()
+        self.query = Session.query(User)
+    
+    # paginate
+    
+    def test_pages(self):
+        keys = (User.date_joined, User.id)
+        page, cursor = paginate(self.query, keys, limit=2)
+        self.assertEqual(page, self.users[:2])
+        page, cursor = paginate(self.query, keys, cursor, limit=2)
+        self.assertEqual(page, self.users[2:4])
+        page, cursor = paginate(self.query, keys, cursor, limit=2)
+        self.assertEqual(page, self.users[4:])
+        self.assertEqual(cursor, None)
+    
+    def test_exact_last_page(self):
+        page, cursor = paginate(self.query, (User.id,), limit=5)
+        self.assertEqual(len(page), 5)
+        self.assertEqual(cursor, None)
+    
+    def test_invalid_cursor(self):
+        self.assertRaises(ex.InvalidCursorError, paginate, self.query, (User.id,), "garbage!")
+        self.assertRaises(ex.InvalidCursorError, paginate, self.query, (User.id,), "WzEsIDJd")
+    
+    # stream
+    
+    def test_stream(self):
+        users = list(stream(self.query, (User.date_joined, User.id), batch_size=2))
+        self.assertEqual(users, self.users)
+    
+    # list_or_page
+    
+    def test_list_or_page(self):
+        self.assertEqual(len(list_or_page(self.query, (User.id,), lambda u: u.id, 'users')), 5)
+        result = list_or_page(self.query, (User.id,), lambda u: u.id, 'users', limit=3)
+        self.assertEqual(result['users'], [user.id for user in self.users[:3]])
+        result = list_or_page(self.query, (User.id,), lambda u: u.id, 'users', cursor=result['next'])
+        self.assertEqual(result['users'], [user.id for user in self.users[3:]])
+        self.assertEqual(result['next'], None)
+    
+    def test_list_or_page_batched(self):
+        marshal = lambda users: [user.id for user in users]
+        self.assertEqual(list_or_page(self.query, (User.id,), marshal, 'users', batched=True),
+                         [user.id for user in self.users])
+        result = list_or_page(self.query, (User.id,), marshal, 'users', limit=3, batched=True)
+        self.assertEqual(result['users'], [user.id for user in self.users[:3]])
@@ -0,0 +1,20 @@
+from tickee.core.mail import templates
+import unittest
+
+
+class TemplatesTestCase(unittest.TestCase):
+
+    def test_precompile(self):
+        amount = templates.precompile()
+        self.assertEqual(amount, len(templates.get_environment().list_templates()))
+
+    def test_templates_compiled_once(self):
+        env = templates.get_environment()
+        self.assertTrue(env.get_template('base.txt') is env.get_template('base.txt'))
+
+    def test_render_timings(self):
+        before = templates.render_timings().get('base.txt', dict(count=0))['count']
+        templates.render('base.txt', user=None, plain_content="hello")
+        timings = templates.render_timings()['base.txt']
+        self.assertEqual(timings['count'], before + 1)
+        self.assertTrue(timings['max'] >= timings['mean'])
@@ -0,0 +1,242 @@
+"""
+Migrations
+==========
+
+    ``create_all`` only creates missing tables, columns added to the models
+    of existing tables are added by ``add_columns``. The migrations are run
+    as maintenance commands, e.g.::
+
+        python manage.py promote_meta_flags
+"""
+from sqlalchemy.engine.reflection import Inspector
+from sqlalchemy.sql.expression import select, bindparam, literal, and_, or_, exists
+from sqlalchemy.types import String
+from tickee.core.db import execute
+from tickee.db.models.event import Event, new_code_key
+from tickee.db.models.eventpart import EventPart
+from tickee.db.models.order import Order
+from tickee.db.models.ticketorder import TicketOrder
+from tickee.db.models.tickettype import TicketTypeEventPartAssociation
+from tickee.db.models.user import User
+from tickee.paymentproviders.models import PaymentNotification
+from tickee.scanning.models import TicketScan
+from tickee.tickets.models import Ticket, TicketChange
+import datetime
+import logging
+import sqlahelper
+
+Session = sqlahelper.get_session()
+
+tlogger = logging.getLogger('technical')
+
+BATCH_SIZE = 1000
+
+
+def add_columns(model, *names):
+    """
+    Adds the columns of a model and their indexes that do not exist yet in
+    its table.
+
+    Returns:
+        The names of the added columns.
+    """
+    table = model.__table__
+    connection = Session.connection()
+    inspector = Inspector.from_engine(connection)
+    existing = set(column['name'] for column in inspector.get_columns(table.name))
+    added = []
+    for name in names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        execute("ALTER TABLE %s ADD COLUMN %s %s" \
+                % (table.name, column.name, column.type.compile(dialect=connection.dialect)))
+        added.append(name)
+    indexes = set(index['name'] for index in inspector.get_indexes(table.name))
+    for index in table.indexes:
+        if index.name not in indexes and set(index.columns.keys()) & set(added):
+            index.create(bind=connection)
+    if added:
+        tlogger.info("added columns %s to %s" % (", ".join(added), table.name))
+    return added
+
+
+def promote_meta(model, keys, convert=lambda row, value: value):
+    """
+    Moves keys of the meta of a model to their columns. Rows without the
+    keys get the defaults of the columns.
+
+    Args:
+        model:
+            the model having the columns.
+        keys:
+            maps the keys in the meta to the names of their columns.
+        convert (optional):
+            function(row, value) returning the column value of a meta value.
+
+    Returns:
+        The amount of migrated rows.
+    """
+    table = model.__table__
+    add_columns(model, *keys.values())
+    # rows without the keys
+    defaults = dict((name, table.c[name].default.arg) for name in keys.values()
+                    if table.c[name].default is not None)
+    for name, value in defaults.iteritems():
+        execute(table.update().where(table.c[name]==None).values(**{name: value}))
+    # rows having at least one of the keys, in batches of ascending ids. The
+    # patterns are bound as strings, the type of the meta would encode them.
+    having_keys = or_(*[table.c.meta.like(literal('%%"%s"%%' % key, String)) for key in keys])
+    update = table.update().where(table.c.id==bindparam('_id'))\
+                           .values(meta=bindparam('_meta', type_=table.c.meta.type),
+                                   **dict((name, bindparam('_' + name)) for name in keys.values()))
+    last_id = 0
+    total = 0
+    while True:
+        rows = execute(select([table]).where(having_keys).where(table.c.id > last_id)\
+                                      .order_by(table.c.id).limit(BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        params = []
+        for row in rows:
+            meta = dict(row.meta or {})
+            values = dict(_id=row.id)
+            for key, name in keys.iteritems():
+                if key in meta:
+                    values['_' + name] = convert(row, meta.pop(key))
+                else:
+                    values['_' + name] = row[name]
+            values['_meta'] = meta
+            params.append(values)
+        execute(update, params)
+        last_id = rows[-1].id
+        total += len(rows)
+    tlogger.info("promoted %s of %s rows of %s" % (", ".join(keys), total, table.name))
+    return total
+
+
+def meta_to_datetime(row, value):
+    """ Converts a "%d-%m-%Y %H:%M:%S UTC" timestamp of the meta of an order,
+    falling back on the purchase of the order. """
+    try:
+        return datetime.datetime.strptime(value.strip(), "%d-%m-%Y %H:%M:%S UTC")
+    except (AttributeError, ValueError):
+        return row.purchased_on
+
+
+def promote_meta_flags():
+    """
+    Moves the flags of orders, events and users that are queried from their
+    meta to indexed columns.
+
+    Returns:
+        The amount of migrated rows.
+    """
+    total = promote_meta(Order, dict(gifted='is_gifted', paper='is_paper'),
+                         lambda row, value: bool(value))
+    total += promote_meta(Order, dict(tickets_created='tickets_created_on',
+                                      tickets_sent='tickets_sent_on'),
+                          meta_to_datetime)
+    total += promote_meta(Event, dict(notifications_sent='notifications_sent'),
+                          lambda row, value: bool(value))
+    # the key marks the users that received a notification, whatever its value
+    total += promote_meta(User, dict(received_event_notification='received_event_notification'),
+                          lambda row, value: True)
+    return total
+
+
+def denormalize_event_ids():
+    """
+    Stores the event of their tickettype on the ticketorders and tickets that
+    do not have one yet.
+
+    Returns:
+        The amount of updated tickets.
+    """
+    add_columns(TicketOrder, 'event_id')
+    add_columns(Ticket, 'event_id')
+    ticketorders = TicketOrder.__table__
+    tickets = Ticket.__table__
+    assocs = TicketTypeEventPartAssociation.__table__
+    eventparts = EventPart.__table__
+    event_of_tickettype = select([eventparts.c.event_id])\
+                            .where(eventparts.c.id==assocs.c.eventpart_id)\
+                            .where(assocs.c.tickettype_id==ticketorders.c.ticket_type_id)\
+                            .limit(1).as_scalar()
+    result = execute(ticketorders.update().where(ticketorders.c.event_id==None)\
+                                          .values(event_id=event_of_tickettype))
+    tlogger.info("stored the event of %s ticketorders" % result.rowcount)
+    event_of_ticketorder = select([ticketorders.c.event_id])\
+                             .where(ticketorders.c.id==tickets.c.ticket_order_id)\
+                             .as_scalar()
+    result = execute(tickets.update().where(tickets.c.event_id==None)\
+                                     .values(event_id=event_of_ticketorder))
+    tlogger.info("stored the event of %s tickets" % result.rowcount)
+    return result.rowcount
+
+
+def unique_ticketscans():
+    """
+    Removes all but the first scan of every ticket and adds the unique index
+    on the ticket of the scans.
+
+    Returns:
+        The amount of removed scans.
+    """
+    scans = TicketScan.__table__
+    earlier = scans.alias('earlier')
+    has_earlier = exists([earlier.c.id]).where(and_(earlier.c.ticket_id==scans.c.ticket_id,
+                                                   earlier.c.id < scans.c.id))
+    result = execute(scans.delete().where(has_earlier))
+    tlogger.info("removed %s duplicate ticketscans" % result.rowcount)
+    connection = Session.connection()
+    indexes = set(index['name'] for index in Inspector.from_engine(connection).get_indexes(scans.name))
+    for index in scans.indexes:
+        if index.name not in indexes:
+            index.create(bind=connection)
+    return result.rowcount
+
+
+def add_code_keys():
+    """
+    Gives the events without one a key for signing their ticket codes.
+
+    Returns:
+        The amount of events that got a key.
+    """
+    add_columns(Event, 'code_key')
+    events = Event.__table__
+    event_ids = [row.id for row in execute(select([events.c.id]).where(events.c.code_key==None))]
+    if event_ids:
+        execute(events.update().where(events.c.id==bindparam('_id'))\
+                               .values(code_key=bindparam('_code_key')),
+                [dict(_id=event_id, _code_key=new_code_key()) for event_id in event_ids])
+    tlogger.info("added code keys to %s events" % len(event_ids))
+    return len(event_ids)
+
+
+def add_notification_claims():
+    """
+    Adds the claims of the notifications in the payment inbox.
+
+    Returns:
+        The added columns.
+    """
+    return add_columns(PaymentNotification, 'claimed_at')
+
+
+def add_ticket_changes():
+    """
+    Adds the sequence of the ticket changes to the events. The changes are
+    recorded from now on, devices read the tickets from before. Changes are
+    recorded without a sequence number, which tables created before this
+    required.
+
+    Returns:
+        The added columns.
+    """
+    connection = Session.connection()
+    TicketChange.__table__.create(bind=connection, checkfirst=True)
+    if connection.dialect.name == 'postgresql':
+        execute("ALTER TABLE %s ALTER COLUMN sequence DROP NOT NULL" % TicketChange.__tablename__)
+    return add_columns(Event, 'last_change')
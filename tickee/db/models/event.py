@@ -3,12 +3,19 @@ from sqlalchemy.types import Integer, String, Boolean
 from tickee.core import l10n
 from tickee.core.db.types import MutationDict, JSONEncodedDict
 from tickee.tickettypes import states
+import binascii
+import os
 import sqlahelper
 import sqlalchemy.orm as orm
 
 Base = sqlahelper.get_base()
 Session = sqlahelper.get_session()
 
+def new_code_key():
+    """ Returns a random key for signing ticket codes. """
+    return binascii.hexlify(os.urandom(16))
+
+
 class Event(Base):
     """
     An event, e.g. a concert, a show, etc.
@@ -30,6 +37,9 @@ class Event(Base):
     
     is_public = Column(Boolean)
     is_active = Column(Boolean)
+    notifications_sent = Column(Boolean, default=False)
+    code_key = Column(String(32)) # signs the ticket codes, see tickee.tickets.codes
+    last_change = Column(Integer, default=0) # sequence of the ticket changes, see tickee.tickets.changes
     meta = Column(MutationDict.as_mutable(JSONEncodedDict))
     
     # Relationships
@@ -49,6 +59,9 @@ class Event(Base):
         self.is_public = True
         self.is_active = False
         self.is_private = False
+        self.notifications_sent = False
+        self.code_key = new_code_key()
+        self.last_change = 0
         self.description_ref = l10n.create_text_localisation().reference_id
         self.meta = {}
 
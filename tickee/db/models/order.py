@@ -1,8 +1,10 @@
-from sqlalchemy.schema import Column, ForeignKey
+from sqlalchemy.schema import Column, ForeignKey, Index
 from sqlalchemy.types import Integer, String, DateTime, Enum, Boolean
 from tickee.core.crm.tasks import log_crm
 from tickee.core.db.types import MutationDict, JSONEncodedDict
+from tickee.orders.defaults import ORDER_SESSION_DURATION
 from tickee.orders.states import STARTED, TIMEOUT, PURCHASED, CANCELLED
+from tickee.tickettypes import inventory
 import datetime
 import hashlib
 import logging
@@ -38,6 +40,10 @@ class Order(Base):
     user_id = Column(Integer, ForeignKey('tickee_users.id'))
     locked = Column(Boolean)
     payment_provider_id = Column(Integer, ForeignKey('tickee_payment_provider_info.id'))
+    is_gifted = Column(Boolean, default=False, index=True)
+    is_paper = Column(Boolean, default=False, index=True)
+    tickets_created_on = Column(DateTime)
+    tickets_sent_on = Column(DateTime)
     meta = Column(MutationDict.as_mutable(JSONEncodedDict))
     
     # Relationships
@@ -57,6 +63,8 @@ class Order(Base):
         self.touch()
         self._generate_keys()
         self.locked = False
+        self.is_gifted = False
+        self.is_paper = False
         self.meta = {}
         
     
@@ -87,9 +95,15 @@ class Order(Base):
         """
         if not self.is_locked():
             raise ex.OrderError("Only locked orders can be purchased.")
+        self.transfer_inventory(PURCHASED)
         self.status = PURCHASED
         self.purchased_on = datetime.datetime.utcnow()
     
+    def is_expired(self, max_allowed_duration=ORDER_SESSION_DURATION):
+        """ Returns True if the session of a started order has run out. """
+        oldest_allowed = datetime.datetime.utcnow() - datetime.timedelta(seconds=max_allowed_duration)
+        return self.status == STARTED and self.session_start < oldest_allowed
+    
     def is_purchased(self):
         return self.status == PURCHASED
     
@@ -179,6 +193,7 @@ class Order(Base):
         """
         blogger.info("cancelling order %s" % self.id)
         log_crm("order", self.id, dict(action="cancel"))
+        self.transfer_inventory(CANCELLED)
         self.status = CANCELLED
     
     def checkout(self, user=None):
@@ -207,8 +222,18 @@ class Order(Base):
         """
         blogger.debug("timeout order %s" % self.id)
         log_crm("order", self.id, dict(action="timeout"))
+        self.transfer_inventory(TIMEOUT)
         self.status = TIMEOUT
         
+    def transfer_inventory(self, new_status):
+        """
+        Moves the units of all ``TicketOrder``s to the inventory counters of
+        the new status. Has to be called before the status is changed.
+        """
+        for ticketorder in self.ordered_tickets:
+            inventory.transfer(ticketorder.ticket_type, ticketorder.amount, 
+                               self.status, new_status)
+        
     def get_ticket_types(self):
         """
         Returns a list of all ``TicketType``s in this order.
@@ -226,4 +251,8 @@ class Order(Base):
             ticket_types = self.get_ticket_types()
         for ticket_type in ticket_types:
             ticket_type.update_availability()
+
+
+# the expiry engine looks up started orders by the start of their session
+Index('ix_tickee_orders_status_session_start', Order.status, Order.session_start)
     
\ No newline at end of file
@@ -23,6 +23,8 @@ class TicketOrder(Base):
     amount = Column(Integer)
     ticket_type_id = Column(Integer, ForeignKey('tickee_tickettypes.id'))
     order_id = Column(Integer, ForeignKey('tickee_orders.id'))
+    # denormalized event of the tickettype, event scoped queries filter on it
+    event_id = Column(Integer, ForeignKey('tickee_events.id'), index=True)
     
     # Relations
     
@@ -31,13 +33,14 @@ class TicketOrder(Base):
     
     # Constructor
     
-    def __init__(self, order_id, ticket_type_id, amount):
+    def __init__(self, order_id, ticket_type_id, amount, event_id=None):
         """
         Construct a new ``TicketOrder`` object.
         """
         self.order_id = order_id
         self.ticket_type_id = ticket_type_id
         self.amount= amount
+        self.event_id = event_id
         
     # Methods
     
@@ -4,8 +4,9 @@ from sqlalchemy.types import Integer, String, Enum, Text, Boolean, DateTime
 from tickee.core import l10n
 from tickee.db.models.order import Order
 from tickee.db.models.ticketorder import TicketOrder
-from tickee.orders.states import TIMEOUT, CANCELLED, PURCHASED
+from tickee.orders.states import STARTED, PURCHASED
 from tickee.tickets.models import Ticket
+from tickee.tickettypes import inventory
 from tickee.tickettypes.states import AVAILABLE, CLAIMED, SOLD
 import logging
 import sqlahelper
@@ -17,6 +18,30 @@ Base = sqlahelper.get_base()
 blogger = logging.getLogger("blm.tickettype")
 
 
+def next_availability(availability, units, held, purchased):
+    """
+    Returns the availability a tickettype should have given its current
+    availability, its units and the amount of held and purchased units.
+    """
+    available = units - held - purchased
+    if availability == AVAILABLE:
+        # AVAILABLE --> CLAIMED
+        if available <= 0:
+            return CLAIMED
+    elif availability == CLAIMED:
+        # CLAIMED --> SOLD
+        if purchased >= units:
+            return SOLD
+        # CLAIMED --> AVAILABLE
+        if available > 0:
+            return AVAILABLE
+    elif availability == SOLD:
+        # SOLD -> AVAILABLE
+        if available > 0:
+            return AVAILABLE
+    return availability
+
+
 class TicketTypeEventPartAssociation(Base):
     
     # Meta
@@ -162,7 +187,6 @@ class TicketType(Base):
         """
         Checks whether a specific amount of tickets can still be bought.   
         """
-        print "checking: available amount %s >= requested amount %s" % (self.amount_available_tickets(), ticket_amount)
         return self.amount_available_tickets() >= ticket_amount 
     
     
@@ -177,21 +201,28 @@ class TicketType(Base):
         """
         Retrieve the amount of tickets in ``TicketOrder``s.
         """
-        result = Session.query(coalesce(sum(TicketOrder.amount), 0))\
-                        .join(Order)\
-                        .filter(~Order.status.in_([TIMEOUT, CANCELLED]))\
-                        .filter(TicketOrder.ticket_type_id==self.id).first()
-        return result[0]
+        held, purchased = inventory.get_counts(self)
+        return held + purchased
     
     def amount_purchased_tickets(self):
         """
         Retrieves the amount of purchased tickets in ``TicketOrder``s. 
         """
-        result = Session.query(sum(TicketOrder.amount))\
+        held, purchased = inventory.get_counts(self)
+        return purchased
+    
+    def count_ordered_units(self):
+        """
+        Counts the amount of held and purchased tickets directly from the
+        ``TicketOrder``s. Used to rebuild the inventory counters.
+        """
+        result = Session.query(Order.status, coalesce(sum(TicketOrder.amount), 0))\
+                        .join(TicketOrder)\
+                        .filter(Order.status.in_([STARTED, PURCHASED]))\
                         .filter(TicketOrder.ticket_type_id==self.id)\
-                        .join(Order)\
-                        .filter(Order.status==PURCHASED).first()
-        return result[0]
+                        .group_by(Order.status).all()
+        amounts = dict(result)
+        return int(amounts.get(STARTED, 0)), int(amounts.get(PURCHASED, 0))
     
     def is_free(self):
         return self.price == 0
@@ -205,35 +236,13 @@ class TicketType(Base):
         """
         Adjusts the availability if necessary.
         """
-        if self.availability == AVAILABLE:
-            # AVAILABLE --> CLAIMED
-            if self.amount_available_tickets() <= 0:
-                blogger.info("tickettype %s is now CLAIMED.", self.id)
-                self.availability = CLAIMED
-                return
-        
-        elif self.availability == CLAIMED:
-            # CLAIMED --> SOLD
-            if self.amount_purchased_tickets() >= self.units:
-                print "purchased:", self.amount_purchased_tickets()
-                blogger.info("tickettype %s is now SOLD.", self.id)
-                self.availability = SOLD
-                return
-        
-            # CLAIMED --> AVAILABLE
-            if self.amount_available_tickets() > 0:
-                blogger.info("tickettype %s is now AVAILABLE again.", self.id)
-                self.availability = AVAILABLE
-                return
-        
-        elif self.availability == SOLD:
-            # SOLD -> AVAILABLE
-            if self.amount_available_tickets() > 0:
-                blogger.info("tickettype %s is now AVAILABLE again.", self.id)
-                self.availability = AVAILABLE
-                return
-            
-        blogger.debug("no state change to tickettype necessary")
+        held, purchased = inventory.get_counts(self)
+        availability = next_availability(self.availability, self.units, held, purchased)
+        if availability != self.availability:
+            blogger.info("tickettype %s is now %s.", self.id, availability.upper())
+            self.availability = availability
+        else:
+            blogger.debug("no state change to tickettype necessary")
 
     
     
@@ -5,7 +5,7 @@ Created on Jul 5, 2011
 @author: kevin
 '''
 from sqlalchemy.schema import Column
-from sqlalchemy.types import Integer, String, DateTime, Unicode
+from sqlalchemy.types import Integer, String, DateTime, Unicode, Boolean
 from tickee.core.db.types import MutationDict, JSONEncodedDict
 from tickee.core.marshalling import date, json_to_date
 from urllib import quote_plus
@@ -37,6 +37,7 @@ class User(Base):
     activation_key = Column(String(16))
     date_joined = Column(DateTime)
     last_login = Column(DateTime)
+    received_event_notification = Column(Boolean, default=False)
     meta = Column(MutationDict.as_mutable(JSONEncodedDict))
     
     # Constructor
@@ -44,6 +45,7 @@ class User(Base):
     def __init__(self, email):
         self.email = email
         self.date_joined = datetime.datetime.utcnow()
+        self.received_event_notification = False
         self.meta = dict()
     
     def get_full_name(self):
@@ -0,0 +1,46 @@
+from tickee.accounts.processing import create_account
+from tickee.db.migrations import promote_meta_flags
+from tickee.events.processing import start_event
+from tickee.orders.processing import start_order
+from tickee.tests import BaseTestCase
+from tickee.users.processing import create_user
+import datetime
+import sqlahelper
+
+Session = sqlahelper.get_session()
+
+
+class PromoteMetaFlagsTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(PromoteMetaFlagsTestCase, self).setUp()
+        self.user = create_user("user@example.com")
+        self.account = create_account("accountname", "email")
+        self.event = start_event(self.account.id, "event_name")
+
+    def test_order_flags(self):
+        order = start_order(self.user, self.account)
+        order.is_gifted = None
+        order.meta = dict(gifted=True, tickets_sent="01-02-2012 10:30:00 UTC",
+                          redirect_url="http://example.com")
+        order2 = start_order(create_user("user2@example.com"), self.account)
+        order2.is_gifted = None
+        Session.flush()
+        promote_meta_flags()
+        Session.expire_all()
+        self.assertTrue(order.is_gifted)
+        self.assertFalse(order.is_paper)
+        self.assertEqual(order.tickets_sent_on, datetime.datetime(2012, 2, 1, 10, 30))
+        self.assertEqual(order.meta, dict(redirect_url="http://example.com"))
+        self.assertFalse(order2.is_gifted)
+
+    def test_event_and_user_flags(self):
+        self.event.notifications_sent = None
+        self.event.meta = dict(notifications_sent=True)
+        self.user.meta = dict(received_event_notification=False)
+        Session.flush()
+        promote_meta_flags()
+        Session.expire_all()
+        self.assertTrue(self.event.notifications_sent)
+        self.assertTrue(self.user.received_event_notification)
+        self.assertEqual(self.user.meta, dict())
@@ -62,8 +62,6 @@ def add_to_order(client_id, order_key, user_id, tickettype_id, amount):
         was added to the order as well as an "order_key" used for checkout
         purposes.
     """
-    # Security    
-    om.timeout_sessions(600)
     try:
         # assert permission to order tickettype
         require_tickettype_owner(client_id, tickettype_id)
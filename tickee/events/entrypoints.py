@@ -11,7 +11,7 @@ from tickee.events.marshalling import event_to_dict, event_to_dict2
 from tickee.events.permissions import require_event_owner
 from tickee.events.processing import start_event, delete_event
 from tickee.tickets.manager import list_tickets
-from tickee.tickets.marshalling import ticket_to_dict
+from tickee.tickets.marshalling import tickets_to_dicts
 from tickee.tickettypes.defaults import TICKETTYPE_PRICE, TICKETTYPE_AMOUNT
 from tickee.tickettypes.processing import create_tickettype, \
     link_tickettype_to_event
@@ -24,7 +24,7 @@ import time
 def event_delete(client_id, event_id):
     """ Deletes an eventpart """
     event = lookup_event_by_id(event_id)
-    delete_event(event)
+    return delete_event(event)
 
 @task
 @entrypoint()
@@ -232,8 +232,7 @@ def event_tickets(client_id, event_id,
                            tickettype_id=tickettype_id)
     
     result = dict()
-    result['tickets'] = map(lambda t: ticket_to_dict(t, include_scanned=include_scan_state,
-                                                        include_user=include_user), 
-                            tickets)
+    result['tickets'] = tickets_to_dicts(tickets, include_scanned=include_scan_state,
+                                                  include_user=include_user)
     result['timestamp'] = int(time.time())
     return result
\ No newline at end of file
@@ -1,8 +1,9 @@
 from tickee.accounts.marshalling import account_to_dict
-from tickee.core.marshalling import date
+from tickee.core import l10n
+from tickee.core.marshalling import date, Memo
 from tickee.events.eventparts.marshalling import eventpart_to_dict
 from tickee.tickettypes import states
-from tickee.tickettypes.marshalling import tickettype_to_dict
+from tickee.tickettypes.marshalling import tickettypes_to_dicts
 from tickee.subscriptions.permissions import has_available_transactions
 
 
@@ -43,8 +44,8 @@ def event_to_dict(event, language='en',
     if include_visitors:
         result['visitors'] = []
     if include_tickettypes:
-        result['tickettypes'] = map(lambda tt: tickettype_to_dict(tt, include_availability=True), 
-                                    event.get_ticket_types())
+        result['tickettypes'] = tickettypes_to_dicts(event.get_ticket_types(), 
+                                                     include_availability=True)
     if include_eventparts:
         result['eventparts'] = map(lambda ep: eventpart_to_dict(ep, short=False),
                                    event.parts)
@@ -57,18 +58,19 @@ def event_to_dict(event, language='en',
     return result
 
 
-def event_to_dict2(event, short=False):
+def event_to_dict2(event, short=False, memo=None):
     
     result = dict(id=event.id,
                   name=event.name)
     
     if not short:
-        result['currency'] = event.get_currency()
-        result['handling_fee'] = event.get_handling_fee() / 100.00
-        result['dates'] = map(date, event.get_dates())
-        result['availability'] = event.get_availability()
+        memo = memo or Memo()
+        result['currency'] = memo(event.get_currency)
+        result['handling_fee'] = memo(event.get_handling_fee) / 100.00
+        result['dates'] = map(date, memo(event.get_dates))
+        result['availability'] = memo(event.get_availability)
         result['active'] = event.is_active
-        result['description'] = event.get_description()
+        result['description'] = memo(l10n.get_translation, event.description_ref, 'en')
         result['image_url'] = event.image_url
         result['url'] = event.url
         result['email'] = event.email
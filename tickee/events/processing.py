@@ -1,26 +1,58 @@
 from tickee.accounts.manager import lookup_account_by_id
+from tickee.core.crm.tasks import log_crm
+from tickee.core.db import execute, forget_deleted
 from tickee.db.models.event import Event
-from tickee.events.eventparts.processing import delete_eventpart
-from tickee.tickettypes.processing import delete_tickettype
+from tickee.db.models.eventpart import EventPart
+from tickee.db.models.tickettype import TicketTypeEventPartAssociation
+from tickee.orders.manager import has_orders_for_tickettypes
+from tickee.tickets.models import TicketChange
+from tickee.tickettypes.processing import delete_tickettypes
 import datetime
 import logging
 import sqlahelper
+import tickee.exceptions as ex
 
 blogger = logging.getLogger('blm.events')
 
 Session = sqlahelper.get_session()
 
+assocs = TicketTypeEventPartAssociation.__table__
+eventparts = EventPart.__table__
+ticketchanges = TicketChange.__table__
+
 def delete_event(event):
-    """ Removes the event """
+    """
+    Removes the event with its tickettypes and eventparts, with a single
+    statement per table.
+    
+    Returns:
+        A dictionary with the amount of removed ``tickettypes``, eventpart
+        ``associations`` and ``eventparts``.
+    
+    Raises:
+        TickeeError
+            if tickets have been ordered for one of its tickettypes
+    """
+    tickettypes = list(event.get_ticket_types(True, True))
+    if has_orders_for_tickettypes([tickettype.id for tickettype in tickettypes]):
+        raise ex.TickeeError("Tickettypes with orders connected to it can't be deleted. Try deactivating it instead.")
+    eventpart_ids = [eventpart.id for eventpart in event.parts]
     # remove tickettypes
-    for tickettype in event.get_ticket_types(True, True):
-        delete_tickettype(tickettype)
+    counts = delete_tickettypes(tickettypes)
     # remove eventparts
-    for eventpart in event.parts:
-        delete_eventpart(eventpart)
+    if eventpart_ids:
+        result = execute(assocs.delete().where(assocs.c.eventpart_id.in_(eventpart_ids)))
+        counts['associations'] += result.rowcount
+    counts['eventparts'] = execute(eventparts.delete().where(eventparts.c.event_id==event.id)).rowcount
+    execute(ticketchanges.delete().where(ticketchanges.c.event_id==event.id))
+    forget_deleted(TicketTypeEventPartAssociation, 'eventpart_id', eventpart_ids)
+    forget_deleted(EventPart, 'event_id', [event.id])
+    forget_deleted(TicketChange, 'event_id', [event.id])
+    log_crm("event", event.id, dict(action="delete", **counts))
     # remove event
     blogger.debug('delete event %s' % event.id)
     Session.delete(event)
+    return counts
 
 
 def start_event(account_id, name, 
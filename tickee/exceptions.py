@@ -103,6 +103,11 @@ class TicketError(TickeeError):
 class DuplicateTicketScanError(TicketError):
     """The ticket has already been scanned in."""
     error_number = 701
+    
+    def __init__(self, details=None):
+        TicketError.__init__(self)
+        # the date and device of the first scan
+        self.details = details
 
 class TicketNotFoundError(TicketError):
     """The ticket was not found."""
@@ -120,6 +125,10 @@ class InvalidPriceError(TicketError):
 class InvalidAmountError(TicketError):
     """Ticket Type has an invalid amount of units"""
 
+class InvalidManifestVersionError(TicketError):
+    """The version of the scanner manifest is invalid."""
+    error_number = 703
+
 
     
 
@@ -156,4 +165,10 @@ class PermissionDenied(TickeeError):
     """You are not allowed to execute this task"""
     error_number = 1000
 
-# ------------------------------------------------------------------------------
\ No newline at end of file
+# ------------------------------------------------------------------------------
+
+class InvalidCursorError(TickeeError):
+    """The cursor of the page is invalid."""
+    error_number = 1100
+
+# ------------------------------------------------------------------------------
@@ -1,19 +1,37 @@
+from tickee.core.db import enable_sqlite_savepoints
 import importlib
 import logging
 import logging.config
 import sqlahelper
 import sqlalchemy
+import sys
+import transaction
 try:
     import settings # Assumed to be in the same directory.
 except ImportError:
-    import sys
     sys.stderr.write("Error: Can't find the file 'settings.py' in the directory containing %r. It appears you've customized things.\n(If the file settings.py does indeed exist, it's causing an ImportError somehow.)\n" % __file__)
     sys.exit(1)
 
 tlogger = logging.getLogger('technical')
 
+# Maintenance commands: python manage.py <command> [arguments]
+COMMANDS = {
+    'rotate_crm': 'tickee.core.crm.processing.rotate_crm',
+    'add_code_keys': 'tickee.db.migrations.add_code_keys',
+    'add_notification_claims': 'tickee.db.migrations.add_notification_claims',
+    'add_ticket_changes': 'tickee.db.migrations.add_ticket_changes',
+    'denormalize_event_ids': 'tickee.db.migrations.denormalize_event_ids',
+    'promote_meta_flags': 'tickee.db.migrations.promote_meta_flags',
+    'rebuild_rollups': 'tickee.statistics.rollups.rebuild_rollups',
+    'reconcile_inventory': 'tickee.tickettypes.processing.reconcile_inventory',
+    'shard_inventory': 'tickee.tickettypes.processing.shard_inventory',
+    'unique_ticketscans': 'tickee.db.migrations.unique_ticketscans',
+}
+
 def load_database(database=settings.DATABASE):
     engine = sqlalchemy.engine_from_config(database, prefix='')
+    if engine.dialect.name == 'sqlite':
+        enable_sqlite_savepoints(engine)
     sqlahelper.add_engine(engine)
     tlogger.info("database set up: %s" % engine)
     for package in settings.INSTALLED_APPS:
@@ -33,6 +51,28 @@ def load_database(database=settings.DATABASE):
 def reload_logging(ini_file='./logging.ini'):
     logging.config.fileConfig(ini_file)    
 
+
+def run_command(name, *args):
+    """ Runs a maintenance command inside a transaction. """
+    if name not in COMMANDS:
+        sys.stderr.write("Unknown command '%s'. Available commands: %s\n" \
+                         % (name, ", ".join(sorted(COMMANDS))))
+        sys.exit(1)
+    module_name, function_name = COMMANDS[name].rsplit('.', 1)
+    command = getattr(importlib.import_module(module_name), function_name)
+    try:
+        result = command(*args)
+    except Exception:
+        transaction.abort()
+        tlogger.exception("command %s failed" % name)
+        raise
+    else:
+        transaction.commit()
+        tlogger.info("command %s finished: %s" % (name, result))
+        return result
+
 if __name__ == "__main__":
     reload_logging()
-    load_database()
\ No newline at end of file
+    load_database()
+    if len(sys.argv) > 1:
+        run_command(sys.argv[1], *sys.argv[2:])
\ No newline at end of file
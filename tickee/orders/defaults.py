@@ -0,0 +1,9 @@
+ORDER_SESSION_DURATION = 600 # seconds
+
+# maximum amount of order sessions timed out per transaction and per run of
+# the expiry engine.
+EXPIRY_BATCH_SIZE = 500
+EXPIRY_MAX_BATCHES = 20
+
+# unfinished ticket issuance jobs are resumed after this amount of seconds.
+ISSUANCE_RESUME_AFTER = 300
@@ -1,23 +1,21 @@
 from celery.task import task
 from tickee.accounts.manager import lookup_account_by_name
 from tickee.core import marshalling, entrypoint
+from tickee.core.pagination import list_or_page
 from tickee.core.security.oauth2.manager import lookup_account_for_client
-from tickee.db.models.eventpart import EventPart
 from tickee.db.models.order import Order
 from tickee.db.models.ticketorder import TicketOrder
-from tickee.db.models.tickettype import TicketTypeEventPartAssociation, \
-    TicketType
 from tickee.orders import states
 from tickee.orders.manager import lookup_order_by_key, lookup_order_by_id
 from tickee.orders.marshalling import order_to_dict, ticketorder_to_dict, \
-    order_to_dict2, order_to_shortdict
+    order_to_dict2, order_to_shortdict, orders_to_dicts2
 from tickee.orders.processing import start_order, add_tickets, finish_order, \
     delete_order
 from tickee.orders.states import PURCHASED
-from tickee.orders.tasks import timeout_sessions, mail_order
+from tickee.orders.tasks import mail_order
 from tickee.paymentproviders.entrypoints import \
     checkout_order as payment_checkout
-from tickee.tickets.marshalling import ticket_to_dict
+from tickee.tickets.marshalling import tickets_to_dicts
 from tickee.tickets.permissions import require_tickettype_owner
 from tickee.users.manager import lookup_user_by_id
 from tickee.users.marshalling import user_to_dict
@@ -37,7 +35,7 @@ Session = sqlahelper.get_session()
 def order_delete(client_id, order_key):
     """ Deletes the order """
     order = lookup_order_by_key(order_key)
-    delete_order(order)
+    return delete_order(order)
 
 
 @task(name="orders.list")
@@ -55,10 +53,9 @@ def order_list(client_id, order_id=None):
                           user = user_to_dict(order.user),
                           account = dict(id = order.account_id,
                                          name = order.account.name),
-                          tickets = map(lambda t: ticket_to_dict(t, 
-                                                                 include_scanned=True, 
-                                                                 include_user=False),
-                                      order.get_tickets()),
+                          tickets = tickets_to_dicts(order.get_tickets(),
+                                                   include_scanned=True, 
+                                                   include_user=False),
                           orders = map(lambda to: ticketorder_to_dict(to), order.ordered_tickets))
             return [details]
     return []
@@ -86,7 +83,7 @@ def gift(client_id, order_key, user_id=None):
         user = None
         
     order.checkout(user)
-    order.meta['gifted'] = True
+    order.is_gifted = True
     result = order_to_dict(order, include_ordered_tickets=True) 
     finish_order(order, as_guest=True)
     return result
@@ -101,7 +98,7 @@ def paper(client_id, order_key, user_id ):
     user = lookup_user_by_id(user_id)
     
     order.checkout(user)
-    order.meta['paper'] = True
+    order.is_paper = True
     result = order_to_dict(order, include_ordered_tickets=True) 
     finish_order(order, send_mail=False)
     return result
@@ -122,29 +119,31 @@ def from_user(client_id, user_id, include_failed=False):
     if not include_failed:
         orders = orders.filter(Order.status==states.PURCHASED)
     
-    return map(lambda o: order_to_dict2(o, fields=['account', 'key', 'events']), 
-               orders.all())
+    return orders_to_dicts2(orders.all(), fields=['account', 'key', 'events'])
 
 @task(name="orders.from_event")
 @entrypoint()
-def from_event(client_id, event_id):
-    """ Lists all orders of an event """
-    orders = Session.query(Order).join(TicketOrder,TicketType,TicketTypeEventPartAssociation, EventPart)\
+def from_event(client_id, event_id, cursor=None, limit=None):
+    """ Lists all orders of an event. If a cursor or a limit is given, returns 
+    a page of them as dict(orders=[...], next=<cursor of the next page or None>). """
+    orders = Session.query(Order).join(TicketOrder)\
                     .filter(Order.status == states.PURCHASED)\
-                    .filter(EventPart.event_id == event_id).all()
+                    .filter(TicketOrder.event_id == event_id)\
+                    .distinct()
     
-    return map(order_to_shortdict, orders)
+    return list_or_page(orders, (Order.id,), order_to_shortdict, 'orders', cursor, limit)
 
 
 @task(name="orders.from_account")
 @entrypoint()
-def from_account(client_id, account_id):
-    """ Lists all orders of an account """
+def from_account(client_id, account_id, cursor=None, limit=None):
+    """ Lists all orders of an account. If a cursor or a limit is given, returns 
+    a page of them as dict(orders=[...], next=<cursor of the next page or None>). """
     orders = Session.query(Order)\
                     .filter(Order.status == states.PURCHASED)\
-                    .filter(Order.account_id == account_id).all()
+                    .filter(Order.account_id == account_id)
     
-    return map(order_to_shortdict, orders)
+    return list_or_page(orders, (Order.id,), order_to_shortdict, 'orders', cursor, limit)
 
 
 
@@ -153,10 +152,10 @@ def from_account(client_id, account_id):
 def order_checkout(client_id, order_key, payment_required=True, redirect_url=None, user_id=None):
     """ Checks out the order """
     order = lookup_order_by_key(order_key)
-    if order.meta.get('gifted', False):
+    if order.is_gifted:
         # gift order
         return gift(client_id, order_key, user_id)
-    elif order.meta.get('paper', False):
+    elif order.is_paper:
         # paper ticket
         return paper(client_id, order_key, user_id)
     else:
@@ -176,8 +175,6 @@ def order_new(client_id, user_id, tickettype_id, amount, account_short=None, as_
         user_id: 
             Id of the user to start a session for.
     """
-    timeout_sessions(600)
-    
     # assert permission to order tickettype
     if client_id is not None:
         require_tickettype_owner(client_id, tickettype_id)
@@ -197,11 +194,11 @@ def order_new(client_id, user_id, tickettype_id, amount, account_short=None, as_
         
     # set order as guest (optional)
     if as_guest:
-        order.meta['gifted'] = True
+        order.is_gifted = True
         
     # set order as paper ticket (optional)
     if as_paper:
-        order.meta['paper'] = True
+        order.is_paper = True
         
     add_tickets(order, tickettype_id, amount)
 
@@ -231,9 +228,6 @@ def order_add(client_id, order_key, tickettype_id, amount, meta=None):
         was added to the order as well as an "order_key" used for checkout
         purposes.
     """
-    # Security    
-    timeout_sessions(600)
-
     # assert permission to order tickettype
     if client_id is not None:
         require_tickettype_owner(client_id, tickettype_id)
@@ -274,10 +268,9 @@ def order_details(client_id, order_key):
                   account = dict(id = order.account_id,
                                  name = order.account.name),
                   redirect_url = order.meta.get("redirect_url"),
-                  tickets = map(lambda t: ticket_to_dict(t, 
-                                                        include_scanned=True, 
-                                                        include_user=False),
-                              order.get_tickets()),
+                  tickets = tickets_to_dicts(order.get_tickets(),
+                                           include_scanned=True, 
+                                           include_user=False),
                   orders = map(lambda to: ticketorder_to_dict(to), order.ordered_tickets))
     if order.status == PURCHASED:
         result['purchased_on'] = marshalling.date(order.purchased_on)
@@ -288,9 +281,8 @@ def order_details(client_id, order_key):
 @entrypoint()
 def started_order_details(client_id, order_key):
     """ """
-    timeout_sessions()
     order = om.lookup_order_by_key(order_key)
-    if order.status == states.STARTED and not order.is_locked():
+    if order.status == states.STARTED and not order.is_locked() and not order.is_expired():
         return order_to_dict2(order, fields=["overview", "account"])
     else:
         raise ex.OrderNotFoundError()
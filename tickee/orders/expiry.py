@@ -0,0 +1,101 @@
+"""
+Expiry Engine
+=============
+
+    Order sessions that were started more than ``ORDER_SESSION_DURATION``
+    seconds ago without being purchased time out and release their tickets.
+
+    Instead of loading and timing out every ``Order`` separately, the engine
+    times out a bounded batch of orders with a single ``UPDATE`` (returning
+    the ids of the orders on databases supporting ``RETURNING``), using the
+    index on the status and session start of the orders. The held units are
+    released from the inventory once per tickettype, and the caller updates
+    the availability of every affected tickettype once.
+"""
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql.expression import select, and_, func
+from tickee.core.crm.tasks import log_crm
+from tickee.core.db import execute
+from tickee.db.models.order import Order
+from tickee.db.models.ticketorder import TicketOrder
+from tickee.orders.defaults import ORDER_SESSION_DURATION, EXPIRY_BATCH_SIZE
+from tickee.orders.states import STARTED, TIMEOUT
+from tickee.tickettypes import inventory
+from tickee.tickettypes.manager import lookup_tickettype_by_id
+import datetime
+import logging
+import sqlahelper
+
+Session = sqlahelper.get_session()
+
+blogger = logging.getLogger('blm.orders')
+
+orders = Order.__table__
+
+
+def expire_sessions(max_allowed_duration=ORDER_SESSION_DURATION, batch_size=EXPIRY_BATCH_SIZE):
+    """
+    Times out a batch of order sessions that were started before a specific
+    time.
+
+    Args:
+        max_allowed_duration: amount of seconds an order has before it
+                              times out.
+        batch_size: maximum amount of orders to time out.
+
+    Returns:
+        A tuple containing the ids of the timed out orders and the ids of
+        the tickettypes of which units were released.
+    """
+    Session.flush()
+    begin_time = datetime.datetime.utcnow() - datetime.timedelta(seconds=max_allowed_duration)
+    order_ids = _timeout_orders(begin_time, batch_size)
+    if not order_ids:
+        return [], []
+    # release the held units once per tickettype
+    released = Session.query(TicketOrder.ticket_type_id, func.sum(TicketOrder.amount))\
+                      .filter(TicketOrder.order_id.in_(order_ids))\
+                      .group_by(TicketOrder.ticket_type_id).all()
+    for tickettype_id, amount in released:
+        inventory.release(lookup_tickettype_by_id(tickettype_id), int(amount or 0),
+                          STARTED, applied=True)
+    for order_id in order_ids:
+        log_crm("order", order_id, dict(action="timeout"))
+    _refresh_loaded_orders(order_ids)
+    blogger.debug("timed out %s orders" % len(order_ids))
+    return order_ids, [tickettype_id for tickettype_id, amount in released]
+
+
+# -- Internal -----------------------------------------------------------------
+
+def _timeout_orders(begin_time, batch_size):
+    """ Marks a batch of started orders as timed out and returns their ids. """
+    timeout = orders.update().where(orders.c.status==STARTED).values(status=TIMEOUT)
+    if getattr(Session.bind.dialect, 'implicit_returning', False):
+        expired = _expired_orders(begin_time, batch_size)
+        result = execute(timeout.where(orders.c.id.in_(expired)).returning(orders.c.id))
+        return [order_id for (order_id,) in result]
+    # the database does not return the updated rows: lock and select them first
+    expired = _expired_orders(begin_time, batch_size, for_update=True)
+    order_ids = [order_id for (order_id,) in Session.execute(expired)]
+    if order_ids:
+        execute(timeout.where(orders.c.id.in_(order_ids)))
+    return order_ids
+
+
+def _expired_orders(begin_time, batch_size, for_update=False):
+    """ Returns a select statement for the oldest started orders. """
+    return select([orders.c.id],
+                  and_(orders.c.status==STARTED,
+                       orders.c.session_start < begin_time),
+                  order_by=orders.c.session_start,
+                  limit=batch_size,
+                  for_update=for_update)
+
+
+def _refresh_loaded_orders(order_ids):
+    """ Sets the status of timed out orders that are loaded in the session. """
+    order_ids = set(order_ids)
+    for obj in Session.identity_map.values():
+        if isinstance(obj, Order) and obj.id in order_ids:
+            set_committed_value(obj, 'status', TIMEOUT)
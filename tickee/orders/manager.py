@@ -16,6 +16,15 @@ def has_orders_for_tickettype(tickettype):
     amount_ordered = Session.query(TicketOrder)\
                             .filter(TicketOrder.ticket_type_id==tickettype.id).count()
     return amount_ordered > 0
+
+def has_orders_for_tickettypes(tickettype_ids):
+    """ Returns ``True`` if there have been tickets ordered for any of the
+    tickettypes """
+    if not tickettype_ids:
+        return False
+    ordered = Session.query(TicketOrder.id)\
+                     .filter(TicketOrder.ticket_type_id.in_(tickettype_ids)).first()
+    return ordered is not None
     
     
 
@@ -1,6 +1,12 @@
+from sqlalchemy.orm import joinedload
 from tickee.accounts.marshalling import account_to_dict, account_to_dict2
+from tickee.core.marshalling import Memo
+from tickee.db.models.ticketorder import TicketOrder
 from tickee.events.marshalling import event_to_dict, event_to_dict2
 from tickee.users.marshalling import user_to_dict
+import sqlahelper
+
+Session = sqlahelper.get_session()
 
 def ticketorder_to_dict(ticketorder):
     """
@@ -17,39 +23,79 @@ def order_to_shortdict(order):
     return order_to_dict(order, short=True)
 
 def order_to_dict(order, include_ordered_tickets=False, include_total=False,
-                         include_redirect_url=False, short=False):
+                         include_redirect_url=False, short=False, memo=None):
     """ Transforms an ``Order`` object into a dictionary. """
+    memo = memo or Memo()
     result = dict(key=order.order_key,
                   account=order.account_id)
     if order.user_id is not None:
         result['user'] = order.user_id
-        result['guest'] = order.meta.get('gifted')
-        result['paper'] = order.meta.get('paper')
+        result['guest'] = order.is_gifted
+        result['paper'] = order.is_paper
     if include_redirect_url:
         result['redirect_url'] = order.meta.get('redirect_url')
     if include_ordered_tickets:
-        sub_orders = map(ticketorder_to_dict, order.get_ticketorders())
+        ticketorders = memo(order.get_ticketorders)
+        sub_orders = map(ticketorder_to_dict, ticketorders)
+        handling_fee = sum(to.amount * memo(to.ticket_type.get_handling_fee) 
+                           for to in ticketorders)
         sub_orders.append(dict(name="Handling fee",
-                               amount=order.get_handling_fee() / 100.00))
+                               amount=handling_fee / 100.00))
         result['tickets_overview'] = sub_orders
     if include_total:
         try:
             currency = order.payment_provider.get_info('currency')
         except:
             currency = "EUR" # TODO: find correct default
-        result['total'] = dict(price=order.get_total(),
+        result['total'] = dict(price=order_total(order, memo),
                                currency=currency)
     return result
 
 
-def order_to_dict2(order, fields=["overview", "account"]):
+def orders_to_dicts(orders, **options):
+    """
+    Transforms a list of ``Order`` objects like ``order_to_dict``, taking the
+    same options. The ticketorders of all orders are fetched in one query
+    and the handling fees and events of their tickettypes looked up once.
+    """
+    orders = list(orders)
+    memo = prime_ticketorders(Memo(), orders)
+    return [order_to_dict(order, memo=memo, **options) for order in orders]
+
+
+def order_total(order, memo):
+    """ Returns the total of an order in cents, see ``Order.get_total``. """
+    return sum(to.amount * (to.ticket_type.price + memo(to.ticket_type.get_handling_fee))
+               for to in memo(order.get_ticketorders))
+
+
+def prime_ticketorders(memo, orders):
+    """ Fetches the ticketorders of a batch of orders and their tickettypes
+    in a single query. """
+    ticketorders = dict((order.id, []) for order in orders)
+    if ticketorders:
+        for ticketorder in Session.query(TicketOrder)\
+                                  .options(joinedload('ticket_type'))\
+                                  .filter(TicketOrder.order_id.in_(ticketorders.keys()))\
+                                  .order_by(TicketOrder.id):
+            ticketorders[ticketorder.order_id].append(ticketorder)
+    for order in orders:
+        memo.prime(order.get_ticketorders, {(): ticketorders[order.id]})
+    return memo
+
+
+def order_to_dict2(order, fields=["overview", "account"], memo=None):
+    memo = memo or Memo()
     result = dict()
     for field in fields:
         if field == "overview":
-            ticketorders_per_event = order.get_ticketorders_per_event()
+            ticketorders_per_event = dict()
+            for ticketorder in memo(order.get_ticketorders):
+                event = memo(ticketorder.ticket_type.get_event)
+                ticketorders_per_event.setdefault(event, []).append(ticketorder)
             events = []
             for event, ticketorders in ticketorders_per_event.iteritems():
-                event_info = event_to_dict2(event)
+                event_info = event_to_dict2(event, memo=memo)
                 event_info["tickettypes"] = map(ticketorder_to_dict, ticketorders) 
                 events.append(event_info)
             result['events'] = events
@@ -64,12 +110,25 @@ def order_to_dict2(order, fields=["overview", "account"]):
             result['key'] = order.order_key
         
         elif field == "total":
-            result['total'] = dict(amount=order.get_total() / 100.0,
+            result['total'] = dict(amount=order_total(order, memo) / 100.0,
                                    currency=None) # Todo: find currency of order
         
         elif field == "events":
-            result['events'] = map(lambda e: event_to_dict2(e, short=True), 
-                                   order.get_events())
+            events = set(memo(to.ticket_type.get_event) 
+                         for to in memo(order.get_ticketorders))
+            result['events'] = map(lambda e: event_to_dict2(e, short=True, memo=memo), 
+                                   list(events))
             
             
-    return result
\ No newline at end of file
+    return result
+
+
+def orders_to_dicts2(orders, fields=["overview", "account"]):
+    """
+    Transforms a list of ``Order`` objects like ``order_to_dict2``. The 
+    ticketorders of all orders are fetched in one query and their events
+    marshalled once.
+    """
+    orders = list(orders)
+    memo = prime_ticketorders(Memo(), orders)
+    return [order_to_dict2(order, fields, memo) for order in orders]
\ No newline at end of file
@@ -0,0 +1,48 @@
+from sqlalchemy.schema import Column, ForeignKey
+from sqlalchemy.types import Integer, String, DateTime, Boolean, Enum
+from tickee.orders.states import ISSUE_TICKETS, ISSUE_AVAILABILITY, ISSUE_MAIL, \
+    ISSUE_DONE
+import datetime
+import sqlahelper
+
+Base = sqlahelper.get_base()
+
+
+class IssuanceJob(Base):
+    """
+    Issuance of the tickets of a purchased ``Order``. The job is processed in
+    stages by ``tickee.orders.tasks.run_issuance`` and remembers the stage it
+    reached, so an interrupted issuance resumes where it stopped.
+    """
+
+    __tablename__ = 'tickee_order_issuance_jobs'
+
+    # Columns
+
+    order_id = Column(Integer, ForeignKey('tickee_orders.id'), primary_key=True)
+    stage = Column(Enum(ISSUE_TICKETS, ISSUE_AVAILABILITY, ISSUE_MAIL, ISSUE_DONE,
+                        name='issuance_stages'), index=True)
+    send_mail = Column(Boolean)
+    as_guest = Column(Boolean)
+    attempts = Column(Integer)
+    last_error = Column(String)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    # Constructor
+
+    def __init__(self, order_id, send_mail=True, as_guest=False):
+        self.order_id = order_id
+        self.stage = ISSUE_TICKETS
+        self.send_mail = send_mail
+        self.as_guest = as_guest
+        self.attempts = 0
+        self.created_at = datetime.datetime.utcnow()
+        self.updated_at = self.created_at
+
+    def is_finished(self):
+        return self.stage == ISSUE_DONE
+
+    def __repr__(self):
+        return "<IssuanceJob: Order %s (%s)>" % (self.order_id, self.stage)
@@ -1,16 +1,20 @@
+from sqlalchemy.sql.expression import select, func
 from tickee.core.crm.tasks import log_crm
+from tickee.core.db import execute, forget_deleted
 from tickee.db.models.order import Order
 from tickee.db.models.ticketorder import TicketOrder
-from tickee.orders.manager import get_started_order, lookup_order_by_id
+from tickee.orders.manager import get_started_order
+from tickee.orders.models import IssuanceJob
 from tickee.orders.states import PURCHASED
-from tickee.orders.tasks import mail_order
+from tickee.orders.tasks import start_issuance, run_issuance
+from tickee.scanning.models import TicketScan
+from tickee.statistics.rollups import remove_order
 from tickee.subscriptions.permissions import has_available_transactions
-from tickee.tickets.manager import tickets_from_order
-from tickee.tickets.processing import delete_ticket
-from tickee.tickets.tasks import create_tickets
+from tickee.tickets import changes
+from tickee.tickets.models import Ticket
+from tickee.tickettypes import inventory
 from tickee.tickettypes.manager import lookup_tickettype_by_id
-from tickee.tickettypes.tasks import update_availability
-import datetime
+from tickee.tickettypes.tasks import request_availability_update
 import logging
 import sqlahelper
 import tickee.exceptions as ex
@@ -20,17 +24,55 @@ blogger = logging.getLogger('blm.orders')
 
 Session = sqlahelper.get_session()
 
+scans = TicketScan.__table__
+tickets = Ticket.__table__
+ticketorders = TicketOrder.__table__
+jobs = IssuanceJob.__table__
+
 def delete_order(order):
-    """ Removes a complete order, including tickets """
-    # remove ticket
-    for ticket in tickets_from_order(order):
-        delete_ticket(ticket)
-    # remove ticket order
-    for ticketorder in order.ordered_tickets:
-        Session.delete(ticketorder)
+    """
+    Removes a complete order, including its tickets and their scans, with a
+    single statement per table.
+    
+    Returns:
+        A dictionary with the amount of removed ``tickets``, ``ticketorders``
+        and ``scans``.
+    """
+    if order.is_purchased():
+        remove_order(order)
+    Session.flush()
+    ticketorder_ids = [row.id for row in execute(select([ticketorders.c.id])\
+                                                  .where(ticketorders.c.order_id==order.id))]
+    removed_tickets = Session.query(Ticket.id, Ticket.event_id)\
+                             .filter(Ticket.ticket_order_id.in_(ticketorder_ids)).all() \
+                      if ticketorder_ids else []
+    # release the units of the order per tickettype
+    units = Session.query(TicketOrder.ticket_type_id, func.sum(TicketOrder.amount))\
+                   .filter(TicketOrder.order_id==order.id)\
+                   .group_by(TicketOrder.ticket_type_id).all()
+    for tickettype_id, amount in units:
+        inventory.release(lookup_tickettype_by_id(tickettype_id), int(amount or 0), order.status)
+    # remove scans, tickets and ticket orders
+    counts = dict(scans=0, tickets=0, ticketorders=0)
+    if ticketorder_ids:
+        ticket_ids = select([tickets.c.id]).where(tickets.c.ticket_order_id.in_(ticketorder_ids))
+        counts['scans'] = execute(scans.delete().where(scans.c.ticket_id.in_(ticket_ids))).rowcount
+        counts['tickets'] = execute(tickets.delete()\
+                                           .where(tickets.c.ticket_order_id.in_(ticketorder_ids))).rowcount
+        counts['ticketorders'] = execute(ticketorders.delete()\
+                                                     .where(ticketorders.c.order_id==order.id)).rowcount
+    execute(jobs.delete().where(jobs.c.order_id==order.id))
+    forget_deleted(TicketScan, 'ticket_id', [ticket_id for ticket_id, ticket_event_id in removed_tickets])
+    forget_deleted(Ticket, 'ticket_order_id', ticketorder_ids)
+    forget_deleted(TicketOrder, 'order_id', [order.id])
+    forget_deleted(IssuanceJob, 'order_id', [order.id])
+    changes.record_changes_per_event(sorted(removed_tickets), changes.DELETED)
+    for tickettype_id, amount in units:
+        request_availability_update(tickettype_id)
+    log_crm("order", order.id, dict(action="delete", **counts))
     # finally remove order
     Session.delete(order)
-
+    return counts
 
 
 def start_order(user, account):
@@ -59,6 +101,10 @@ def start_order(user, account):
             # create new order if not possible
             return new_order(user, account)
         else:
+            # the expiry engine has not timed out the session yet
+            if started_order.is_expired():
+                started_order.timeout()
+                return new_order(user, account)
             blogger.info("existing order %s found for user %s and account %s" % (started_order.id, user.id, account.id))
             return started_order
     else:
@@ -109,6 +155,11 @@ def add_tickets(order, tickettype_id, amount):
     if amount < 0:
         blogger.debug('failed adding invalid amount %s to order %s' % (amount, order.id))
         raise ex.InvalidAmountError("You must purchase at least one ticket.")
+    # time out the session if the expiry engine has not done so yet
+    if order.is_expired():
+        order.timeout()
+        blogger.debug('failed adding to timed out order %s' % order.id)
+        raise ex.OrderLockedError("The order session has timed out.")
     # order is not locked
     if order.is_locked() or order.status == PURCHASED:
         blogger.debug('failed adding to locked order %s' % order.id)
@@ -120,10 +171,11 @@ def add_tickets(order, tickettype_id, amount):
         blogger.debug('failed adding inactive tickettype %s to order %s' % (tickettype_id, order.id))
         raise ex.InactiveTicketTypeError("The ticket type is not active.")
     # tickettype is connected to an event
-    if tickettype.get_event() is None:
+    event = tickettype.get_event()
+    if event is None:
         raise ex.EventNotFoundError("The tickettype is not connected to any event.")
     # tickettype is owned by account connected to the order
-    if order.account != tickettype.get_event().account:
+    if order.account != event.account:
         raise ex.AccountError("only orders for tickettypes of account %s possible" % order.account.id)
     # there are still transactions available for the account or it is a free tickettype.
     if not (has_available_transactions(order.account) or tickettype.is_free()):
@@ -136,12 +188,13 @@ def add_tickets(order, tickettype_id, amount):
         # check if ticketorder contains one or more tickets
         if amount <= 0:
             raise ex.AmountNotAvailableError('at least 1 ticket required')
-        # check if tickettype still has enough available
-        if not order.meta.get('gifted', False) and not order.meta.get('paper', False) and not tickettype.has_available(amount):
+        # claim the tickets if the tickettype still has enough available
+        forced = order.is_gifted or order.is_paper
+        if not inventory.reserve(tickettype, amount, order.status, force=forced):
             blogger.info('failed to add unavailable amount %s of tickettype %s to order %s'\
                           % (amount, tickettype_id, order.id))
             raise ex.AmountNotAvailableError("Not enough tickets available.")
-        ticketorder = TicketOrder(order.id, tickettype_id, amount)
+        ticketorder = TicketOrder(order.id, tickettype_id, amount, event.id)
         blogger.info('created ticketorder for order %s (%sx tickettype %s)'\
                      % (order.id, amount, tickettype_id))
         log_crm("order", order.id, dict(action="add",
@@ -153,14 +206,20 @@ def add_tickets(order, tickettype_id, amount):
     else:
         if amount == 0:
             # remove ticketorder if amount is 0
+            inventory.release(tickettype, ticketorder.amount, order.status)
             Session.delete(ticketorder)
         else:
-            # check if additional amount is still available
             additional_tickets = amount - ticketorder.amount
-            if not order.meta.get('gifted', False) and additional_tickets >= 0 and not tickettype.has_available(additional_tickets):
-                blogger.debug('failed to add unavailable amount %s of tickettype %s to order %s'\
-                              % (amount, tickettype_id, order.id))
-                raise ex.AmountNotAvailableError("Not enough tickets available.")
+            # claim the additional tickets if they are still available
+            if additional_tickets >= 0:
+                forced = order.is_gifted
+                if not inventory.reserve(tickettype, additional_tickets, order.status, force=forced):
+                    blogger.debug('failed to add unavailable amount %s of tickettype %s to order %s'\
+                                  % (amount, tickettype_id, order.id))
+                    raise ex.AmountNotAvailableError("Not enough tickets available.")
+            # give back the tickets that were removed
+            else:
+                inventory.release(tickettype, -additional_tickets, order.status)
             ticketorder.amount = amount
         
         # report update
@@ -170,7 +229,7 @@ def add_tickets(order, tickettype_id, amount):
                                         tickettype_id=tickettype_id,
                                         amount=amount))
     order.touch()
-    update_availability.delay(tickettype.id)
+    request_availability_update(tickettype.id)
     Session.flush()
     
 
@@ -183,18 +242,10 @@ def finish_order(order, send_mail=True, as_guest=False):
     try:
         order_id = order.id
         # mark order as purchased
-        order.purchase()
-        # handle ticket creation
-        create_tickets(order)
-        order.meta['tickets_created'] = datetime.datetime.utcnow().strftime("%d-%m-%Y %H:%M:%S UTC%z")
+        start_issuance(order, send_mail=send_mail, as_guest=as_guest)
         transaction.commit()
-        # send mail if requested
-        if send_mail:
-            mail_order.delay(order_id, as_guest=as_guest, auto_retry=True)
-        # update tickettype availability in orders
-        order = lookup_order_by_id(order_id)
-        for tickettype in order.get_ticket_types():
-            update_availability.delay(tickettype.id)
+        # handle ticket creation, availability and mail
+        run_issuance(order_id)
     except Exception as e:
         blogger.exception("failed finalizing order %s" % order_id)
         raise e
\ No newline at end of file
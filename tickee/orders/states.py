@@ -1,4 +1,9 @@
 STARTED = "started"
 TIMEOUT = "timeout"
 PURCHASED = "purchased"
-CANCELLED = "cancelled"
\ No newline at end of file
+CANCELLED = "cancelled"
+# stages of the ticket issuance of a purchased order
+ISSUE_TICKETS = "tickets"
+ISSUE_AVAILABILITY = "availability"
+ISSUE_MAIL = "mail"
+ISSUE_DONE = "done"
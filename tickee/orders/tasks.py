@@ -1,14 +1,20 @@
 # -*- coding: utf-8 -*-
 
 from celery.task import task
-from jinja2.environment import Environment
-from jinja2.loaders import PackageLoader
 from tickee.core.crm.tasks import log_crm
-from tickee.core.mail import send_email
-from tickee.core.validators import validate_email
-from tickee.db.models.order import Order
-from tickee.orders.states import STARTED
-from tickee.tickettypes.tasks import update_availability
+from tickee.core.mail.outbox import queue_email
+from tickee.core.mail.templates import render
+from tickee.core.validators import validate_email, ValidationError
+from tickee.orders.defaults import ORDER_SESSION_DURATION, EXPIRY_BATCH_SIZE, \
+    EXPIRY_MAX_BATCHES, ISSUANCE_RESUME_AFTER
+from tickee.orders.expiry import expire_sessions
+from tickee.orders.models import IssuanceJob
+from tickee.orders.states import ISSUE_TICKETS, ISSUE_AVAILABILITY, ISSUE_MAIL, \
+    ISSUE_DONE
+from tickee.statistics.rollups import record_order
+from tickee.tickets.tasks import create_tickets
+from tickee.tickettypes import availability
+from tickee.tickettypes.tasks import request_availability_update
 import datetime
 import logging
 import sqlahelper
@@ -26,75 +32,28 @@ Session = sqlahelper.get_session()
 @task(default_retry_delay=60)
 def mail_order(order_id, fake=False, as_guest=False, auto_retry=False):
     """
-    Sends the mail of the order to the user.
+    Queues the mail of the order to the user, it is sent by the outbox once
+    the transaction is committed.
     """
-    # fetch information for template
     try:
         order = om.lookup_order_by_id(order_id)
-        
-        # generate template
-        env = Environment(loader=PackageLoader('tickee', 'templates'),
-                          extensions=['jinja2.ext.with_'])
-        
-        validate_email(order.user.email)
-        
-        if not order.user.email:
-            raise ex.OrderError("user has no email.")
-        
-        if len(order.get_tickets()) == 0:
-            raise ex.TicketError("no tickets found.")
-        
-        # send out a mail per event
-        tickets_per_event = order.get_tickets_per_event()
-        for event in tickets_per_event:
-            tickets = tickets_per_event[event]
-                    
-            # send generated mail
-            blogger.info('sending mail for "order %s - event %s" to user %s (%s)' % (order_id,
-                                                                                     event.id, 
-                                                                                     order.user.id, 
-                                                                                     order.user.email))
-            
-            if not fake:
-                htmlbody = env.get_template('mail_order_of_event.html')\
-                              .render(event=event, 
-                                      tickets=tickets,
-                                      order=order, 
-                                      as_guest=as_guest, 
-                                      account=order.account)
-                plainbody = env.get_template('mail_order_of_event.txt')\
-                               .render(event=event, 
-                                       tickets=tickets,
-                                       order=order, 
-                                       as_guest=as_guest, 
-                                       account=order.account)
-                                          
-                send_email("Tickee Ticketing <tickets@tick.ee>", 
-                           order.user.email, 
-                           "Your tickets for '%s' are here!" % event.name, 
-                           htmlbody,
-                           plainbody)
-            
-        
-        
-        order.meta['tickets_sent'] = datetime.datetime.utcnow().strftime("%d-%m-%Y %H:%M:%S UTC%z")
-        log_crm("order", order.id, dict(action="mailed",
-                                           addressee=order.user.email))
+        queue_order_mail(order, as_guest, fake)
         transaction.commit()
         return True
     except Exception as e:
-        tlogger.exception("failed sending mail for order %s: %s" % (order_id, e))
-        order.meta['tickets_sent'] = "failed @ %s" % datetime.datetime.utcnow().strftime("%d-%m-%Y %H:%M:%S UTC%z")
-        transaction.commit()
+        transaction.abort()
+        tlogger.exception("failed queueing mail for order %s: %s" % (order_id, e))
         if auto_retry:
             mail_order.retry(exc=e)
         return False
 
 @task(ignore_result=True)
-def timeout_sessions(max_allowed_duration=600):
+def timeout_sessions(max_allowed_duration=ORDER_SESSION_DURATION):
     """
     Times out all order sessions that have been created outside a specific 
-    time. 
+    time. The orders are timed out in batches of ``EXPIRY_BATCH_SIZE`` with
+    a maximum of ``EXPIRY_MAX_BATCHES`` per run, each batch committed 
+    separately. 
     
     Args:
         max_allowed_duration: amount of seconds an order has before it 
@@ -103,21 +62,174 @@ def timeout_sessions(max_allowed_duration=600):
     Returns:
         The amount of orders that were timed out.
     """
+    total = 0
+    tickettype_ids = set()
     try:
-        # calculate the datetime of the oldest allowed session
-        begin_time = datetime.datetime.utcnow() - datetime.timedelta(seconds=max_allowed_duration)
-        # fetch all order sessions before this datetime
-        orders = Session.query(Order).filter(Order.session_start < begin_time)\
-                                     .filter(Order.status.in_([STARTED]))
-        # time out found orders
-        total = 0
-        for order in orders:
-            log_crm("order", order.id, dict(action="timeout"))
-            order.timeout()
-            # update ticket type availability
-            for tickettype in order.get_ticket_types():
-                update_availability.apply_async(args=[tickettype.id], countdown=2)
-            total += 1
-        return total
+        for i in range(EXPIRY_MAX_BATCHES):
+            order_ids, released = expire_sessions(max_allowed_duration, EXPIRY_BATCH_SIZE)
+            transaction.commit()
+            total += len(order_ids)
+            tickettype_ids.update(released)
+            if len(order_ids) < EXPIRY_BATCH_SIZE:
+                break
     except Exception as e:
-        tlogger.exception("failed timing out sessions")
\ No newline at end of file
+        transaction.abort()
+        tlogger.exception("failed timing out sessions")
+    # update ticket type availability once per tickettype
+    if tickettype_ids:
+        for tickettype_id in tickettype_ids:
+            request_availability_update(tickettype_id)
+        transaction.commit()
+    return total
+
+@task(default_retry_delay=60, max_retries=10, ignore_result=True)
+def issue_order(order_id):
+    """
+    Runs the remaining stages of the ticket issuance of a purchased order.
+    Safe to run more than once for the same order.
+    """
+    try:
+        return run_issuance(order_id)
+    except Exception as e:
+        transaction.abort()
+        tlogger.exception("failed issuing tickets of order %s" % order_id)
+        job = Session.query(IssuanceJob).get(order_id)
+        if job is not None:
+            job.last_error = repr(e)[:255]
+            job.updated_at = datetime.datetime.utcnow()
+            transaction.commit()
+        issue_order.retry(exc=e)
+
+@task(ignore_result=True)
+def resume_issuance(max_idle_duration=ISSUANCE_RESUME_AFTER):
+    """
+    Queues the issuance of orders of which the issuance has not progressed
+    for a specific amount of seconds, e.g. after a worker was stopped.
+    
+    Returns:
+        The amount of issuance jobs that were queued.
+    """
+    last_update = datetime.datetime.utcnow() - datetime.timedelta(seconds=max_idle_duration)
+    order_ids = [order_id for (order_id,) in Session.query(IssuanceJob.order_id)\
+                                                    .filter(IssuanceJob.stage!=ISSUE_DONE)\
+                                                    .filter(IssuanceJob.updated_at < last_update)]
+    transaction.commit()
+    for order_id in order_ids:
+        blogger.warning("resuming ticket issuance of order %s" % order_id)
+        issue_order.delay(order_id)
+    return len(order_ids)
+
+# Synchronous Tasks
+
+def start_issuance(order, send_mail=True, as_guest=False):
+    """
+    Marks the order as purchased, adds it to the sales rollups and records 
+    the issuance of its tickets, which is done by ``run_issuance`` once the
+    transaction is committed.
+    
+    Returns:
+        The ``IssuanceJob`` of the order.
+    """
+    order.purchase()
+    job = Session.query(IssuanceJob).get(order.id)
+    if job is None:
+        job = IssuanceJob(order.id, send_mail, as_guest)
+        Session.add(job)
+        record_order(order)
+        log_crm("order", order.id, dict(action="issuance queued"))
+    return job
+
+def queue_order_mail(order, as_guest=False, fake=False):
+    """
+    Adds a mail per event containing the tickets of the order to the outbox.
+    """
+    validate_email(order.user.email)
+    
+    if not order.user.email:
+        raise ex.OrderError("user has no email.")
+    
+    if len(order.get_tickets()) == 0:
+        raise ex.TicketError("no tickets found.")
+    
+    # send out a mail per event
+    tickets_per_event = order.get_tickets_per_event()
+    for event in tickets_per_event:
+        tickets = tickets_per_event[event]
+        
+        blogger.info('queueing mail for "order %s - event %s" to user %s (%s)' % (order.id,
+                                                                                  event.id, 
+                                                                                  order.user.id, 
+                                                                                  order.user.email))
+        
+        if not fake:
+            htmlbody = render('mail_order_of_event.html',
+                              event=event, 
+                              tickets=tickets,
+                              order=order, 
+                              as_guest=as_guest, 
+                              account=order.account)
+            plainbody = render('mail_order_of_event.txt',
+                               event=event, 
+                               tickets=tickets,
+                               order=order, 
+                               as_guest=as_guest, 
+                               account=order.account)
+            
+            queue_email("Tickee Ticketing <tickets@tick.ee>", 
+                        order.user.email, 
+                        "Your tickets for '%s' are here!" % event.name, 
+                        htmlbody,
+                        plainbody,
+                        object_name="order",
+                        object_id=order.id)
+    
+    order.tickets_sent_on = datetime.datetime.utcnow()
+
+def run_issuance(order_id):
+    """
+    Runs the remaining stages of the issuance of an order, committing after
+    every stage:
+    
+        -  ``ISSUE_TICKETS``: creates the tickets of the order.
+        -  ``ISSUE_AVAILABILITY``: recomputes the availability of the 
+           tickettypes of the order.
+        -  ``ISSUE_MAIL``: adds the mail containing the tickets to the 
+           outbox.
+    
+    Returns:
+        True if the issuance is finished, False if the order has no issuance.
+    """
+    attempt_started = False
+    while True:
+        job = Session.query(IssuanceJob).filter(IssuanceJob.order_id==order_id)\
+                                        .with_lockmode('update').first()
+        if job is None:
+            blogger.error("no ticket issuance found for order %s" % order_id)
+            transaction.abort()
+            return False
+        if job.is_finished():
+            transaction.abort()
+            return True
+        order = om.lookup_order_by_id(order_id)
+        if not attempt_started:
+            job.attempts += 1
+            attempt_started = True
+        if job.stage == ISSUE_TICKETS:
+            create_tickets(order)
+            order.tickets_created_on = datetime.datetime.utcnow()
+            job.stage = ISSUE_AVAILABILITY
+        elif job.stage == ISSUE_AVAILABILITY:
+            availability.recompute([tickettype.id for tickettype in order.get_ticket_types()])
+            job.stage = ISSUE_MAIL
+        elif job.stage == ISSUE_MAIL:
+            if job.send_mail:
+                try:
+                    queue_order_mail(order, as_guest=job.as_guest)
+                except (ValidationError, ex.TickeeError) as e:
+                    blogger.error("not mailing the tickets of order %s: %s" % (order_id, e))
+            job.stage = ISSUE_DONE
+            job.finished_at = datetime.datetime.utcnow()
+        job.last_error = None
+        job.updated_at = datetime.datetime.utcnow()
+        blogger.debug("ticket issuance of order %s reached stage %s" % (order_id, job.stage))
+        transaction.commit()
@@ -2,14 +2,19 @@ from tickee.accounts.processing import create_account
 from tickee.core.currency.processing import create_currency
 from tickee.events.eventparts.processing import add_eventpart
 from tickee.events.processing import start_event
+from tickee.orders.expiry import expire_sessions
 from tickee.orders.processing import start_order, add_tickets
-from tickee.orders.states import TIMEOUT, STARTED, PURCHASED
-from tickee.orders.tasks import mail_order, timeout_sessions
+from tickee.orders.states import TIMEOUT, STARTED, PURCHASED, ISSUE_TICKETS, \
+    ISSUE_DONE
+from tickee.orders.tasks import mail_order, timeout_sessions, start_issuance, \
+    run_issuance
 from tickee.subscriptions.models import Subscription, FREE
 from tickee.tests import BaseTestCase
 from tickee.tickets.tasks import create_tickets
 from tickee.tickettypes.processing import create_tickettype, link_tickettype_to_event
 from tickee.users.processing import create_user
+import datetime
+import tickee.exceptions as ex
 
 
 class OrderStartTestCase(BaseTestCase):
@@ -73,4 +78,56 @@ class OrderStartTestCase(BaseTestCase):
         order.purchase()
         self.assertEqual(order.status, PURCHASED)
         timeout_sessions(0)
-        self.assertEqual(order.status, PURCHASED)
\ No newline at end of file
+        self.assertEqual(order.status, PURCHASED)
+
+    def test_timeout_releases_held_units(self):
+        order = start_order(self.user, self.account)
+        add_tickets(order, self.tickettype.id, 5)
+        timeout_sessions(0)
+        self.assertEqual(order.status, TIMEOUT)
+        self.assertEqual(self.tickettype.amount_available_tickets(), 10)
+
+    def test_add_tickets_to_expired_order(self):
+        order = start_order(self.user, self.account)
+        order.session_start -= datetime.timedelta(days=1)
+        self.assertRaises(ex.OrderLockedError, add_tickets, order, self.tickettype.id, 5)
+        self.assertEqual(order.status, TIMEOUT)
+        self.assertEqual(self.tickettype.amount_available_tickets(), 10)
+
+    # expire_sessions
+
+    def test_expire_sessions_in_batches(self):
+        orders = [start_order(create_user("user%s@example.com" % i), self.account) for i in range(3)]
+        order_ids, tickettype_ids = expire_sessions(0, batch_size=2)
+        self.assertEqual(len(order_ids), 2)
+        order_ids, tickettype_ids = expire_sessions(0, batch_size=2)
+        self.assertEqual(len(order_ids), 1)
+        self.assertEqual([order.status for order in orders], [TIMEOUT] * 3)
+
+    def test_expire_sessions_reports_tickettypes_once(self):
+        for i in range(3):
+            order = start_order(create_user("user%s@example.com" % i), self.account)
+            add_tickets(order, self.tickettype.id, 2)
+        order_ids, tickettype_ids = expire_sessions(0)
+        self.assertEqual(tickettype_ids, [self.tickettype.id])
+
+    # issuance
+
+    def test_start_issuance_marks_purchased(self):
+        order = start_order(self.user, self.account)
+        add_tickets(order, self.tickettype.id, 5)
+        order.checkout()
+        job = start_issuance(order, send_mail=False)
+        self.assertEqual(order.status, PURCHASED)
+        self.assertEqual(job.stage, ISSUE_TICKETS)
+        self.assertEqual(len(order.get_tickets()), 0)
+
+    def test_run_issuance_is_idempotent(self):
+        order = start_order(self.user, self.account)
+        add_tickets(order, self.tickettype.id, 5)
+        order.checkout()
+        job = start_issuance(order, send_mail=False)
+        self.assertTrue(run_issuance(order.id))
+        self.assertTrue(run_issuance(order.id))
+        self.assertEqual(job.stage, ISSUE_DONE)
+        self.assertEqual(len(order.get_tickets()), 5)
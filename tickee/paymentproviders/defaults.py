@@ -0,0 +1,9 @@
+# pending notifications are queued again after this amount of seconds.
+NOTIFICATION_RESUME_AFTER = 300
+
+# seconds to wait for a connection to and an answer of a payment provider.
+PSP_CONNECT_TIMEOUT = 5
+PSP_READ_TIMEOUT = 20
+# failed requests after which checkouts fail immediately for a while.
+PSP_BREAKER_THRESHOLD = 5
+PSP_BREAKER_RESET_TIMEOUT = 30
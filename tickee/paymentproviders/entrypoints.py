@@ -5,15 +5,14 @@ from tickee.core.security.oauth2.manager import lookup_account_for_client
 from tickee.exceptions import PaymentError
 from tickee.orders.marshalling import order_to_dict
 from tickee.orders.processing import finish_order
-from tickee.paymentproviders import states
 from tickee.paymentproviders.generic import PaymentProvider
+from tickee.paymentproviders.inbox import receive_notification, process_notification
 from tickee.paymentproviders.manager import lookup_payment_provider_info_by_id, \
     lookup_payment_provider, lookup_payment_provider_class_by_name
 from tickee.paymentproviders.marshalling import psp_to_dict
-from tickee.paymentproviders.processing import increment_transaction_count, \
-    create_payment_provider_information, validate_payment_provider_information
-from tickee.paymentproviders.tasks import update_user_information, \
-    create_payment_provider
+from tickee.paymentproviders.processing import create_payment_provider_information, \
+    validate_payment_provider_information
+from tickee.paymentproviders.tasks import create_payment_provider
 from tickee.users.manager import lookup_user_by_id
 import logging
 import sqlahelper
@@ -71,6 +70,10 @@ def psp_update(client_id, account_shortname, psp_name, psp_data):
 @task
 @entrypoint()
 def notification(psp_id, context):
+    """
+    Stores a notification of a payment provider in the inbox and answers the
+    provider immediately. The notification is processed in the background.
+    """
     # get the psp
     try:
         provider_info = lookup_payment_provider_info_by_id(psp_id)
@@ -78,100 +81,20 @@ def notification(psp_id, context):
     except Exception as e:
         return marshalling.error(e)
     
-    # process notification
+    # store notification
     try:
-        status = psp.handle_notification(context)
-        # new order received
-        blogger.info('received notification %s (%s) for order %s' % (status,
-                                                                     psp.get_name(), 
-                                                                     psp.get_order().id))
-        if status == states.PSP_NEW_ORDER:
-            handle_new_order(psp, context)
-        elif status == states.PSP_RISK_ASSESSMENT:
-            handle_risk_assessment(psp, context)
-        elif status == states.PSP_STATE_CHANGED:
-            handle_state_change(psp, context)
-        elif status == states.PSP_READY_FOR_PAYMENT:
-            handle_ready_for_payment(psp, context)
-        elif status == states.PSP_PAYED:
-            handle_payed(psp, context)
-        elif status == states.PSP_CHARGEBACK_REQUESTED:
-            handle_chargeback_requested(psp, context)
-        elif status == states.PSP_REFUNDED:
-            handle_refunded(psp, context)
-        elif status == states.PSP_CANCELLED:
-            handle_cancelled(psp, context)
-        # something else
-        else:
-            blogger.error("received unknown status from psp: %s" % status)
-        
+        notification_id = receive_notification(psp, context)
     except ex.TickeeError as e:
         transaction.abort()
         # let the psp know something went wrong
         return psp.generate_failure_response(context)
     else:
         transaction.commit()
+        if notification_id is not None:
+            process_notification.delay(notification_id)
         # let the psp know everything went smooth
         return psp.generate_success_response(context)
 
-def handle_new_order(psp, context):
-    """
-    The PSP notified that it received a new order.
-    """
-    pass
-
-def handle_risk_assessment(psp, context):
-    """
-    The PSP has assessed the risk of the transaction
-    """
-    pass
-
-def handle_state_change(psp, context):
-    """
-    The PSP notifies the transaction state has changed
-    """
-    pass
-
-def handle_ready_for_payment(psp, context):
-    """
-    The PSP has done all verifications and is now able to charge the 
-    customer
-    """
-    order = psp.get_order()
-    psp.charge_order(order)
-
-def handle_payed(psp, context):
-    """
-    The transaction has been charged and completed.
-    """
-    order = psp.get_order()
-    Session.refresh(order)
-    if not order.is_purchased():
-        # update user information with new data from payment provider
-        update_user_information(order, psp.get_buyer_information())
-        # increase transaction counter
-        increment_transaction_count(order.account, order.get_ticket_count())
-        # create & mail tickets
-        finish_order(order, send_mail=True)
-
-def handle_cancelled(psp, context):
-    """
-    The transaction was cancelled by the payment provider
-    """
-    pass
-
-def handle_chargeback_requested(psp, context):
-    """
-    A chargeback request has been initiated
-    """
-    pass
-
-def handle_refunded(psp, context):
-    """
-    The money was refunded to the customer.
-    """
-    pass
-
 
 @task
 def checkout_order(client_id, order_key, payment_required=True, redirect_url=None, user_id=None):
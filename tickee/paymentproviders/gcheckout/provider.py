@@ -1,5 +1,9 @@
 from lxml import etree
+from tickee.core.exceptions import HttpError
+from tickee.core.httpclient import get_client, CircuitBreaker
 from tickee.orders.manager import lookup_order_by_payment_key
+from tickee.paymentproviders.defaults import PSP_CONNECT_TIMEOUT, PSP_READ_TIMEOUT, \
+    PSP_BREAKER_THRESHOLD, PSP_BREAKER_RESET_TIMEOUT
 from tickee.paymentproviders import TransactionInformation, UserInformation, elem2dict
 from tickee.paymentproviders.gcheckout.controller import ServerCartController
 from tickee.paymentproviders.states import PSP_NEW_ORDER, PSP_RISK_ASSESSMENT, PSP_STATE_CHANGED, PSP_READY_FOR_PAYMENT, \
@@ -8,7 +12,6 @@ import base64
 import gchecky.model as gmodel
 import logging
 import marshalling
-import requests
 import urlparse
 import tickee.exceptions as ex
 #from tickee.orders.paymentproviders import PaymentProvider
@@ -19,6 +22,12 @@ GOOGLECHECKOUT = "{%s}" % GOOGLECHECKOUT_NAMESPACE
 blogger = logging.getLogger('blm.payment')
 tlogger = logging.getLogger('technical')
 
+def get_http_client():
+    return get_client("gcheckout",
+                      connect_timeout=PSP_CONNECT_TIMEOUT,
+                      read_timeout=PSP_READ_TIMEOUT,
+                      breaker=CircuitBreaker(PSP_BREAKER_THRESHOLD, PSP_BREAKER_RESET_TIMEOUT))
+
 class GoogleCheckoutPaymentProvider(object):
     
     required_configuration_fields = ['merchant_id', 'merchant_key', 'is_sandbox', 'currency']
@@ -50,6 +59,15 @@ class GoogleCheckoutPaymentProvider(object):
         """Returns the order related to the notification"""
         return self.order
     
+    def get_notification_key(self, context):
+        """Returns a tuple containing the transaction id and the status found
+        in the notification, without contacting the payment provider"""
+        # every notification has its own serial number
+        try:
+            return self._get_serial_number(context), ""
+        except:
+            raise ex.PaymentError("received Google Checkout notification with no serial number.")
+    
     def handle_notification(self, context):
         """Handles the notification and returns payment status"""
         serial_nr = self._get_serial_number(context)
@@ -143,8 +161,12 @@ class GoogleCheckoutPaymentProvider(object):
     def perform_charge_order_request(self, order):
         data = marshalling.charge_and_ship_t(order)
         tlogger.debug("Sending: %s to %s" % (data, self._get_notification_history_url()))
-        response = requests.post(self._get_order_processing_url(), data=data, auth=self._get_auth(),
-                                 headers=self._get_headers())
+        try:
+            response = get_http_client().post(self._get_order_processing_url(), data=data,
+                                              auth=self._get_auth(), headers=self._get_headers(),
+                                              endpoint="charge-and-ship")
+        except HttpError as e:
+            raise ex.PaymentError("failed charging order %s: %s" % (order.id, e))
         return etree.fromstring(response.content)
     
     # Internal
@@ -163,8 +185,12 @@ class GoogleCheckoutPaymentProvider(object):
         """retrieves the notification from GC"""
         data = marshalling.notification_history_request_t(serial_nr)
         tlogger.debug("Sending: %s to %s" % (data, self._get_notification_history_url()))
-        response = requests.post(self._get_notification_history_url(), data=data, auth=self._get_auth(),
-                                 headers=self._get_headers())
+        try:
+            response = get_http_client().post(self._get_notification_history_url(), data=data,
+                                              auth=self._get_auth(), headers=self._get_headers(),
+                                              endpoint="notification-history", idempotent=True)
+        except HttpError as e:
+            raise ex.PaymentError("failed fetching notification %s: %s" % (serial_nr, e))
         return etree.fromstring(response.content)
     
     def perform_checkout_request(self, order):
@@ -31,6 +31,10 @@ class PaymentProvider(object):
     def get_order(self):
         """Returns the order related to the notification"""
     
+    def get_notification_key(self, context):
+        """Returns a tuple containing the transaction id and the status found
+        in the notification, without contacting the payment provider"""
+    
     def handle_notification(self, context):
         """Handles the notification and returns payment status"""
     
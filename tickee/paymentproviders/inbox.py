@@ -0,0 +1,277 @@
+"""
+Notification Inbox
+==================
+
+    Notifications of payment service providers are not processed while the
+    provider waits for an answer. ``receive_notification`` stores the raw
+    notification as a ``PaymentNotification`` and the provider is answered
+    immediately, after which ``process_notification`` handles it in the
+    background.
+
+    Notifications are identified by the payment provider, the transaction
+    and the status mentioned in the notification. A notification that
+    arrives while an identical one is still pending only increments its
+    counter, so a burst of repeated notifications results in a single
+    status request to the provider.
+
+    A notification is claimed while it is processed. The claim is cleared
+    together with the changes of the handler, a claim older than
+    ``NOTIFICATION_RESUME_AFTER`` seconds belongs to a worker that died and
+    the notification is processed again.
+
+    Processing a notification locks the order it concerns. Notifications of
+    the same order are therefore handled one after the other, while those of
+    different orders are handled in parallel. A status that was already
+    handled for a notification is not handled again.
+"""
+from celery.task import task
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql.expression import and_, or_
+from tickee.core.db import execute
+from tickee.db.models.order import Order
+from tickee.orders.tasks import start_issuance, issue_order
+from tickee.paymentproviders import states
+from tickee.paymentproviders.defaults import NOTIFICATION_RESUME_AFTER
+from tickee.paymentproviders.generic import PaymentProvider
+from tickee.paymentproviders.models import PaymentNotification
+from tickee.paymentproviders.processing import increment_transaction_count
+from tickee.paymentproviders.tasks import update_user_information
+import datetime
+import logging
+import sqlahelper
+import transaction
+
+Session = sqlahelper.get_session()
+
+blogger = logging.getLogger('blm.payment')
+tlogger = logging.getLogger('technical')
+
+notifications = PaymentNotification.__table__
+
+
+def receive_notification(psp, context):
+    """
+    Stores a notification of the payment provider.
+
+    Returns:
+        The id of the ``PaymentNotification`` if it has to be processed, None
+        if an identical notification is already pending.
+    """
+    transaction_id, status = psp.get_notification_key(context)
+    key = (notifications.c.payment_provider_id==psp.get_provider_info().id) \
+        & (notifications.c.transaction_id==transaction_id) \
+        & (notifications.c.status==(status or ""))
+    now = datetime.datetime.utcnow()
+    # collapse into an identical pending notification
+    collapsed = execute(notifications.update().where(key)\
+                                              .where(notifications.c.pending==True)\
+                                              .values(received=notifications.c.received + 1))
+    if collapsed.rowcount:
+        blogger.debug("collapsed notification for transaction %s" % transaction_id)
+        return None
+    # reopen a notification that was processed before
+    reopened = execute(notifications.update().where(key)\
+                                             .where(notifications.c.pending==False)\
+                                             .values(pending=True,
+                                                     context=context,
+                                                     received=notifications.c.received + 1,
+                                                     received_at=now))
+    if not reopened.rowcount:
+        notification = PaymentNotification(psp.get_provider_info().id, transaction_id, status, context)
+        savepoint = Session.begin_nested()
+        try:
+            Session.add(notification)
+            Session.flush()
+        except IntegrityError:
+            # an identical notification was stored concurrently
+            savepoint.rollback()
+            return receive_notification(psp, context)
+        else:
+            savepoint.commit()
+            return notification.id
+    return Session.query(PaymentNotification.id).filter(key).scalar()
+
+
+def claim_notification(notification_id, max_claim_duration=NOTIFICATION_RESUME_AFTER):
+    """
+    Marks a pending notification as being processed. Identical notifications
+    arriving from now on are processed again afterwards. A notification that
+    was claimed more than ``max_claim_duration`` seconds ago without being
+    handled can be claimed again.
+
+    Returns:
+        True if the notification was claimed.
+    """
+    now = datetime.datetime.utcnow()
+    expired = now - datetime.timedelta(seconds=max_claim_duration)
+    claimed = execute(notifications.update().where(notifications.c.id==notification_id)\
+                                            .where((notifications.c.pending==True)
+                                                   | (notifications.c.claimed_at < expired))\
+                                            .values(pending=False, claimed_at=now))
+    return claimed.rowcount > 0
+
+
+def handle_notification(notification_id):
+    """
+    Retrieves the status of a claimed notification from the payment provider
+    and handles it.
+
+    Returns:
+        The id of the order if it was newly purchased.
+    """
+    notification = Session.query(PaymentNotification).get(notification_id)
+    psp = PaymentProvider.build_from_info(notification.payment_provider)
+    status = psp.handle_notification(notification.context)
+    order = psp.get_order()
+    notification.processed_at = datetime.datetime.utcnow()
+    notification.claimed_at = None
+    notification.last_error = None
+    if order is None:
+        blogger.error("notification %s does not concern an order" % notification_id)
+        return None
+    # handle notifications of the same order one at a time
+    Session.query(Order).filter(Order.id==order.id).with_lockmode('update').one()
+    blogger.info('received notification %s (%s) for order %s' % (status,
+                                                                 psp.get_name(),
+                                                                 order.id))
+    paid_order_id = None
+    if status == notification.handled_status:
+        blogger.info("status %s of transaction %s was already handled" % (status, notification.transaction_id))
+    elif status == states.PSP_NEW_ORDER:
+        handle_new_order(psp, notification.context)
+    elif status == states.PSP_RISK_ASSESSMENT:
+        handle_risk_assessment(psp, notification.context)
+    elif status == states.PSP_STATE_CHANGED:
+        handle_state_change(psp, notification.context)
+    elif status == states.PSP_READY_FOR_PAYMENT:
+        handle_ready_for_payment(psp, notification.context)
+    elif status == states.PSP_PAYED:
+        paid_order_id = handle_payed(psp, notification.context)
+    elif status == states.PSP_CHARGEBACK_REQUESTED:
+        handle_chargeback_requested(psp, notification.context)
+    elif status == states.PSP_REFUNDED:
+        handle_refunded(psp, notification.context)
+    elif status == states.PSP_CANCELLED:
+        handle_cancelled(psp, notification.context)
+    # something else
+    else:
+        blogger.error("received unknown status from psp: %s" % status)
+    notification.handled_status = status
+    return paid_order_id
+
+
+# Asynchronous Tasks
+
+@task(default_retry_delay=30, max_retries=10, ignore_result=True)
+def process_notification(notification_id):
+    """ Handles a notification in the inbox and issues the tickets of a newly
+    purchased order. """
+    try:
+        # commit the claim, identical notifications arriving during the status
+        # request are not blocked by it. the claim is cleared when the
+        # handled notification is committed.
+        if not claim_notification(notification_id):
+            transaction.abort()
+            return
+        transaction.commit()
+        paid_order_id = handle_notification(notification_id)
+        transaction.commit()
+    except Exception as e:
+        transaction.abort()
+        tlogger.exception("failed processing payment notification %s" % notification_id)
+        # put the notification back in the inbox
+        execute(notifications.update().where(notifications.c.id==notification_id)\
+                                      .values(pending=True, claimed_at=None, 
+                                              last_error=repr(e)[:255]))
+        transaction.commit()
+        process_notification.retry(exc=e)
+    else:
+        if paid_order_id is not None:
+            issue_order.delay(paid_order_id)
+
+@task(ignore_result=True)
+def resume_notifications(max_idle_duration=NOTIFICATION_RESUME_AFTER):
+    """
+    Queues notifications that are pending for a specific amount of seconds
+    and notifications whose claim is older than that.
+
+    Returns:
+        The amount of queued notifications.
+    """
+    idle_since = datetime.datetime.utcnow() - datetime.timedelta(seconds=max_idle_duration)
+    notification_ids = [notification_id for (notification_id,) in
+                        Session.query(PaymentNotification.id)\
+                               .filter(or_(and_(PaymentNotification.pending==True,
+                                                PaymentNotification.received_at < idle_since),
+                                           PaymentNotification.claimed_at < idle_since))]
+    transaction.commit()
+    for notification_id in notification_ids:
+        process_notification.delay(notification_id)
+    return len(notification_ids)
+
+
+# Notification Handlers
+
+def handle_new_order(psp, context):
+    """
+    The PSP notified that it received a new order.
+    """
+    pass
+
+def handle_risk_assessment(psp, context):
+    """
+    The PSP has assessed the risk of the transaction
+    """
+    pass
+
+def handle_state_change(psp, context):
+    """
+    The PSP notifies the transaction state has changed
+    """
+    pass
+
+def handle_ready_for_payment(psp, context):
+    """
+    The PSP has done all verifications and is now able to charge the
+    customer
+    """
+    order = psp.get_order()
+    psp.charge_order(order)
+
+def handle_payed(psp, context):
+    """
+    The transaction has been charged and completed. The order is marked as
+    purchased, its tickets are issued in the background once the
+    notification is committed.
+
+    Returns:
+        The id of the order if it was newly purchased.
+    """
+    order = psp.get_order()
+    Session.refresh(order)
+    if not order.is_purchased():
+        # update user information with new data from payment provider
+        update_user_information(order, psp.get_buyer_information())
+        # increase transaction counter
+        increment_transaction_count(order.account, order.get_ticket_count())
+        # mark as paid, tickets are created & mailed by issue_order
+        start_issuance(order, send_mail=True)
+        return order.id
+
+def handle_cancelled(psp, context):
+    """
+    The transaction was cancelled by the payment provider
+    """
+    pass
+
+def handle_chargeback_requested(psp, context):
+    """
+    A chargeback request has been initiated
+    """
+    pass
+
+def handle_refunded(psp, context):
+    """
+    The money was refunded to the customer.
+    """
+    pass
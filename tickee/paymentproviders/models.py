@@ -1,6 +1,7 @@
-from sqlalchemy.schema import Column, ForeignKey
-from sqlalchemy.types import Integer, String
+from sqlalchemy.schema import Column, ForeignKey, UniqueConstraint
+from sqlalchemy.types import Integer, String, DateTime, Boolean
 from tickee.core.db.types import MutationDict, JSONEncodedDict
+import datetime
 import sqlahelper
 import sqlalchemy.orm as orm
 
@@ -54,4 +55,51 @@ class MonthlyTransactions(Base):
         self.account_id = account_id
         self.year = year
         self.month = month
-        self.amount = 0
\ No newline at end of file
+        self.amount = 0
+
+
+class PaymentNotification(Base):
+    """
+    Notification received from a payment service provider, kept until it is
+    processed by ``tickee.paymentproviders.inbox``. Repeated notifications
+    for the same transaction and status are collapsed into a single row.
+    """
+    
+    # Meta
+    
+    __tablename__ = 'tickee_payment_notifications'
+    __table_args__ = (UniqueConstraint('payment_provider_id', 'transaction_id', 'status'), {})
+    
+    # Columns
+    
+    id = Column(Integer, primary_key=True)
+    payment_provider_id = Column(Integer, ForeignKey('tickee_payment_provider_info.id'))
+    transaction_id = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="") # status reported in the notification
+    context = Column(JSONEncodedDict) # context of the last notification
+    received = Column(Integer) # amount of notifications received
+    received_at = Column(DateTime)
+    pending = Column(Boolean, index=True)
+    claimed_at = Column(DateTime) # processing started, cleared once handled
+    processed_at = Column(DateTime)
+    handled_status = Column(String) # status retrieved from the payment provider
+    last_error = Column(String)
+    
+    # Relations
+    
+    payment_provider = orm.relationship("PaymentProviderInformation")
+    
+    # Constructor
+    
+    def __init__(self, payment_provider_id, transaction_id, status, context):
+        self.payment_provider_id = payment_provider_id
+        self.transaction_id = transaction_id
+        self.status = status or ""
+        self.context = context
+        self.received = 1
+        self.received_at = datetime.datetime.utcnow()
+        self.pending = True
+    
+    def __repr__(self):
+        return "<PaymentNotification %s: psp %s, transaction %s>"\
+               % (self.id, self.payment_provider_id, self.transaction_id)
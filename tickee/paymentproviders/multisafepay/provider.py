@@ -1,10 +1,13 @@
 from lxml import etree
+from tickee.core.exceptions import HttpError, CircuitOpenError
+from tickee.core.httpclient import get_client, CircuitBreaker
 from tickee.orders.manager import lookup_order_by_payment_key
+from tickee.paymentproviders.defaults import PSP_CONNECT_TIMEOUT, PSP_READ_TIMEOUT, \
+    PSP_BREAKER_THRESHOLD, PSP_BREAKER_RESET_TIMEOUT
 from tickee.paymentproviders import elem2dict, UserInformation, TransactionInformation
 from tickee.paymentproviders.states import PSP_NEW_ORDER, PSP_PAYED, PSP_UNKNOWN, PSP_CANCELLED
 import logging
 import marshalling
-import requests
 import sqlahelper
 import tickee.exceptions as ex
 
@@ -16,6 +19,12 @@ tlogger = logging.getLogger('technical')
 
 Session = sqlahelper.get_session()
 
+def get_http_client():
+    return get_client("multisafepay",
+                      connect_timeout=PSP_CONNECT_TIMEOUT,
+                      read_timeout=PSP_READ_TIMEOUT,
+                      breaker=CircuitBreaker(PSP_BREAKER_THRESHOLD, PSP_BREAKER_RESET_TIMEOUT))
+
 class FastCheckoutPaymentProvider(object):
     
     required_configuration_fields = ['account_id', 'site_id', 'site_secure_code', 'is_test', 'currency']
@@ -46,8 +55,14 @@ class FastCheckoutPaymentProvider(object):
         # create checkout request
         checkout_request = self._build_checkout_request(order)
         tlogger.debug("Request to payment provider:\n%s" % checkout_request)
-        # issue request
-        response = requests.post(self._get_url(), checkout_request)
+        # issue request, only retried when no connection could be made
+        try:
+            response = get_http_client().post(self._get_url(), checkout_request,
+                                              endpoint="checkout")
+        except CircuitOpenError:
+            raise ex.PaymentError("the payment provider is currently unavailable.")
+        except HttpError as e:
+            raise ex.PaymentError("failed contacting the payment provider: %s" % e)
         tlogger.debug("Response from payment provider:\n%s" % response.content)
         # parse api response
         root = etree.fromstring(response.content)
@@ -70,6 +85,15 @@ class FastCheckoutPaymentProvider(object):
         """Returns the order related to the notification"""
         return self.order
     
+    def get_notification_key(self, context):
+        """Returns a tuple containing the transaction id and the status found
+        in the notification, without contacting the payment provider"""
+        # notifications only mention the transaction, the status is fetched.
+        try:
+            return context.get('params').get('transactionid')[0], ""
+        except:
+            raise ex.PaymentError("received MSP notification with no transactionid.")
+    
     def handle_notification(self, context):
         """Handles the notification and returns payment status"""
         # fetch transactionid == payment_key
@@ -117,7 +141,11 @@ class FastCheckoutPaymentProvider(object):
         status = marshalling.Status(self._tickee_merchant(order), 
                                     self._build_transaction(order))
         tlogger.debug("requesting status update for order %s" % order.id)
-        response = requests.post(self._get_url(), status.to_string())
+        try:
+            response = get_http_client().post(self._get_url(), status.to_string(),
+                                              endpoint="status", idempotent=True)
+        except HttpError as e:
+            raise ex.PaymentError("failed fetching the status of order %s: %s" % (order.id, e))
         tlogger.debug("response from Multisafepay:\n%s" % response.content)
         # cache information
         root = etree.fromstring(response.content)
@@ -0,0 +1,113 @@
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from tickee.core.exceptions import HttpError, CircuitOpenError
+from tickee.core.httpclient import HttpClient, CircuitBreaker
+import threading
+import unittest
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """ Answers with the statuses queued on the server, 200 when none are left.
+    A queued None closes the connection without answering. """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.requests.append(self.path)
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        if status is None:
+            self.close_connection = 1
+            return
+        body = "<result>%s</result>" % status
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    """ Serves every kept-alive connection in its own thread. """
+    daemon_threads = True
+
+
+class HttpClientTestCase(unittest.TestCase):
+    """ Runs the client against a stub payment provider on localhost. """
+
+    def setUp(self):
+        self.server = StubServer(('127.0.0.1', 0), StubHandler)
+        self.server.requests = []
+        self.server.statuses = []
+        self.url = "http://127.0.0.1:%s/api" % self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def client(self, **options):
+        options.setdefault('retry_backoff', 0)
+        return HttpClient("stub", **options)
+
+    def test_post(self):
+        response = self.client().post(self.url, "<request/>", endpoint="checkout")
+        self.assertEqual(response.content, "<result>200</result>")
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_idempotent_request_retried_on_server_error(self):
+        self.server.statuses = [503, 502]
+        response = self.client(retries=2).post(self.url, "<status/>", idempotent=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_request_not_retried_on_server_error(self):
+        self.server.statuses = [503]
+        self.assertRaises(HttpError, self.client(retries=2).post, self.url, "<request/>")
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_connection_error_retried(self):
+        client = self.client(retries=2, breaker=CircuitBreaker(threshold=10))
+        self.assertRaises(HttpError, client.post, "http://127.0.0.1:1/api", "<request/>")
+        self.assertEqual(client.breaker.failures, 3)
+
+    def test_request_not_retried_after_sending(self):
+        self.server.statuses = [None]
+        client = self.client(retries=2)
+        self.assertRaises(HttpError, client.post, self.url, "<request/>")
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_idempotent_request_retried_after_sending(self):
+        self.server.statuses = [None]
+        response = self.client(retries=2).post(self.url, "<status/>", idempotent=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_circuit_opens_after_failures(self):
+        self.server.statuses = [500, 500]
+        client = self.client(retries=0, breaker=CircuitBreaker(threshold=2, reset_timeout=60))
+        self.assertRaises(HttpError, client.post, self.url, "<request/>")
+        self.assertRaises(HttpError, client.post, self.url, "<request/>")
+        # fails without contacting the provider
+        self.assertRaises(CircuitOpenError, client.post, self.url, "<request/>")
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_circuit_closes_after_successful_trial(self):
+        self.server.statuses = [500]
+        client = self.client(retries=0, breaker=CircuitBreaker(threshold=1, reset_timeout=0))
+        self.assertRaises(HttpError, client.post, self.url, "<request/>")
+        self.assertTrue(client.breaker.is_open())
+        client.post(self.url, "<request/>")
+        self.assertFalse(client.breaker.is_open())
+
+    def test_latency_per_endpoint(self):
+        client = self.client()
+        client.post(self.url, "<request/>", endpoint="checkout")
+        client.post(self.url, "<request/>", endpoint="checkout")
+        client.post(self.url, "<status/>", endpoint="status")
+        self.assertEqual(client.histograms["checkout"].count, 2)
+        self.assertEqual(client.histograms["status"].count, 1)
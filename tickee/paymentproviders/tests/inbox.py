@@ -0,0 +1,80 @@
+from tickee.paymentproviders.inbox import receive_notification, claim_notification
+from tickee.paymentproviders.models import PaymentProviderInformation, \
+    PaymentNotification
+from tickee.tests import BaseTestCase
+import datetime
+import sqlahelper
+
+Session = sqlahelper.get_session()
+
+
+class StubPaymentProvider(object):
+    """ Payment provider reading the transaction id from the context. """
+    
+    def __init__(self, payment_provider_info):
+        self.payment_provider_info = payment_provider_info
+    
+    def get_provider_info(self):
+        return self.payment_provider_info
+    
+    def get_notification_key(self, context):
+        return context.get('transactionid'), context.get('status')
+
+
+class InboxTestCase(BaseTestCase):
+    
+    def setUp(self):
+        super(InboxTestCase, self).setUp()
+        psp_info = PaymentProviderInformation()
+        Session.add(psp_info)
+        Session.flush()
+        self.psp = StubPaymentProvider(psp_info)
+    
+    # receive_notification
+    
+    def test_receive_notification(self):
+        notification_id = receive_notification(self.psp, dict(transactionid="abc"))
+        notification = Session.query(PaymentNotification).get(notification_id)
+        self.assertTrue(notification.pending)
+        self.assertEqual(notification.transaction_id, "abc")
+    
+    def test_collapse_pending_notifications(self):
+        notification_id = receive_notification(self.psp, dict(transactionid="abc"))
+        self.assertEqual(receive_notification(self.psp, dict(transactionid="abc")), None)
+        self.assertEqual(receive_notification(self.psp, dict(transactionid="abc")), None)
+        notification = Session.query(PaymentNotification).get(notification_id)
+        Session.refresh(notification)
+        self.assertEqual(notification.received, 3)
+    
+    def test_distinct_statuses_are_kept(self):
+        first = receive_notification(self.psp, dict(transactionid="abc", status="new"))
+        second = receive_notification(self.psp, dict(transactionid="abc", status="payed"))
+        self.assertNotEqual(first, second)
+    
+    def test_reopen_processed_notification(self):
+        notification_id = receive_notification(self.psp, dict(transactionid="abc"))
+        self.assertTrue(claim_notification(notification_id))
+        self.assertFalse(claim_notification(notification_id))
+        self.assertEqual(receive_notification(self.psp, dict(transactionid="abc")), notification_id)
+    
+    # claim_notification
+    
+    def test_claim_notification(self):
+        notification_id = receive_notification(self.psp, dict(transactionid="abc"))
+        self.assertTrue(claim_notification(notification_id))
+        notification = Session.query(PaymentNotification).get(notification_id)
+        Session.refresh(notification)
+        self.assertFalse(notification.pending)
+        self.assertNotEqual(notification.claimed_at, None)
+    
+    def test_reclaim_expired_claim(self):
+        notification_id = receive_notification(self.psp, dict(transactionid="abc"))
+        self.assertTrue(claim_notification(notification_id))
+        notification = Session.query(PaymentNotification).get(notification_id)
+        Session.refresh(notification)
+        # the worker that claimed it died
+        notification.claimed_at -= datetime.timedelta(seconds=600)
+        Session.flush()
+        self.assertFalse(claim_notification(notification_id, max_claim_duration=900))
+        self.assertTrue(claim_notification(notification_id, max_claim_duration=300))
+        self.assertFalse(claim_notification(notification_id, max_claim_duration=300))
@@ -1,30 +1,41 @@
 from celery.task import task
 from tickee.core import entrypoint
+from tickee.core.pagination import list_or_page
 from tickee.core.security.oauth2.manager import lookup_account_for_client
 from tickee.events.manager import lookup_event_by_id
 from tickee.events.permissions import require_event_owner, require_eventpart_of_event
+from tickee.scanning import verdicts
 from tickee.scanning.manager import list_ticketscans
-from tickee.scanning.marshalling import ticketscan_to_dict
-from tickee.scanning.processing import scan_ticket
+from tickee.scanning.manifest import build_manifest
+from tickee.scanning.marshalling import ticketscan_to_dict, verdict_to_dict
+from tickee.scanning.models import TicketScan
+from tickee.scanning.processing import scan_ticket, merge_scans
 from tickee.scanning.tasks import reset_scans
+from tickee.tickets.codes import get_code_key
 from tickee.tickets.manager import lookup_ticket_by_code, list_tickets
 from tickee.tickets.marshalling import ticket_to_dict
 from tickee.tickets.permissions import require_tickettype_owner
+import base64
 import datetime
 import json
+import sqlahelper
 import tickee.exceptions as ex
 import time
 
+Session = sqlahelper.get_session()
+
 @task(name="scanning.from_ticket")
 @entrypoint()
-def ticket_scans(client_id, ticket_code):
-    """Returns a list of all scans of a ticket"""
+def ticket_scans(client_id, ticket_code, cursor=None, limit=None):
+    """Returns a list of all scans of a ticket. If a cursor or a limit is 
+    given, returns a page of them as dict(scans=[...], next=<cursor or None>)."""
     ticket = lookup_ticket_by_code(ticket_code)
     
     if client_id is not None:
         require_tickettype_owner(client_id, ticket.get_tickettype().id)
     
-    return map(ticketscan_to_dict, ticket.scans)
+    scans = Session.query(TicketScan).filter(TicketScan.ticket_id==ticket.id)
+    return list_or_page(scans, (TicketScan.id,), ticketscan_to_dict, 'scans', cursor, limit)
 
 
 @task(name="scanning.reset")
@@ -50,9 +61,11 @@ def reset_scans_e(client_id, event_id=None, eventpart_id=None, tickettype_id=Non
 @entrypoint()
 def access_code(client_id, event_id, tickettype_id=None, eventpart_id=None, location_id=None):
     """Returns an access code which can be used by the scanner apps to 
-    authenticate with the server.
+    authenticate with the server. The code key verifies the signed ticket
+    codes of the event without the server, see ``tickee.tickets.codes``.
     example:
-        {"key":"key2","secret":"secret","event":1,"account":1,"tickettype":1,"eventpart":1}
+        {"key":"key2","secret":"secret","event":1,"account":1,"tickettype":1,"eventpart":1,
+         "code_key":"5f0c..."}
     """ 
     lookup_event_by_id(event_id)
     
@@ -71,7 +84,8 @@ def access_code(client_id, event_id, tickettype_id=None, eventpart_id=None, loca
     access_dct = dict(key = client.key,
                       secret = client.secret,
                       event = int(event_id),
-                      account = account.id)
+                      account = account.id,
+                      code_key = get_code_key(int(event_id)))
     if eventpart_id is not None:
         access_dct['eventpart'] = int(eventpart_id)
     if tickettype_id is not None:
@@ -82,6 +96,61 @@ def access_code(client_id, event_id, tickettype_id=None, eventpart_id=None, loca
     return dict(access_code=json.dumps(access_dct))
 
 
+@task(name="scanning.manifest")
+@entrypoint()
+def manifest(client_id, event_id, tickettype_id=None, eventpart_id=None, since=None):
+    """Returns the manifest of the valid and scanned tickets of an event, 
+    limited like the access code, for checking tickets offline. If since is 
+    the version of a previous manifest, only the changes since are returned.
+    example:
+        {"manifest":"eJz...","version":"1042.87","delta":false}
+    """
+    lookup_event_by_id(event_id)
+    
+    # permission checks
+    if client_id is not None:
+        require_event_owner(client_id, event_id)
+        if tickettype_id is not None:
+            require_tickettype_owner(client_id, tickettype_id)
+        if eventpart_id is not None:
+            require_eventpart_of_event(eventpart_id, event_id)
+    
+    data, version = build_manifest(event_id, eventpart_id, tickettype_id, since)
+    return dict(manifest=base64.b64encode(data),
+                version=version,
+                delta=bool(since))
+
+
+@task(name="scanning.upload")
+@entrypoint()
+def upload_scans(client_id, event_id, scans):
+    """
+    Entrypoint for uploading the scans of a scanning device at once, e.g. 
+    after scanning offline.
+    
+    Args:
+        event_id:
+            The event that was scanned.
+        scans:
+            List of dictionaries containing the ``code`` of the ticket, the 
+            ``timestamp`` of the scan and optionally the ``device`` and the
+            ``extra_info`` of the scan.
+    
+    Returns:
+        dict(accepted=<amount>, verdicts=[...]) with a verdict per scan:
+            {"code":"00000002A","status":"accepted"}
+            {"code":"00000002B","status":"duplicate","first_scan":{"timestamp":1334567890,"device":"gate-2"}}
+        or a status "unknown" or "wrong_event".
+    """
+    lookup_event_by_id(event_id)
+    if client_id is not None:
+        require_event_owner(client_id, event_id)
+    
+    result = map(verdict_to_dict, merge_scans(event_id, scans))
+    return dict(accepted=len([v for v in result if v['status'] == verdicts.ACCEPTED]),
+                verdicts=result)
+
+
 @task(name="scanning.scan")
 @entrypoint()
 def ticket_scan_(*args, **kwargs):
@@ -102,18 +171,20 @@ def ticket_scan(client_id, ticket_code, scan_timestamp, extra_info={}):
             Datetime the ticket was scanned in 
         extra_info (optional):
             Dictionary containing additional information of the device.
+    
+    A duplicate scan returns the error with the details of the first scan:
+        {"error":"...","error_number":701,"details":{"scanned_at":1334567890,"device":null}}
     """
     # add ticket as scanned
     scan_datetime = datetime.datetime.utcfromtimestamp(float(scan_timestamp))
-    # lookup ticket
-    ticket = lookup_ticket_by_code(ticket_code)
-    # assert permission to scan ticket
+    # permission to scan tickets of the account
+    account_id = None
     if client_id is not None:
-        require_tickettype_owner(client_id, ticket.get_tickettype().id)
-    # exisiting scans:
-    if len(ticket.scans) > 0:
-        raise ex.DuplicateTicketScanError()
+        try:
+            account_id = lookup_account_for_client(client_id).id
+        except ex.AccountNotFoundError:
+            raise ex.PermissionDenied("Your client is not connected to an account.")
     # scan ticket
-    scan_ticket(ticket_code, scan_datetime, extra_info)
+    scan_ticket(ticket_code, scan_datetime, extra_info, account_id)
 
     return True
\ No newline at end of file
@@ -0,0 +1,189 @@
+"""
+Scanner manifest
+================
+
+    Scanner apps check tickets at the door against a manifest of the valid
+    tickets of an event instead of a round trip per scan. The manifest holds
+    the ids of the tickets with their tickettypes and the ids of the tickets
+    that were already scanned, optionally limited to an eventpart or a
+    tickettype like the access code of the scanner.
+
+    Every manifest has a version, ``"<last ticket id>.<last scan id>"``. A
+    device holding a manifest asks for the changes since its version and
+    receives a delta with the tickets and scans added since. Tickets and
+    scans that were removed do not appear in a delta, so every manifest also
+    carries the total amount of tickets and scanned tickets: a device whose
+    merged manifest does not add up to them fetches a full one.
+
+    The manifest is binary and compressed with zlib::
+
+        header      ">4sBB10I": "TKMF", format, kind (0 full, 1 delta),
+                    event id, base ticket id, base scan id, ticket id and
+                    scan id of the version, total tickets, total scanned,
+                    amount of tickettypes, tickets and scanned tickets
+        tickettypes the ids of the tickettypes as ">I"
+        tickets     per ticket the difference of its id with the previous
+                    id and the index of its tickettype, as varints
+        scanned     the differences of the ids of the scanned tickets, as
+                    varints
+"""
+from sqlalchemy.sql.expression import distinct
+from sqlalchemy.sql.functions import count
+from tickee.db.models.ticketorder import TicketOrder
+from tickee.scanning.models import TicketScan
+from tickee.tickets.manager import filter_tickets
+from tickee.tickets.models import Ticket
+import sqlahelper
+import struct
+import tickee.exceptions as ex
+import zlib
+
+Session = sqlahelper.get_session()
+
+MAGIC = "TKMF"
+FORMAT = 1
+FULL = 0
+DELTA = 1
+
+HEADER = struct.Struct(">4sBB10I")
+TICKETTYPE = struct.Struct(">I")
+
+
+def build_manifest(event_id, eventpart_id=None, tickettype_id=None, since=None):
+    """
+    Builds the manifest of the tickets of an event.
+
+    Args:
+        event_id:
+            the event of the tickets.
+        eventpart_id (optional):
+            only include the tickets of the eventpart.
+        tickettype_id (optional):
+            only include the tickets of the tickettype.
+        since (optional):
+            version of a previous manifest, returns the delta since it.
+
+    Returns:
+        (manifest, version)
+
+    Raises:
+        InvalidManifestVersionError
+    """
+    base_ticket, base_scan = parse_version(since) if since else (0, 0)
+    # tickets
+    tickets = Session.query(Ticket.id, TicketOrder.ticket_type_id).join(TicketOrder)
+    tickets = filter_tickets(tickets, event_id, None, eventpart_id, tickettype_id)
+    new_tickets = tickets.filter(Ticket.id > base_ticket).order_by(Ticket.id).all()
+    # scans
+    scans = Session.query(TicketScan.ticket_id, TicketScan.id).join(Ticket).join(TicketOrder)
+    scans = filter_tickets(scans, event_id, None, eventpart_id, tickettype_id)
+    new_scans = scans.filter(TicketScan.id > base_scan).all()
+    scanned = sorted(set(ticket_id for ticket_id, scan_id in new_scans))
+    # version
+    ticket_version = new_tickets[-1][0] if new_tickets else base_ticket
+    scan_version = max([scan_id for ticket_id, scan_id in new_scans] or [base_scan])
+    if since:
+        total_tickets = tickets.count()
+        total_scanned = scans.with_entities(count(distinct(TicketScan.ticket_id))).scalar()
+    else:
+        total_tickets = len(new_tickets)
+        total_scanned = len(scanned)
+    # encode
+    tickettypes = sorted(set(tt_id for ticket_id, tt_id in new_tickets))
+    index = dict((tt_id, i) for i, tt_id in enumerate(tickettypes))
+    data = bytearray(HEADER.pack(MAGIC, FORMAT, DELTA if since else FULL, int(event_id),
+                                 base_ticket, base_scan, ticket_version, scan_version,
+                                 total_tickets, total_scanned,
+                                 len(tickettypes), len(new_tickets), len(scanned)))
+    for tt_id in tickettypes:
+        data.extend(TICKETTYPE.pack(tt_id))
+    previous = 0
+    for ticket_id, tt_id in new_tickets:
+        write_varint(data, ticket_id - previous)
+        write_varint(data, index[tt_id])
+        previous = ticket_id
+    previous = 0
+    for ticket_id in scanned:
+        write_varint(data, ticket_id - previous)
+        previous = ticket_id
+    return zlib.compress(str(data)), "%s.%s" % (ticket_version, scan_version)
+
+
+def read_manifest(manifest):
+    """
+    Decodes a manifest.
+
+    Returns:
+        A dictionary containing the ``event_id``, the ``base`` and the
+        ``version``, the ``total_tickets`` and ``total_scanned``, the
+        ``tickets`` as a dictionary mapping the ticket ids to their
+        tickettype and the sorted ``scanned`` ticket ids.
+    """
+    data = bytearray(zlib.decompress(manifest))
+    (magic, manifest_format, kind, event_id, base_ticket, base_scan, ticket_version, scan_version,
+     total_tickets, total_scanned, n_tickettypes, n_tickets, n_scanned) = \
+        HEADER.unpack_from(buffer(data))
+    if magic != MAGIC or manifest_format != FORMAT:
+        raise ValueError("not a manifest of format %s" % FORMAT)
+    offset = HEADER.size
+    tickettypes = []
+    for i in range(n_tickettypes):
+        tickettypes.append(TICKETTYPE.unpack_from(buffer(data), offset)[0])
+        offset += TICKETTYPE.size
+    tickets = dict()
+    ticket_id = 0
+    for i in range(n_tickets):
+        delta, offset = read_varint(data, offset)
+        tt_index, offset = read_varint(data, offset)
+        ticket_id += delta
+        tickets[ticket_id] = tickettypes[tt_index]
+    scanned = []
+    ticket_id = 0
+    for i in range(n_scanned):
+        delta, offset = read_varint(data, offset)
+        ticket_id += delta
+        scanned.append(ticket_id)
+    return dict(event_id=event_id,
+                delta=kind == DELTA,
+                base="%s.%s" % (base_ticket, base_scan),
+                version="%s.%s" % (ticket_version, scan_version),
+                total_tickets=total_tickets,
+                total_scanned=total_scanned,
+                tickets=tickets,
+                scanned=scanned)
+
+
+def parse_version(version):
+    """ Returns the last ticket id and scan id of a manifest version. """
+    try:
+        ticket_id, scan_id = map(int, str(version).split("."))
+    except ValueError:
+        raise ex.InvalidManifestVersionError()
+    if ticket_id < 0 or scan_id < 0:
+        raise ex.InvalidManifestVersionError()
+    return ticket_id, scan_id
+
+
+def write_varint(data, value):
+    """ Appends an unsigned integer in 7 bits per byte to a bytearray. """
+    while value > 0x7f:
+        data.append((value & 0x7f) | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+def read_varint(data, offset):
+    """ Reads an unsigned integer written by ``write_varint``.
+
+    Returns:
+        (value, offset after the value)
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
@@ -1,4 +1,4 @@
-from tickee.core.marshalling import date
+from tickee.core.marshalling import date, timestamp
 
 
 def ticketscan_to_dict(ticketscan):
@@ -9,4 +9,16 @@ def ticketscan_to_dict(ticketscan):
     result['id'] = ticketscan.ticket.get_code() 
     result['user_id'] = ticketscan.ticket.user_id
     result['scanned_at'] =  date(ticketscan.scanned_date)
-    return result
\ No newline at end of file
+    return result
+
+
+def verdict_to_dict(verdict):
+    """
+    Transforms a verdict of ``merge_scans`` into a dictionary.
+    """
+    result = dict(code=verdict['code'],
+                  status=verdict['status'])
+    if 'scanned_date' in verdict:
+        result['first_scan'] = dict(timestamp=timestamp(verdict['scanned_date']),
+                                    device=verdict['device'])
+    return result
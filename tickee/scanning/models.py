@@ -1,4 +1,4 @@
-from sqlalchemy.schema import Column, ForeignKey
+from sqlalchemy.schema import Column, ForeignKey, Index
 from sqlalchemy.types import Integer, DateTime
 from tickee.core.db.types import JSONEncodedDict
 import datetime
@@ -28,4 +28,8 @@ class TicketScan(Base):
                  scanned_date=datetime.datetime.utcnow(),
                  extra_info=dict()):
         self.scanned_date = scanned_date
-        self.extra_info = extra_info
\ No newline at end of file
+        self.extra_info = extra_info
+
+
+# a ticket is scanned once, also when two devices scan it at the same moment
+Index('ix_tickee_ticketscans_ticket_id', TicketScan.ticket_id, unique=True)
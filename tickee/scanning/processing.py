@@ -1,12 +1,28 @@
+from sqlalchemy.exc import IntegrityError
+from tickee.core.db import execute
+from tickee.core.marshalling import timestamp
+from tickee.db.models.event import Event
+from tickee.scanning import verdicts
 from tickee.scanning.models import TicketScan
-from tickee.tickets.manager import lookup_ticket_by_code
+from tickee.tickets import changes
+from tickee.tickets.models import Ticket
+from tickee.tickets.processing import code_to_id
+import datetime
+import logging
 import sqlahelper
+import tickee.exceptions as ex
 
 Session = sqlahelper.get_session()
 
-def scan_ticket(ticket_code, scan_date, extra_info):
+blogger = logging.getLogger('blm.scanning')
+
+MERGE_CHUNK_SIZE = 500
+
+def scan_ticket(ticket_code, scan_date, extra_info, account_id=None):
     """
-    Scan in a ticket.
+    Scan in a ticket. The ticket, the owner of its event and its existing 
+    scan are looked up in a single query, the unique ticket of the scans
+    rejects a ticket scanned at the same moment by another device.
     
     Args:
         ticket_code:
@@ -16,17 +32,153 @@ def scan_ticket(ticket_code, scan_date, extra_info):
         extra_info:
             A dictionary containing extra information the account owner
             wishes to have.
+        account_id (optional):
+            Only scan the ticket if its event belongs to the account.
             
     Returns:
         The newly created ``TicketScan`` object.
     
     Raises:
         TicketNotFoundError
+        PermissionDenied
+        DuplicateTicketScanError
+            containing the date and extra info of the existing scan.
     """
+    try:
+        ticket_id = code_to_id(ticket_code)
+    except (TypeError, ValueError):
+        raise ex.TicketNotFoundError()
+    ticket = Session.query(Event.id.label('event_id'), Event.account_id, TicketScan.scanned_date, TicketScan.extra_info)\
+                    .select_from(Ticket)\
+                    .join((Event, Event.id==Ticket.event_id))\
+                    .outerjoin((TicketScan, TicketScan.ticket_id==Ticket.id))\
+                    .filter(Ticket.id==ticket_id).first()
+    if ticket is None:
+        raise ex.TicketNotFoundError()
+    if account_id is not None and ticket.account_id != account_id:
+        raise ex.PermissionDenied("You are not the owner of the tickettype.")
+    if ticket.scanned_date is not None:
+        raise duplicate_scan(ticket.scanned_date, ticket.extra_info)
     # mark ticket as scanned
-    ticket = lookup_ticket_by_code(ticket_code)
     scan = TicketScan(scan_date, extra_info)
-    scan.ticket_id = ticket.id
+    scan.ticket_id = ticket_id
+    savepoint = Session.begin_nested()
     Session.add(scan)
+    try:
+        Session.flush()
+    except IntegrityError:
+        # scanned at the same moment
+        savepoint.rollback()
+        existing = Session.query(TicketScan.scanned_date, TicketScan.extra_info)\
+                          .filter(TicketScan.ticket_id==ticket_id).first()
+        raise duplicate_scan(*existing)
+    else:
+        savepoint.commit()
+    changes.record_changes(ticket.event_id, [ticket_id], changes.SCANNED)
+    return scan
+
+
+def duplicate_scan(scanned_date, extra_info):
+    """ Returns the error on scanning a ticket that was scanned at a date. """
+    return ex.DuplicateTicketScanError(dict(scanned_at=timestamp(scanned_date),
+                                            device=(extra_info or {}).get('device')))
+
+
+def merge_scans(event_id, scans):
+    """
+    Merges the scans uploaded by a scanning device into the scans of an 
+    event. A ticket keeps a single scan, the first one by scan date and by
+    device for equal dates, so the scans of several devices merge to the 
+    same result whatever the order in which the devices upload them.
+    
+    Args:
+        event_id:
+            the event that is being scanned.
+        scans:
+            list of dictionaries containing the ``code`` of the ticket, the
+            ``timestamp`` of the scan and optionally the ``device`` and the
+            ``extra_info`` of the scan.
+    
+    Returns:
+        A verdict per scan, in the order of the scans, as a dictionary 
+        containing the ``code`` and the ``status``. The verdict on a 
+        duplicate scan also contains the ``scanned_date`` and the ``device``
+        of the first scan of the ticket.
+    """
+    results = [dict(code=scan.get('code'), status=verdicts.UNKNOWN) for scan in scans]
+    # parse the scans
+    parsed = []
+    for i, scan in enumerate(scans):
+        try:
+            ticket_id = code_to_id(scan['code'])
+            scan_date = datetime.datetime.utcfromtimestamp(float(scan['timestamp']))
+        except (KeyError, TypeError, ValueError):
+            continue
+        extra_info = dict(scan.get('extra_info') or {})
+        if scan.get('device') is not None:
+            extra_info['device'] = scan['device']
+        parsed.append((scan_key(scan_date, extra_info), i, ticket_id, scan_date, extra_info))
+    # look up the events of the tickets and their first scans
+    ticket_ids = list(set(p[2] for p in parsed))
+    events = dict()
+    firsts = dict()
+    for start in range(0, len(ticket_ids), MERGE_CHUNK_SIZE):
+        chunk = ticket_ids[start:start + MERGE_CHUNK_SIZE]
+        events.update(Session.query(Ticket.id, Ticket.event_id).filter(Ticket.id.in_(chunk)))
+        for scan in Session.query(TicketScan).filter(TicketScan.ticket_id.in_(chunk)):
+            key = scan_key(scan.scanned_date, scan.extra_info)
+            if scan.ticket_id not in firsts or key < firsts[scan.ticket_id][0]:
+                firsts[scan.ticket_id] = (key, scan)
+    # merge the scans from the first to the last
+    new_scans = dict()
+    scanned = set()
+    for key, i, ticket_id, scan_date, extra_info in sorted(parsed):
+        result = results[i]
+        if ticket_id not in events:
+            continue
+        elif events[ticket_id] != int(event_id):
+            result['status'] = verdicts.WRONG_EVENT
+        elif ticket_id not in firsts:
+            scan = TicketScan(scan_date, extra_info)
+            scan.ticket_id = ticket_id
+            firsts[ticket_id] = new_scans[ticket_id] = (key, scan)
+            scanned.add(ticket_id)
+            result['status'] = verdicts.ACCEPTED
+        elif key < firsts[ticket_id][0]:
+            # a device synchronising late scanned the ticket before
+            scan = firsts[ticket_id][1]
+            scan.scanned_date = scan_date
+            scan.extra_info = extra_info
+            firsts[ticket_id] = (key, scan)
+            scanned.add(ticket_id)
+            result['status'] = verdicts.ACCEPTED
+        elif key == firsts[ticket_id][0]:
+            # the same scan is uploaded again
+            result['status'] = verdicts.ACCEPTED
+        else:
+            scan = firsts[ticket_id][1]
+            result.update(status=verdicts.DUPLICATE,
+                          scanned_date=scan.scanned_date,
+                          device=(scan.extra_info or {}).get('device'))
     Session.flush()
-    return scan
\ No newline at end of file
+    if new_scans:
+        savepoint = Session.begin_nested()
+        try:
+            execute(TicketScan.__table__.insert(), 
+                    [dict(ticket_id=new_scan.ticket_id, 
+                          scanned_date=new_scan.scanned_date, 
+                          extra_info=new_scan.extra_info) for key, new_scan in new_scans.values()])
+        except IntegrityError:
+            # another device uploaded scans of the same tickets at the same moment
+            savepoint.rollback()
+            return merge_scans(event_id, scans)
+        else:
+            savepoint.commit()
+    changes.record_changes(event_id, sorted(scanned), changes.SCANNED)
+    blogger.info("merged %s scans of event %s, %s new" % (len(scans), event_id, len(new_scans)))
+    return results
+
+
+def scan_key(scan_date, extra_info):
+    """ Returns the key ordering the scans of a ticket. """
+    return (scan_date, (extra_info or {}).get('device') or "")
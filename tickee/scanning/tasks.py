@@ -1,12 +1,19 @@
-from tickee.db.models.eventpart import EventPart
+from tickee.core.crm.tasks import log_crm
+from tickee.core.db import execute, forget_deleted
 from tickee.db.models.ticketorder import TicketOrder
-from tickee.db.models.tickettype import TicketType, TicketTypeEventPartAssociation
+from tickee.db.models.tickettype import TicketTypeEventPartAssociation
 from tickee.scanning.models import TicketScan
+from tickee.tickets import changes
 from tickee.tickets.models import Ticket
+import logging
 import sqlahelper
 
 Session = sqlahelper.get_session()
 
+blogger = logging.getLogger('blm.scanning')
+
+scans = TicketScan.__table__
+
 def reset_scans(**filters):
     """Removes all ticket scans for an event, eventpart or tickettype
     
@@ -18,25 +25,35 @@ def reset_scans(**filters):
     Returns:
         the amount of ticketscans that were removed
     """
-    # validate if all 
-    query = Session.query(TicketScan)
-    # filter by tickettype_id
+    # the scanned tickets
+    tickets = Session.query(Ticket.id)
+    # filter by event
+    event_id = filters.get('event_id')
+    if event_id:
+        tickets = tickets.filter(Ticket.event_id==event_id)
     tickettype_id = filters.get('tickettype_id')
-    query = query.join(Ticket).join(TicketOrder)
+    eventpart_id = filters.get('eventpart_id')
+    if tickettype_id or eventpart_id:
+        tickets = tickets.join(TicketOrder)
+    # filter by tickettype_id
     if tickettype_id:
-        query = query.filter(TicketOrder.ticket_type_id==tickettype_id)
+        tickets = tickets.filter(TicketOrder.ticket_type_id==tickettype_id)
     # filter by eventpart
-    eventpart_id = filters.get('eventpart_id')
-    query = query.join(TicketType).join(TicketTypeEventPartAssociation)
     if eventpart_id:
-        query = query.filter(TicketTypeEventPartAssociation.eventpart_id==eventpart_id)
-    # filter by event
-    event_id = filters.get('event_id')
-    query = query.join(EventPart)
-    if event_id:
-        query = query.filter(EventPart.event_id==event_id)
-    tickets_to_be_removed = query.all()
-    for ticket in tickets_to_be_removed:
-        Session.delete(ticket)
+        tickets = tickets.join((TicketTypeEventPartAssociation, 
+                                TicketTypeEventPartAssociation.tickettype_id==TicketOrder.ticket_type_id))\
+                         .filter(TicketTypeEventPartAssociation.eventpart_id==eventpart_id)
     Session.flush()
-    return len(tickets_to_be_removed)
\ No newline at end of file
+    scanned = Session.query(TicketScan.ticket_id, Ticket.event_id).join(Ticket)\
+                     .filter(TicketScan.ticket_id.in_(tickets.statement)).distinct().all()
+    # remove the scans at once
+    result = execute(scans.delete().where(scans.c.ticket_id.in_(tickets.statement)))
+    forget_deleted(TicketScan, 'ticket_id', [ticket_id for ticket_id, ticket_event_id in scanned])
+    changes.record_changes_per_event(sorted(scanned), changes.UNSCANNED)
+    if event_id:
+        log_crm("event", event_id, dict(action="reset scans",
+                                        eventpart=eventpart_id,
+                                        tickettype=tickettype_id,
+                                        amount=result.rowcount))
+    blogger.info("removed %s ticketscans: %s" % (result.rowcount, filters))
+    return result.rowcount
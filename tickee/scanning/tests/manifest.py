@@ -0,0 +1,93 @@
+from tickee.accounts.processing import create_account
+from tickee.core.currency.processing import create_currency
+from tickee.events.eventparts.processing import add_eventpart
+from tickee.events.processing import start_event
+from tickee.orders.processing import start_order, add_tickets
+from tickee.scanning.manifest import build_manifest, read_manifest
+from tickee.scanning.models import TicketScan
+from tickee.subscriptions.models import Subscription, FREE
+from tickee.tests import BaseTestCase
+from tickee.tickets.manager import tickets_from_order
+from tickee.tickets.tasks import create_tickets
+from tickee.tickettypes.processing import create_tickettype, link_tickettype_to_event
+from tickee.users.processing import create_user
+import sqlahelper
+import tickee.exceptions as ex
+
+Session = sqlahelper.get_session()
+
+
+class ManifestTestCase(BaseTestCase):
+    
+    def setUp(self):
+        super(ManifestTestCase, self).setUp()
+        self.users = 0
+        create_currency("EUR", "Euro")
+        self.account = create_account("accountname", "email")
+        self.account.subscription = Subscription(FREE)
+        self.event = start_event(self.account.id, "event_name")
+        self.eventpart = add_eventpart(self.event.id)
+        self.tickettype = create_tickettype(0, 100)
+        self.tickettype.is_active = True
+        link_tickettype_to_event(self.tickettype, self.event)
+        self.tickettype2 = create_tickettype(0, 100)
+        self.tickettype2.is_active = True
+        link_tickettype_to_event(self.tickettype2, self.event)
+        
+    def order_tickets(self, tickettype, amount):
+        # a new user for every order, a user has only one started order
+        self.users += 1
+        user = create_user("user%s@example.com" % self.users)
+        order = start_order(user, self.account)
+        add_tickets(order, tickettype.id, amount)
+        Session.flush()
+        create_tickets(order)
+        return sorted(tickets_from_order(order), key=lambda t: t.id)
+    
+    def scan(self, ticket):
+        scan = TicketScan()
+        scan.ticket_id = ticket.id
+        Session.add(scan)
+        Session.flush()
+    
+    # build_manifest
+    
+    def test_full_manifest(self):
+        tickets = self.order_tickets(self.tickettype, 3)
+        tickets2 = self.order_tickets(self.tickettype2, 2)
+        self.scan(tickets[1])
+        data, version = build_manifest(self.event.id)
+        manifest = read_manifest(data)
+        self.assertEqual(manifest['version'], version)
+        self.assertFalse(manifest['delta'])
+        expected = dict([(t.id, self.tickettype.id) for t in tickets] 
+                        + [(t.id, self.tickettype2.id) for t in tickets2])
+        self.assertEqual(manifest['tickets'], expected)
+        self.assertEqual(manifest['scanned'], [tickets[1].id])
+        self.assertEqual((manifest['total_tickets'], manifest['total_scanned']), (5, 1))
+    
+    def test_manifest_of_tickettype(self):
+        self.order_tickets(self.tickettype, 3)
+        tickets2 = self.order_tickets(self.tickettype2, 2)
+        data, version = build_manifest(self.event.id, tickettype_id=self.tickettype2.id)
+        self.assertEqual(sorted(read_manifest(data)['tickets']), [t.id for t in tickets2])
+    
+    def test_delta(self):
+        tickets = self.order_tickets(self.tickettype, 2)
+        data, version = build_manifest(self.event.id)
+        new_tickets = self.order_tickets(self.tickettype, 1)
+        self.scan(tickets[0])
+        data, new_version = build_manifest(self.event.id, since=version)
+        delta = read_manifest(data)
+        self.assertTrue(delta['delta'])
+        self.assertEqual(delta['base'], version)
+        self.assertEqual(delta['tickets'], {new_tickets[0].id: self.tickettype.id})
+        self.assertEqual(delta['scanned'], [tickets[0].id])
+        self.assertEqual((delta['total_tickets'], delta['total_scanned']), (3, 1))
+        # nothing changed since
+        delta = read_manifest(build_manifest(self.event.id, since=new_version)[0])
+        self.assertEqual((delta['tickets'], delta['scanned']), ({}, []))
+        self.assertEqual(delta['version'], new_version)
+    
+    def test_invalid_version(self):
+        self.assertRaises(ex.InvalidManifestVersionError, build_manifest, self.event.id, since="abc")
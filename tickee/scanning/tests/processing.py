@@ -0,0 +1,133 @@
+from tickee.accounts.processing import create_account
+from tickee.core.currency.processing import create_currency
+from tickee.events.eventparts.processing import add_eventpart
+from tickee.events.processing import start_event
+from tickee.orders.processing import start_order, add_tickets, delete_order
+from tickee.scanning import verdicts
+from tickee.scanning.models import TicketScan
+from tickee.scanning.processing import merge_scans, scan_ticket
+from tickee.scanning.tasks import reset_scans
+from tickee.subscriptions.models import Subscription, FREE
+from tickee.tests import BaseTestCase
+from tickee.tickets.manager import tickets_from_order
+from tickee.tickets.models import Ticket
+from tickee.tickets.tasks import create_tickets
+from tickee.tickettypes.processing import create_tickettype, link_tickettype_to_event
+from tickee.users.processing import create_user
+import datetime
+import sqlahelper
+import tickee.exceptions as ex
+
+Session = sqlahelper.get_session()
+
+
+class ScanningTestCase(BaseTestCase):
+    
+    def setUp(self):
+        super(ScanningTestCase, self).setUp()
+        self.users = 0
+        create_currency("EUR", "Euro")
+        self.account = create_account("accountname", "email")
+        self.account.subscription = Subscription(FREE)
+        self.event = start_event(self.account.id, "event_name")
+        add_eventpart(self.event.id)
+        self.event2 = start_event(self.account.id, "event_name2")
+        add_eventpart(self.event2.id)
+        self.tickets = self.order_tickets(self.event, 3)
+        self.tickets2 = self.order_tickets(self.event2, 1)
+        
+    def order_tickets(self, event, amount):
+        tickettype = create_tickettype(0, 100)
+        tickettype.is_active = True
+        link_tickettype_to_event(tickettype, event)
+        # a new user for every order, a user has only one started order
+        self.users += 1
+        user = create_user("user%s@example.com" % self.users)
+        order = start_order(user, self.account)
+        add_tickets(order, tickettype.id, amount)
+        Session.flush()
+        create_tickets(order)
+        return sorted(tickets_from_order(order), key=lambda t: t.id)
+    
+    def scans_of(self, ticket):
+        return Session.query(TicketScan).filter(TicketScan.ticket_id==ticket.id).all()
+    
+    # scan_ticket
+    
+    def test_scan_ticket(self):
+        code = self.tickets[0].get_code()
+        scan_ticket(code, datetime.datetime.utcfromtimestamp(1000), dict(device="gate-1"),
+                    self.account.id)
+        try:
+            scan_ticket(code, datetime.datetime.utcfromtimestamp(1001), dict())
+        except ex.DuplicateTicketScanError as e:
+            self.assertEqual(e.details, dict(scanned_at=1000, device="gate-1"))
+        else:
+            self.fail("scanned twice")
+        self.assertEqual(len(self.scans_of(self.tickets[0])), 1)
+    
+    def test_scan_ticket_of_other_account(self):
+        self.assertRaises(ex.PermissionDenied, scan_ticket, self.tickets[0].get_code(),
+                          datetime.datetime.utcnow(), dict(), self.account.id + 1)
+        self.assertRaises(ex.TicketNotFoundError, scan_ticket, "FFFFFFFFF",
+                          datetime.datetime.utcnow(), dict())
+    
+    # merge_scans
+    
+    def test_verdicts(self):
+        scans = [dict(code=self.tickets[0].get_code(), timestamp=1000, device="gate-1"),
+                 dict(code=self.tickets[1].get_code(), timestamp=1001, device="gate-1"),
+                 dict(code=self.tickets[0].get_code(), timestamp=1002, device="gate-2"),
+                 dict(code=self.tickets2[0].get_code(), timestamp=1003, device="gate-1"),
+                 dict(code="FFFFFFFFF", timestamp=1004),
+                 dict(code="not a code", timestamp=1005)]
+        result = merge_scans(self.event.id, scans)
+        self.assertEqual([v['status'] for v in result], 
+                         [verdicts.ACCEPTED, verdicts.ACCEPTED, verdicts.DUPLICATE,
+                          verdicts.WRONG_EVENT, verdicts.UNKNOWN, verdicts.UNKNOWN])
+        self.assertEqual(result[2]['scanned_date'], datetime.datetime.utcfromtimestamp(1000))
+        self.assertEqual(result[2]['device'], "gate-1")
+        self.assertEqual(len(self.scans_of(self.tickets[0])), 1)
+        self.assertEqual(len(self.scans_of(self.tickets[1])), 1)
+        self.assertEqual(len(self.scans_of(self.tickets2[0])), 0)
+    
+    def test_merge_is_deterministic(self):
+        code = self.tickets[0].get_code()
+        gate1 = dict(code=code, timestamp=1000, device="gate-1")
+        gate2 = dict(code=code, timestamp=900, device="gate-2")
+        # gate-1 uploads first, gate-2 scanned earlier but uploads late
+        self.assertEqual(merge_scans(self.event.id, [gate1])[0]['status'], verdicts.ACCEPTED)
+        self.assertEqual(merge_scans(self.event.id, [gate2])[0]['status'], verdicts.ACCEPTED)
+        result = merge_scans(self.event.id, [gate1])[0]
+        self.assertEqual((result['status'], result['device']), (verdicts.DUPLICATE, "gate-2"))
+        scans = self.scans_of(self.tickets[0])
+        self.assertEqual(len(scans), 1)
+        self.assertEqual(scans[0].scanned_date, datetime.datetime.utcfromtimestamp(900))
+        self.assertEqual(scans[0].extra_info['device'], "gate-2")
+    
+    def test_upload_again(self):
+        scan = dict(code=self.tickets[0].get_code(), timestamp=1000, device="gate-1")
+        merge_scans(self.event.id, [scan])
+        self.assertEqual(merge_scans(self.event.id, [scan])[0]['status'], verdicts.ACCEPTED)
+        self.assertEqual(len(self.scans_of(self.tickets[0])), 1)
+    
+    # reset_scans
+    
+    def test_reset_scans(self):
+        for ticket in self.tickets[:2] + self.tickets2:
+            scan_ticket(ticket.get_code(), datetime.datetime.utcnow(), dict())
+        self.assertEqual(reset_scans(event_id=self.event.id), 2)
+        self.assertEqual(self.scans_of(self.tickets[0]), [])
+        self.assertEqual(len(self.scans_of(self.tickets2[0])), 1)
+        self.assertEqual(reset_scans(event_id=self.event.id), 0)
+    
+    # delete_order
+    
+    def test_delete_order_removes_scans(self):
+        scan_ticket(self.tickets[0].get_code(), datetime.datetime.utcnow(), dict())
+        ticket_id = self.tickets[0].id
+        order = self.tickets[0].ticket_order.order
+        counts = delete_order(order)
+        self.assertEqual(counts, dict(tickets=3, ticketorders=1, scans=1))
+        self.assertEqual(Session.query(TicketScan).filter(TicketScan.ticket_id==ticket_id).count(), 0)
+        self.assertEqual(Session.query(Ticket).filter(Ticket.id==ticket_id).count(), 0)
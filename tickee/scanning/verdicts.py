@@ -0,0 +1,5 @@
+# verdicts on the scans uploaded by a scanning device
+ACCEPTED = "accepted"
+DUPLICATE = "duplicate"
+UNKNOWN = "unknown"
+WRONG_EVENT = "wrong_event"
@@ -13,14 +13,16 @@ INSTALLED_APPS = (
     'tickee.paymentproviders',
     'tickee.core.currency',
     'tickee.core.crm',
+    'tickee.core.mail',
     'tickee.core.l10n',
 #    'tickee.accounts',
 #    'tickee.events',
-#    'tickee.orders',
+    'tickee.orders',
     'tickee.scanning',
+    'tickee.statistics',
     'tickee.subscriptions',
     'tickee.tickets',
-#    'tickee.tickettypes',
+    'tickee.tickettypes',
 #    'tickee.users',
     'tickee.venues',
 )
@@ -42,4 +44,12 @@ SMTP_SERVERS = [
         'username': 'noreply@tick.ee',
         'password': '1.kwarteL'
     }
-]
\ No newline at end of file
+]
+
+# directory caching the compiled mail templates between worker restarts, 
+# templates are only cached in memory when None.
+MAIL_TEMPLATE_CACHE_DIR = None
+
+# directory of the journals of buffered crm events not yet written to the
+# database, must survive a restart of the workers.
+CRM_JOURNAL_DIR = '/var/tmp/tickee-crm'
@@ -6,7 +6,8 @@ from tickee.events.manager import lookup_event_by_id
 from tickee.events.permissions import require_event_owner
 from tickee.paymentproviders.processing import get_or_create_transaction_statistic
 from tickee.statistics.processing import total_tickets, detailed_ticket_count, total_tickets_of_event, \
-    total_available_of_event, orders_of_event, total_guest_tickets_of_event
+    total_available_of_event, orders_of_event, total_guest_tickets_of_event, \
+    paper_tickets_of_event
 
 
 @task
@@ -21,7 +22,8 @@ def event_statistics(client_id, event_id):
     return dict(total_sold=total_tickets_of_event(event),
                 total_available=total_available_of_event(event),
                 total_orders=orders_of_event(event),
-                total_guests=total_guest_tickets_of_event(event))
+                total_guests=total_guest_tickets_of_event(event),
+                total_paper=paper_tickets_of_event(event))
 
 
 @task(name="statistics.account")
@@ -0,0 +1,43 @@
+from sqlalchemy.schema import Column, Index
+from sqlalchemy.types import Integer, Date
+import sqlahelper
+
+Base = sqlahelper.get_base()
+
+
+class SalesRollup(Base):
+    """
+    Sales of a tickettype on a day, kept up to date by 
+    ``tickee.statistics.rollups`` when orders are purchased or deleted.
+    
+    An order is counted once per event, in the rollup of the tickettype of
+    the event with the lowest id. Tickettypes not linked to an event are
+    counted with event id 0.
+    """
+    
+    __tablename__ = 'tickee_sales_rollups'
+    
+    # Columns
+    
+    account_id = Column(Integer, primary_key=True, autoincrement=False)
+    event_id = Column(Integer, primary_key=True, autoincrement=False)
+    tickettype_id = Column(Integer, primary_key=True, autoincrement=False)
+    day = Column(Date, primary_key=True)
+    tickets = Column(Integer)
+    orders = Column(Integer)
+    guest_tickets = Column(Integer)
+    revenue = Column(Integer) # in cents
+    
+    def __init__(self, account_id, event_id, tickettype_id, day):
+        self.account_id = account_id
+        self.event_id = event_id
+        self.tickettype_id = tickettype_id
+        self.day = day
+        self.tickets = 0
+        self.orders = 0
+        self.guest_tickets = 0
+        self.revenue = 0
+
+
+Index('ix_tickee_sales_rollups_event_day', SalesRollup.event_id, SalesRollup.day)
+Index('ix_tickee_sales_rollups_account_day', SalesRollup.account_id, SalesRollup.day)
@@ -1,5 +1,4 @@
-from sqlalchemy.sql.expression import func, extract
-from sqlalchemy.sql.functions import count
+from sqlalchemy.sql.expression import func, extract, distinct
 from tickee.db.models.event import Event
 from tickee.db.models.eventpart import EventPart
 from tickee.db.models.order import Order
@@ -7,8 +6,8 @@ from tickee.db.models.ticketorder import TicketOrder
 from tickee.db.models.tickettype import TicketTypeEventPartAssociation, TicketType
 from tickee.orders import states
 from tickee.orders.marshalling import order_to_shortdict
-from tickee.tickets.models import Ticket
-from tickee.tickettypes.marshalling import tickettype_to_dict
+from tickee.statistics.models import SalesRollup
+from tickee.tickettypes.marshalling import tickettypes_to_dicts
 import datetime
 import sqlahelper
 
@@ -20,9 +19,7 @@ Session = sqlahelper.get_session()
 
 def total_tickets_of_event(event):
     """ Returns the total number of tickets sold of the event """
-    tickets = Session.query(Ticket.id).distinct(Ticket.id).join(TicketOrder, TicketType, TicketTypeEventPartAssociation, EventPart)\
-                     .filter(EventPart.event_id==event.id).count()
-    return tickets
+    return sum_of_event(SalesRollup.tickets, event)
 
 def total_available_of_event(event):
     """ Returns the total amount of tickets available for this event """
@@ -37,80 +34,85 @@ def sold_per_tickettype_of_event(event):
     per tickettype """
     tickettypes = Session.query(TicketType).join(TicketTypeEventPartAssociation, EventPart)\
                          .filter(EventPart.event_id==event.id).all()
-    return map(lambda tt: tickettype_to_dict(tt), tickettypes)
+    return tickettypes_to_dicts(tickettypes)
 
 def orders_of_event(event):
     """ Returns the total amount of purchased orders of the event """
-    order_amount = Session.query(Order).join(TicketOrder, TicketType, TicketTypeEventPartAssociation, EventPart)\
-                          .distinct(Order.id)\
-                          .filter(EventPart.event_id == event.id)\
-                          .filter(Order.status == states.PURCHASED).count()
-    return order_amount
+    return sum_of_event(SalesRollup.orders, event)
     
 def guest_orders_of_event(event):
-    """ Returns the amount of guest orders of this event.
-    TODO: META FILTER WON'T WORK. """
-    order_amount = Session.query(Order).join(TicketOrder, TicketType, TicketTypeEventPartAssociation, EventPart)\
-                          .distinct(Order.id)\
-                          .filter(EventPart.event_id == event.id)\
-                          .filter(Order.meta.like('%g%'))\
-                          .filter(Order.status == states.PURCHASED).count() # TODO: Order.meta.like() is a hack
-    return order_amount
+    """ Returns the amount of purchased guest orders of the event """
+    return flagged_orders_of_event(Order.is_gifted, event)
+
+def paper_orders_of_event(event):
+    """ Returns the amount of purchased paper orders of the event """
+    return flagged_orders_of_event(Order.is_paper, event)
+
+def paper_tickets_of_event(event):
+    """ Returns the amount of paper tickets of the event """
+    total = Session.query(func.sum(TicketOrder.amount))\
+                   .join(Order)\
+                   .filter(TicketOrder.event_id == event.id)\
+                   .filter(Order.is_paper == True)\
+                   .filter(Order.status == states.PURCHASED).scalar()
+    return int(total or 0)
+
+def flagged_orders_of_event(flag, event):
+    """ Returns the amount of purchased orders of the event having a flag """
+    return Session.query(func.count(distinct(Order.id)))\
+                  .join(TicketOrder)\
+                  .filter(TicketOrder.event_id == event.id)\
+                  .filter(flag == True)\
+                  .filter(Order.status == states.PURCHASED).scalar()
 
 def total_guest_tickets_of_event(event):
-    """ Calculates the amount of guest tickets of an event """                        
-    ticket_and_order = Session.query(Ticket.id, Order.meta, Order.id).distinct(Ticket.id)\
-                              .join(TicketOrder, Order, TicketType, TicketTypeEventPartAssociation, EventPart)\
-                              .filter(EventPart.event_id == event.id)\
-                              .filter(Order.status == states.PURCHASED)
-    count = 0 
-    for ticket_id,order_meta,order_id in ticket_and_order:
-        if "gifted" in order_meta:
-            count += 1
-            
-    return count
+    """ Calculates the amount of guest tickets of an event """
+    return sum_of_event(SalesRollup.guest_tickets, event)
+
+def revenue_of_event(event):
+    """ Returns the revenue of the event in cents """
+    return sum_of_event(SalesRollup.revenue, event)
+
+def sum_of_event(counter, event):
+    """ Returns the sum of a counter of the sales rollups of an event """
+    total = Session.query(func.sum(counter)).filter(SalesRollup.event_id==event.id).scalar()
+    return int(total or 0)
 
 
 # -- Accounts -----------------------------------------------------------------
 
 def total_tickets(account, year=None, month=None):
     """ Returns the total number of tickets sold by the account. """
-    tickets = Session.query(Ticket.id)
-    # filter by year
+    tickets = Session.query(func.sum(SalesRollup.tickets))\
+                     .filter(SalesRollup.account_id==account.id)
+    # filter by year and month
     if year is not None:
-        tickets = tickets.filter(extract('year', Ticket.created_at)==year)
-    # filter by month
-    if month is not None:
-        tickets = tickets.filter(extract('month', Ticket.created_at)==month)
-    tickets = tickets.join(TicketOrder, Order).filter(Order.account_id==account.id)
-    return tickets.count()
+        if month is not None:
+            start = datetime.date(year, month, 1)
+            end = datetime.date(year + month / 12, month % 12 + 1, 1)
+        else:
+            start = datetime.date(year, 1, 1)
+            end = datetime.date(year + 1, 1, 1)
+        tickets = tickets.filter(SalesRollup.day >= start).filter(SalesRollup.day < end)
+    elif month is not None:
+        tickets = tickets.filter(extract('month', SalesRollup.day)==month)
+    return int(tickets.scalar() or 0)
 
 
 def detailed_ticket_count(account, max_months_ago=None):
-    """ Returns a thing """
-    tickets = Session.query(func.date_part('year', Ticket.created_at),
-                            func.date_part('month', Ticket.created_at),
-                            count(Ticket.id))\
-                     .join(TicketOrder, Order).filter(Order.account_id==account.id)\
-                     .group_by(func.date_part('year', Ticket.created_at),
-                               func.date_part('month', Ticket.created_at))
+    """ Returns the amount of tickets sold per month, as a dictionary of 
+    years containing a dictionary of months. """
+    tickets = Session.query(SalesRollup.day, func.sum(SalesRollup.tickets))\
+                     .filter(SalesRollup.account_id==account.id)\
+                     .group_by(SalesRollup.day)
                      
     if max_months_ago is not None:
         past_date = datetime.datetime.utcnow() - datetime.timedelta(days=(max_months_ago*365)/12)
         past_date = datetime.date(year=past_date.year, month=past_date.month, day=1) # set to beginning of month
-        tickets = tickets.filter(Ticket.created_at >= past_date)
+        tickets = tickets.filter(SalesRollup.day >= past_date)
     
-    statistic_tuples = tickets.all() # [[year, month, amount], ..]
     result = dict()
-    for year, month, amount in statistic_tuples:
-        year = int(year)
-        month = int(month)
-        amount = int(amount)
-        if year in result:
-            if not month in result[year]:
-                result[year][month] = amount
-            else:
-                result[year][month] += amount
-        else:
-            result[year] = {month: amount}
-    return result
\ No newline at end of file
+    for day, amount in tickets:
+        months = result.setdefault(day.year, dict())
+        months[day.month] = months.get(day.month, 0) + int(amount)
+    return result
@@ -0,0 +1,120 @@
+"""
+Sales Rollups
+=============
+
+    The sales statistics are read from ``SalesRollup`` rows holding the
+    tickets, orders, guest tickets and revenue per account, event,
+    tickettype and day, instead of being counted from the tickets and
+    orders on every request.
+
+    ``record_order`` adds a purchased order to the rollups in the
+    transaction that purchases it, ``remove_order`` takes it out again when
+    a purchased order is deleted. ``rebuild_rollups`` recomputes the rollups
+    from the purchased orders, e.g. to fill them for an existing database.
+"""
+from sqlalchemy.exc import IntegrityError
+from tickee.core.db import execute
+from tickee.db.models.order import Order
+from tickee.orders.states import PURCHASED
+from tickee.statistics.models import SalesRollup
+import logging
+import sqlahelper
+
+Session = sqlahelper.get_session()
+
+blogger = logging.getLogger('blm.statistics')
+
+rollups = SalesRollup.__table__
+
+KEY_COLUMNS = ('account_id', 'event_id', 'tickettype_id', 'day')
+COUNTERS = ('tickets', 'orders', 'guest_tickets', 'revenue')
+
+
+def get_order_sales(order):
+    """
+    Returns the sales of a purchased order as a dictionary mapping
+    (account_id, event_id, tickettype_id, day) to a dictionary of counters.
+    """
+    day = (order.purchased_on or order.session_start).date()
+    is_guest = bool(order.is_gifted)
+    sales = dict()
+    counted_events = set()
+    ticketorders = sorted(order.get_ticketorders(), key=lambda to: to.ticket_type_id)
+    for ticketorder in ticketorders:
+        tickettype = ticketorder.ticket_type
+        event = tickettype.get_event()
+        event_id = event.id if event is not None else 0
+        key = (order.account_id, event_id, tickettype.id, day)
+        counters = sales.setdefault(key, dict.fromkeys(COUNTERS, 0))
+        counters['tickets'] += ticketorder.amount
+        if is_guest:
+            counters['guest_tickets'] += ticketorder.amount
+        else:
+            counters['revenue'] += ticketorder.get_total()
+        if event_id not in counted_events:
+            counters['orders'] += 1
+            counted_events.add(event_id)
+    return sales
+
+
+def apply_sales(sales, factor=1):
+    """ Adds the sales, multiplied by a factor, to the rollups. """
+    for (account_id, event_id, tickettype_id, day), counters in sales.iteritems():
+        key = (rollups.c.account_id==account_id) & (rollups.c.event_id==event_id) \
+            & (rollups.c.tickettype_id==tickettype_id) & (rollups.c.day==day)
+        values = dict((name, getattr(rollups.c, name) + factor * amount)
+                      for name, amount in counters.iteritems())
+        if execute(rollups.update().where(key).values(**values)).rowcount:
+            continue
+        # first sale of the tickettype on this day
+        row = dict((name, factor * amount) for name, amount in counters.iteritems())
+        savepoint = Session.begin_nested()
+        try:
+            execute(rollups.insert().values(account_id=account_id, event_id=event_id,
+                                            tickettype_id=tickettype_id, day=day, **row))
+        except IntegrityError:
+            # inserted concurrently
+            savepoint.rollback()
+            execute(rollups.update().where(key).values(**values))
+        else:
+            savepoint.commit()
+
+
+def record_order(order):
+    """ Adds a purchased order to the rollups. """
+    apply_sales(get_order_sales(order))
+
+def remove_order(order):
+    """ Removes a purchased order from the rollups. """
+    apply_sales(get_order_sales(order), factor=-1)
+
+
+def rebuild_rollups(account_id=None):
+    """
+    Recomputes the rollups of all accounts, or of a single account, from the
+    purchased orders.
+
+    Returns:
+        The amount of rollup rows.
+    """
+    deletion = rollups.delete()
+    orders = Session.query(Order).filter(Order.status==PURCHASED)
+    if account_id is not None:
+        deletion = deletion.where(rollups.c.account_id==int(account_id))
+        orders = orders.filter(Order.account_id==int(account_id))
+    totals = dict()
+    for order in orders.yield_per(500):
+        for key, counters in get_order_sales(order).iteritems():
+            total = totals.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            for name, amount in counters.iteritems():
+                total[name] += amount
+    execute(deletion)
+    rows = []
+    for key, counters in totals.iteritems():
+        row = dict(zip(KEY_COLUMNS, key))
+        row.update(counters)
+        rows.append(row)
+    if rows:
+        execute(rollups.insert(), rows)
+    blogger.info("rebuilt %s sales rollups" % len(totals))
+    return len(totals)
@@ -0,0 +1,97 @@
+from tickee.accounts.processing import create_account
+from tickee.core.currency.processing import create_currency
+from tickee.events.eventparts.processing import add_eventpart
+from tickee.events.processing import start_event
+from tickee.orders.processing import start_order, add_tickets, delete_order
+from tickee.orders.tasks import start_issuance
+from tickee.statistics.models import SalesRollup
+from tickee.statistics.processing import total_tickets_of_event, orders_of_event, \
+    total_guest_tickets_of_event, revenue_of_event, total_tickets, detailed_ticket_count, \
+    guest_orders_of_event, paper_orders_of_event, paper_tickets_of_event
+from tickee.statistics.rollups import rebuild_rollups
+from tickee.subscriptions.models import Subscription, FREE
+from tickee.tests import BaseTestCase
+from tickee.tickettypes.processing import create_tickettype, link_tickettype_to_event
+from tickee.users.processing import create_user
+import datetime
+import sqlahelper
+
+Session = sqlahelper.get_session()
+
+
+class SalesRollupTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(SalesRollupTestCase, self).setUp()
+        self.user = create_user("user@example.com")
+        create_currency("EUR", "Euro")
+        self.account = create_account("accountname", "email")
+        self.account.subscription = Subscription(FREE)
+        self.event = start_event(self.account.id, "event_name")
+        self.eventpart = add_eventpart(self.event.id)
+        self.tickettype = create_tickettype(1000, 100)
+        self.tickettype.is_active = True
+        link_tickettype_to_event(self.tickettype, self.event)
+        self.tickettype2 = create_tickettype(500, 100)
+        self.tickettype2.is_active = True
+        link_tickettype_to_event(self.tickettype2, self.event)
+
+    def purchase(self, amount, amount2=0, gifted=False, paper=False):
+        order = start_order(self.user, self.account)
+        order.is_gifted = gifted
+        order.is_paper = paper
+        add_tickets(order, self.tickettype.id, amount)
+        if amount2:
+            add_tickets(order, self.tickettype2.id, amount2)
+        order.checkout()
+        start_issuance(order, send_mail=False)
+        Session.flush()
+        return order
+
+    # record_order
+
+    def test_purchase_recorded(self):
+        self.purchase(2, 3)
+        self.purchase(1, gifted=True)
+        self.assertEqual(total_tickets_of_event(self.event), 6)
+        self.assertEqual(orders_of_event(self.event), 2)
+        self.assertEqual(total_guest_tickets_of_event(self.event), 1)
+        self.assertEqual(revenue_of_event(self.event),
+                         2 * self.tickettype.get_full_price() + 3 * self.tickettype2.get_full_price())
+
+    def test_account_statistics(self):
+        self.purchase(4)
+        today = datetime.datetime.utcnow().date()
+        self.assertEqual(total_tickets(self.account), 4)
+        self.assertEqual(total_tickets(self.account, today.year, today.month), 4)
+        self.assertEqual(detailed_ticket_count(self.account, 12), {today.year: {today.month: 4}})
+
+    def test_guest_and_paper_orders(self):
+        self.purchase(2, 3, gifted=True)
+        self.purchase(1, gifted=True)
+        self.purchase(4, paper=True)
+        self.purchase(1)
+        self.assertEqual(guest_orders_of_event(self.event), 2)
+        self.assertEqual(paper_orders_of_event(self.event), 1)
+        self.assertEqual(paper_tickets_of_event(self.event), 4)
+
+    # remove_order
+
+    def test_deleted_order_removed(self):
+        order = self.purchase(2)
+        self.purchase(1)
+        delete_order(order)
+        self.assertEqual(total_tickets_of_event(self.event), 1)
+        self.assertEqual(orders_of_event(self.event), 1)
+
+    # rebuild_rollups
+
+    def test_rebuild(self):
+        self.purchase(2, 3)
+        self.purchase(1, gifted=True)
+        Session.query(SalesRollup).delete()
+        self.assertEqual(total_tickets_of_event(self.event), 0)
+        self.assertEqual(rebuild_rollups(), 2)
+        self.assertEqual(total_tickets_of_event(self.event), 6)
+        self.assertEqual(orders_of_event(self.event), 2)
+        self.assertEqual(total_guest_tickets_of_event(self.event), 1)
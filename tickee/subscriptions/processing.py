@@ -1,7 +1,8 @@
 from lxml import etree
-import logging
-import requests
+from tickee.core.exceptions import HttpError
+from tickee.core.httpclient import get_client
 from tickee.exceptions import SubscriptionError
+import logging
 
 SAASY_URL = "https://api.fastspring.com"
 
@@ -12,7 +13,11 @@ def fetch_subscription_details(subscription_ref):
     the response. """
     url = SAASY_URL + '/company/tickee/subscription/' + subscription_ref
     tlogger.debug('fetching subscription details: %s' % url)
-    r = requests.get(url, auth=('api', 'lleesitzro'))
+    try:
+        r = get_client("saasy").get(url, auth=('api', 'lleesitzro'), endpoint="subscription")
+    except HttpError as e:
+        raise SubscriptionError("failed fetching subscription details for subscription reference %s: %s"\
+                                % (subscription_ref, e))
     # found subscription details
     if r.status_code == 200:
         response = etree.fromstring(r.content)
@@ -21,7 +26,7 @@ def fetch_subscription_details(subscription_ref):
     # there was a problem retrieving subscription details
     else:
         print r.status_code
-        tlogger.error("failed fetching subscription details for subscription reference %s, error code:"\
+        tlogger.error("failed fetching subscription details for subscription reference %s, error code: %s"\
                       % (subscription_ref, r.status_code))
         raise SubscriptionError("failed fetching subscription details for subscription reference %s" % subscription_ref)
         
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""
+Ticket changes
+==============
+
+    Scanner apps keep their attendee list up to date by polling the changes
+    to the tickets of an event: created, deleted and updated tickets, scans
+    and removed scans. The changes of an event are numbered by a sequence
+    that is kept on the event, so a device asks for the changes after the
+    last sequence number it has seen instead of relying on its clock.
+
+    Changes are recorded without a sequence number, so scanning and creating
+    tickets never wait for the counter of the event. ``sequence_changes``
+    numbers the committed changes when a device polls, holding the lock on
+    the event for the duration of the poll only. A change that is committed
+    late is numbered by the next poll after the ones already handed out, so
+    a device never skips it.
+
+    A device starts by reading the last sequence number, then lists the
+    tickets of the event and then polls the changes since that number.
+"""
+from sqlalchemy.sql.expression import bindparam
+from tickee.core.db import execute
+from tickee.db.models.event import Event
+from tickee.tickets.models import TicketChange
+import datetime
+import sqlahelper
+
+Session = sqlahelper.get_session()
+
+CREATED = "created"
+DELETED = "deleted"
+UPDATED = "updated"
+SCANNED = "scanned"
+UNSCANNED = "unscanned"
+
+CHANGES_LIMIT = 1000
+
+ticketchanges = TicketChange.__table__
+
+
+def record_changes(event_id, ticket_ids, action):
+    """
+    Records the same change to tickets of an event. The changes are numbered
+    once they are committed, by ``sequence_changes``.
+    """
+    ticket_ids = list(ticket_ids)
+    if not ticket_ids or event_id is None:
+        return
+    created_at = datetime.datetime.utcnow()
+    execute(ticketchanges.insert(),
+            [dict(event_id=event_id, 
+                  ticket_id=ticket_id, 
+                  action=action, 
+                  created_at=created_at) for ticket_id in ticket_ids])
+
+
+def record_changes_per_event(tickets, action):
+    """ Records the same change to a list of (ticket id, event id) tuples 
+    of several events. """
+    per_event = dict()
+    for ticket_id, event_id in tickets:
+        per_event.setdefault(event_id, []).append(ticket_id)
+    for event_id in sorted(per_event):
+        record_changes(event_id, per_event[event_id], action)
+
+
+def sequence_changes(event_id):
+    """
+    Numbers the committed changes of an event that have no sequence number
+    yet, in the order they were recorded. Locks the event until the
+    transaction ends.
+
+    Returns:
+        The sequence number of the last change.
+    """
+    last = Session.query(Event.last_change).filter(Event.id==event_id)\
+                  .with_lockmode('update').scalar() or 0
+    change_ids = [change_id for (change_id,) in 
+                  Session.query(TicketChange.id).filter(TicketChange.event_id==event_id)\
+                                                .filter(TicketChange.sequence==None)\
+                                                .order_by(TicketChange.id)]
+    if change_ids:
+        execute(ticketchanges.update().where(ticketchanges.c.id==bindparam('_id'))\
+                                      .values(sequence=bindparam('_sequence')),
+                [dict(_id=change_id, _sequence=last + i + 1) 
+                 for i, change_id in enumerate(change_ids)])
+        last += len(change_ids)
+        events = Event.__table__
+        execute(events.update().where(events.c.id==event_id).values(last_change=last))
+    return last
+
+
+def changes_since(event_id, sequence, limit=CHANGES_LIMIT):
+    """ Returns the numbered changes of an event after a sequence number. """
+    return Session.query(TicketChange).filter(TicketChange.event_id==event_id)\
+                                      .filter(TicketChange.sequence > sequence)\
+                                      .order_by(TicketChange.sequence)\
+                                      .limit(limit).all()
+
+
+def poll_changes(event_id, sequence, limit=CHANGES_LIMIT):
+    """ Numbers the new changes of an event and returns the changes after a
+    sequence number. """
+    sequence_changes(event_id)
+    return changes_since(event_id, sequence, limit)
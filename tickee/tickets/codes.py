@@ -0,0 +1,134 @@
+"""
+Ticket codes
+============
+
+    The code of a ticket is the hexadecimal id of the ticket, which the
+    server can only check by looking it up. The QR codes carry a signed code
+    instead, which scanners verify locally with the code key of the event::
+
+        "T" + base32(ticket id, event id, tickettype id as ">III" + signature)
+
+    The signature is the first 8 bytes of the HMAC-SHA256 of the ids with the
+    code key of the event. The key is handed to the scanners with the access
+    code. ``tickee.tickets.processing.code_to_id`` accepts both codes.
+"""
+from tickee.core.db import execute
+from tickee.db.models.event import Event, new_code_key
+import base64
+import binascii
+import hashlib
+import hmac
+import sqlahelper
+import struct
+
+try:
+    from hmac import compare_digest
+except ImportError:
+    # python < 2.7.7
+    def compare_digest(a, b):
+        """ Compares two strings in a time independent of their contents. """
+        if len(a) != len(b):
+            return False
+        result = 0
+        for x, y in zip(a, b):
+            result |= ord(x) ^ ord(y)
+        return result == 0
+
+Session = sqlahelper.get_session()
+
+SIGNED_PREFIX = "T"
+SIGNATURE_SIZE = 8
+
+PAYLOAD = struct.Struct(">III")
+
+
+def sign_code(ticket_id, event_id, tickettype_id, key):
+    """ Returns the signed code of a ticket. """
+    payload = PAYLOAD.pack(ticket_id, event_id, tickettype_id)
+    return SIGNED_PREFIX + base64.b32encode(payload + signature(payload, key)).rstrip("=")
+
+
+def read_code(code):
+    """
+    Reads the ids of a signed code without verifying it.
+
+    Returns:
+        (ticket id, event id, tickettype id)
+
+    Raises:
+        ValueError
+    """
+    return PAYLOAD.unpack(decode(code)[:PAYLOAD.size])
+
+
+def verify_code(code, key):
+    """
+    Reads the ids of a signed code signed with a key.
+
+    Returns:
+        (ticket id, event id, tickettype id)
+
+    Raises:
+        ValueError
+            if the code is not signed with the key.
+    """
+    data = decode(code)
+    payload = data[:PAYLOAD.size]
+    if not compare_digest(data[PAYLOAD.size:], signature(payload, key)):
+        raise ValueError("invalid signature")
+    return PAYLOAD.unpack(payload)
+
+
+def is_signed(code):
+    """ Returns True if a code is a signed code. """
+    return code.upper().startswith(SIGNED_PREFIX)
+
+
+def decode(code):
+    """ Returns the payload and the signature of a signed code. """
+    if not is_signed(code):
+        raise ValueError("not a signed code")
+    encoded = str(code[len(SIGNED_PREFIX):]).upper()
+    try:
+        data = base64.b32decode(encoded + "=" * (-len(encoded) % 8))
+    except TypeError:
+        raise ValueError("invalid code")
+    if len(data) != PAYLOAD.size + SIGNATURE_SIZE:
+        raise ValueError("invalid code")
+    return data
+
+
+def signature(payload, key):
+    """ Returns the signature of a payload with a hexadecimal key. """
+    return hmac.new(binascii.unhexlify(key), payload, hashlib.sha256).digest()[:SIGNATURE_SIZE]
+
+
+def lookup_code_key(event_id):
+    """
+    Returns the code key of an event, or None if the event does not exist or
+    has no key yet. Unlike ``get_code_key`` it never writes, it is used to
+    verify codes that may be forged.
+    """
+    return Session.query(Event.code_key).filter(Event.id==event_id).scalar()
+
+
+def get_code_key(event_id):
+    """
+    Returns the code key of an event, creating one for events from before
+    the signed codes.
+
+    Raises:
+        ValueError
+            if the event does not exist.
+    """
+    event = Session.query(Event).get(event_id)
+    if event is None:
+        raise ValueError("event %s does not exist" % event_id)
+    if event.code_key is None:
+        events = Event.__table__
+        # another process may create the key at the same moment
+        execute(events.update().where(events.c.id==event_id)\
+                               .where(events.c.code_key==None)\
+                               .values(code_key=new_code_key()))
+        Session.refresh(event, ['code_key'])
+    return event.code_key
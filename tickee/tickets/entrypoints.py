@@ -1,19 +1,19 @@
 from celery.task import task
 from tickee.accounts.manager import lookup_account_by_name
 from tickee.core import entrypoint
+from tickee.core.pagination import list_or_page
 from tickee.core.security.oauth2.manager import lookup_account_for_client
 from tickee.db.models.account import Account
-from tickee.db.models.eventpart import EventPart
 from tickee.db.models.order import Order
 from tickee.db.models.ticketorder import TicketOrder
-from tickee.db.models.tickettype import TicketType,\
-    TicketTypeEventPartAssociation
 from tickee.db.models.user import User
 from tickee.events.manager import lookup_event_by_id
 from tickee.events.permissions import require_event_owner
 from tickee.scanning.manager import list_ticketscans
-from tickee.tickets.manager import lookup_ticket_by_code, list_tickets
-from tickee.tickets.marshalling import ticket_to_dict
+from tickee.tickets import changes
+from tickee.tickets.manager import lookup_ticket_by_code, list_tickets, query_attendees
+from tickee.tickets.marshalling import ticket_to_dict, tickets_to_dicts, \
+    attendee_to_dict, change_to_dict
 from tickee.tickets.models import Ticket
 from tickee.tickets.permissions import require_tickettype_owner
 from tickee.tickets.processing import delete_ticket
@@ -44,6 +44,7 @@ def ticket_update(ticket_code, ticket_info):
     ticket = lookup_ticket_by_code(ticket_code)
     user = lookup_user_by_id(user_id)
     ticket.user_id = user.id
+    changes.record_changes(ticket.event_id, [ticket.id], changes.UPDATED)
     
     return ticket_to_dict(ticket)
 
@@ -65,24 +66,28 @@ def ticket_details(client_id, ticket_code):
 
 @task(name="tickets.visitors_of_account")
 @entrypoint()
-def visitors_of_account(account_short):
-    """ Returns a list of users who have attended the events of an account """
+def visitors_of_account(account_short, cursor=None, limit=None):
+    """ Returns a list of users who have attended the events of an account.
+    If a cursor or a limit is given, returns a page of them as 
+    dict(visitors=[...], next=<cursor of the next page or None>). """
     account = lookup_account_by_name(account_short)
     users = Session.query(User).join(Ticket, TicketOrder, Order, Account)\
                    .filter(Account.id == account.id)\
-                   .distinct(User.id).all()
-    return map(user_to_dict, users)
+                   .distinct()
+    return list_or_page(users, (User.id,), user_to_dict, 'visitors', cursor, limit)
 
 
 @task(name="tickets.visitors_of_event")
 @entrypoint()
-def visitors_of_event(event_id):
-    """ Returns a list of users who have attended the events of an account """
+def visitors_of_event(event_id, cursor=None, limit=None):
+    """ Returns a list of users who have attended an event. If a cursor or a 
+    limit is given, returns a page of them as 
+    dict(visitors=[...], next=<cursor of the next page or None>). """
     event = lookup_event_by_id(event_id)
-    users = Session.query(User).join(Ticket, TicketOrder, TicketType, TicketTypeEventPartAssociation, EventPart)\
-                   .filter(EventPart.event_id == event.id)\
-                   .distinct(User.id).all()
-    return map(user_to_dict, set(users))
+    users = Session.query(User).join(Ticket)\
+                   .filter(Ticket.event_id == event.id)\
+                   .distinct()
+    return list_or_page(users, (User.id,), user_to_dict, 'visitors', cursor, limit)
 
 
 @task(name="tickets.resend")
@@ -97,14 +102,18 @@ def resend(client_id, ticket_code):
 
 @task(name="tickets.from_event")
 @entrypoint()
-def from_event(client_id, event_id, since=None, ttype=None):
-    """ Lists all tickets of an event or show updates if since specified. """ 
+def from_event(client_id, event_id, since=None, ttype=None, cursor=None, limit=None):
+    """ Lists all tickets of an event or show updates if since specified. 
+    Without since, a cursor or a limit returns a page of the tickets as 
+    dict(tickets=[...], next=<cursor of the next page or None>). """ 
     if client_id is not None:
         require_event_owner(client_id, event_id)
         
     # show all tickets
     if since is None:
-        tickets = list_tickets(event_id, None, None, ttype)
+        attendees = query_attendees(event_id, None, None, ttype)
+        return list_or_page(attendees, (Ticket.created_at, Ticket.id), attendee_to_dict,
+                            'tickets', cursor, limit)
     
     # show updates since a given timestamp
     else:
@@ -114,12 +123,38 @@ def from_event(client_id, event_id, since=None, ttype=None):
                                                               scanned_after=since_datetime))
         # add new tickets
         tickets += list_tickets(event_id=event_id, purchased_after=since_datetime)
-        return map(ticket_to_dict, set(tickets))
-    
-    return map(lambda t: ticket_to_dict(t, include_scanned=True, include_event=False),
-               tickets)
+        return tickets_to_dicts(set(tickets))
         
         
+@task(name="tickets.changes")
+@entrypoint()
+def ticket_changes(client_id, event_id, since=None, limit=None):
+    """ Lists the changes to the tickets of an event after the sequence number
+    since. Devices poll it, it answers immediately when there are no changes. 
+    Without since, only returns the sequence number of the last change. 
+    Returns dict(changes=[...], last=<sequence of the last returned change>).
+    example:
+        {"sequence":12,"id":"00000002A","action":"scanned","ticket":{...}}
+    """
+    if client_id is not None:
+        require_event_owner(client_id, event_id)
+    
+    if since is None:
+        return dict(changes=[], last=changes.sequence_changes(event_id))
+    
+    limit = min(int(limit or changes.CHANGES_LIMIT), changes.CHANGES_LIMIT)
+    event_changes = changes.poll_changes(event_id, int(since), limit)
+    # the current state of the changed tickets
+    ticket_ids = set(change.ticket_id for change in event_changes)
+    attendees = dict()
+    if ticket_ids:
+        attendees = dict((attendee.id, attendee) for attendee in 
+                         query_attendees(event_id).filter(Ticket.id.in_(ticket_ids)))
+    return dict(changes=[change_to_dict(change, attendees.get(change.ticket_id))
+                         for change in event_changes],
+                last=event_changes[-1].sequence if event_changes else int(since))
+
+
 @task(name="tickets.from_user")
 @entrypoint()
 def from_user(client_id, user_id, include_failed=False):
@@ -134,4 +169,4 @@ def from_user(client_id, user_id, include_failed=False):
         account = lookup_account_for_client(client_id)
         tickets = tickets.join("ticket_order", "order", "account").filter(Account.id == account.id)
     
-    return map(ticket_to_dict, tickets.all())
\ No newline at end of file
+    return tickets_to_dicts(tickets.all())
\ No newline at end of file
@@ -1,7 +1,9 @@
 from sqlalchemy.orm import joinedload, subqueryload
-from tickee.db.models.eventpart import EventPart
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql.expression import exists
 from tickee.db.models.ticketorder import TicketOrder
-from tickee.db.models.tickettype import TicketType, TicketTypeEventPartAssociation
+from tickee.db.models.tickettype import TicketTypeEventPartAssociation
+from tickee.db.models.user import User
 from tickee.events.eventparts.manager import lookup_eventpart_by_id
 from tickee.events.manager import lookup_event_by_id
 from tickee.scanning.models import TicketScan
@@ -14,6 +16,8 @@ import tickee.exceptions as ex
 
 Session = sqlahelper.get_session()
 
+PREFETCH_CHUNK_SIZE = 500
+
 def tickets_from_order(order):
     """ Retrieves all tickets generated for an order. """
     ticketorders = order.ordered_tickets
@@ -53,42 +57,114 @@ def list_tickets(event_id,
                  eventpart_id=None,
                  tickettype_id=None):
     """
-    Retrieves a list of all tickets registered to an event.
+    Retrieves a list of all tickets registered to an event. See 
+    ``query_tickets`` for the arguments.
+    """
+    return query_tickets(event_id, purchased_after, eventpart_id, tickettype_id).all()
+
+def query_tickets(event_id,
+                  purchased_after=None,
+                  eventpart_id=None,
+                  tickettype_id=None):
+    """
+    Returns the query of the tickets registered to an event.
     
     Args:
         event_id:
             Filter by event.
+        purchased_after:
+            Only tickets created since this datetime.
         eventpart_id:
             Filter by eventpart.
         tickettype_id:
             Filter by tickettype.
     
-    Returns:
-        ???
-    
     Raises:
         EventNotFoundError
         EventPartNotFoundError
         TicketTypeNotFoundError
     """
-    event = lookup_event_by_id(event_id)
-    # lookup tickets  
-    tickets = Session.query(Ticket).join(TicketOrder)\
-                     .options(subqueryload('scans', Ticket.user))
+    lookup_event_by_id(event_id)
+    tickets = Session.query(Ticket).options(subqueryload('scans'), subqueryload('user'))
+    if tickettype_id or eventpart_id:
+        tickets = tickets.join(TicketOrder)
+    return filter_tickets(tickets, event_id, purchased_after, eventpart_id, tickettype_id)
+
+def query_attendees(event_id,
+                    purchased_after=None,
+                    eventpart_id=None,
+                    tickettype_id=None):
+    """
+    Returns the query of the attendee list of an event. Instead of ``Ticket``
+    objects, it selects named tuples of only the columns the list needs:
+    
+        id, created_at, order_id, user_id, first_name, last_name, scanned
+        and event_id
+    
+    The rows bypass the identity map and need no further queries to be
+    marshalled. The arguments are the same as ``query_tickets``.
+    """
+    lookup_event_by_id(event_id)
+    scanned = exists().where(TicketScan.ticket_id==Ticket.id).label('scanned')
+    attendees = Session.query(Ticket.id, Ticket.created_at, TicketOrder.order_id,
+                              Ticket.user_id, User.first_name, User.last_name, 
+                              scanned, Ticket.event_id)\
+                       .join(TicketOrder)\
+                       .outerjoin((User, User.id==Ticket.user_id))
+    return filter_tickets(attendees, event_id, purchased_after, eventpart_id, tickettype_id)
+
+def filter_tickets(tickets, event_id,
+                   purchased_after=None,
+                   eventpart_id=None,
+                   tickettype_id=None):
+    """
+    Filters a query of tickets on their event, creation, eventpart and 
+    tickettype. Filtering on the eventpart or the tickettype requires the
+    ticketorders to be joined.
+    """
+    # filter by event
+    tickets = tickets.filter(Ticket.event_id==event_id)
     # filter by tickettype
     if tickettype_id:
         lookup_tickettype_by_id(tickettype_id)
         tickets = tickets.filter(TicketOrder.ticket_type_id==tickettype_id)
     # filter by creation date
-    tickets = tickets.join(TicketType)
     if purchased_after:
         tickets = tickets.filter(Ticket.created_at>=purchased_after)
-    tickets = tickets.join(TicketTypeEventPartAssociation)
     # filter by eventpart
     if eventpart_id:
         lookup_eventpart_by_id(eventpart_id)
-        tickets = tickets.filter(TicketTypeEventPartAssociation.eventpart_id==eventpart_id)
-    tickets = tickets.join(EventPart)      
-    # filter by event
-    tickets = tickets.filter(EventPart.event_id==event_id)
-    return tickets.all()
\ No newline at end of file
+        tickets = tickets.join((TicketTypeEventPartAssociation, 
+                                TicketTypeEventPartAssociation.tickettype_id==TicketOrder.ticket_type_id))\
+                         .filter(TicketTypeEventPartAssociation.eventpart_id==eventpart_id)
+    return tickets
+
+def prefetch_tickets(tickets):
+    """
+    Loads the ticketorders with their tickettypes, the users and the scans
+    of a list of tickets with a query per chunk of tickets instead of 
+    several queries per ticket. The many-to-one relations are then resolved
+    from the session, so the returned objects have to stay referenced while
+    the tickets are used.
+    
+    Returns:
+        The loaded ticketorders and users.
+    """
+    loaded = []
+    for i in range(0, len(tickets), PREFETCH_CHUNK_SIZE):
+        chunk = tickets[i:i + PREFETCH_CHUNK_SIZE]
+        ticketorder_ids = set(ticket.ticket_order_id for ticket in chunk)
+        loaded += Session.query(TicketOrder).options(joinedload('ticket_type'))\
+                                            .filter(TicketOrder.id.in_(ticketorder_ids)).all()
+        user_ids = set(ticket.user_id for ticket in chunk if ticket.user_id)
+        if user_ids:
+            loaded += Session.query(User).filter(User.id.in_(user_ids)).all()
+        scans = dict((ticket.id, []) for ticket in chunk)
+        for scan in Session.query(TicketScan).filter(TicketScan.ticket_id.in_(scans.keys()))\
+                                            .order_by(TicketScan.id):
+            scans[scan.ticket_id].append(scan)
+        for ticket in chunk:
+            # scans that are already loaded may have pending changes
+            if 'scans' not in ticket.__dict__:
+                set_committed_value(ticket, 'scans', scans[ticket.id])
+    return loaded
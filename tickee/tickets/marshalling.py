@@ -1,4 +1,6 @@
-from tickee.core.marshalling import timestamp, date
+from tickee.core.marshalling import timestamp, date, Memo, prime_descriptions
+from tickee.tickets.manager import prefetch_tickets
+from tickee.tickets.processing import id_to_code
 from tickee.tickettypes.manager import get_event_of_tickettype, get_venues_of_tickettype
 from tickee.tickettypes.marshalling import tickettype_to_dict
 from tickee.users.marshalling import user_to_dict
@@ -11,33 +13,68 @@ def ticket_to_dict(ticket,
                    include_user=True,
                    include_event=True,
                    include_tickettype=False,
-                   include_venues=False):
+                   include_venues=False,
+                   memo=None):
     """
     Transforms a ``Ticket``object into a dictionary.
     """
+    memo = memo or Memo()
     result = dict(id=ticket.get_code(),
                   created_at=timestamp(ticket.created_at),
-                  order_id=ticket.ticket_order.order.id)
+                  order_id=ticket.ticket_order.order_id)
     if include_user:
         name = "%s %s" % (ticket.user.first_name or "None", ticket.user.last_name or "None")
         result['user'] = dict(name=name,
                               id=ticket.user.id)
     if include_event:
-        event = get_event_of_tickettype(ticket.ticket_order.ticket_type)
+        event = memo(get_event_of_tickettype, ticket.ticket_order.ticket_type)
         result['event'] = dict(id=event.id,
                                name=event.name,
-                               start_date=date(event.get_start_date()))
+                               start_date=date(memo(event.get_start_date)))
 
     result['checked_in'] = ticket.is_scanned()
     if include_tickettype:
         result['tickettype'] = tickettype_to_dict(ticket.ticket_order.ticket_type, 
-                                                  include_availability=False)
+                                                  include_availability=False,
+                                                  memo=memo)
     if include_venues:
         result['venues'] = map(venue_to_dict, 
-                               get_venues_of_tickettype(ticket.ticket_order.ticket_type))
+                               memo(get_venues_of_tickettype, ticket.ticket_order.ticket_type))
     return result
 
 
+def tickets_to_dicts(tickets, memo=None, **options):
+    """
+    Transforms a list of ``Ticket`` objects like ``ticket_to_dict``, taking
+    the same options. Their ticketorders, tickettypes, users, scans and 
+    descriptions are looked up in bulk and their events and venues once.
+    """
+    memo = memo or Memo()
+    tickets = list(tickets)
+    # keeps the prefetched objects in the session while marshalling
+    prefetched = prefetch_tickets(tickets)
+    if options.get('include_tickettype'):
+        prime_descriptions(memo, set(ticket.ticket_order.ticket_type for ticket in tickets))
+    result = [ticket_to_dict(ticket, memo=memo, **options) for ticket in tickets]
+    del prefetched
+    return result
+
+
+def attendee_to_dict(attendee):
+    """
+    Transforms an attendee row of ``query_attendees`` into the dictionary
+    ``ticket_to_dict`` returns for the attendee list, with the id of the event.
+    """
+    name = "%s %s" % (attendee.first_name or "None", attendee.last_name or "None")
+    return dict(id=id_to_code(attendee.id),
+                created_at=timestamp(attendee.created_at),
+                order_id=attendee.order_id,
+                user=dict(name=name,
+                          id=attendee.user_id),
+                checked_in=bool(attendee.scanned),
+                event_id=attendee.event_id)
+
+
 def ticket_to_dict2(ticket, fields=["id", "user", "creation", "event"]):
     result = dict()
     for field in fields:
@@ -50,4 +87,17 @@ def ticket_to_dict2(ticket, fields=["id", "user", "creation", "event"]):
                                              short=True)
         if field == "user":
             result['user'] = user_to_dict(ticket.user)
-    return result
\ No newline at end of file
+    return result
+
+
+def change_to_dict(change, attendee=None):
+    """
+    Transforms a ``TicketChange`` object into a dictionary, including the
+    ticket as ``attendee_to_dict`` returns it if it still exists.
+    """
+    result = dict(sequence=change.sequence,
+                  id=id_to_code(change.ticket_id),
+                  action=change.action)
+    if attendee is not None:
+        result['ticket'] = attendee_to_dict(attendee)
+    return result
@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
 
 from sqlalchemy.orm import relationship, backref
-from sqlalchemy.schema import Column, ForeignKey
-from sqlalchemy.types import Integer, DateTime
+from sqlalchemy.schema import Column, ForeignKey, Index
+from sqlalchemy.types import Integer, DateTime, String
+from tickee.tickets.codes import sign_code, get_code_key
 import datetime
 import sqlahelper
 import calendar
@@ -22,6 +23,7 @@ class Ticket(Base):
     id = Column(Integer, primary_key=True)
     ticket_order_id = Column(Integer, ForeignKey('tickee_ticketorders.id'))
     user_id = Column(Integer, ForeignKey('tickee_users.id')) # owner of the ticket
+    event_id = Column(Integer, ForeignKey('tickee_events.id')) # denormalized from the tickettype
     created_at = Column(DateTime)
     
     # Relations
@@ -31,9 +33,10 @@ class Ticket(Base):
     
     # Constructor
     
-    def __init__(self, ticket_order_id, user_id):
+    def __init__(self, ticket_order_id, user_id, event_id=None):
         self.ticket_order_id = ticket_order_id
         self.user_id = user_id
+        self.event_id = event_id
         self.created_at = datetime.datetime.utcnow()
       
     # Slug
@@ -61,11 +64,21 @@ class Ticket(Base):
         """
         return "%09X" % self.id
     
+    def get_signed_code(self):
+        """
+        Returns the code for the QR code, which scanners can verify without
+        the server. See ``tickee.tickets.codes``.
+        """
+        if self.event_id is None:
+            return self.get_code()
+        return sign_code(self.id, self.event_id, self.ticket_order.ticket_type_id, 
+                         get_code_key(self.event_id))
+    
     def get_qr_code_information(self):
         """
         Returns what information has to be put into the QR code.
         """
-        info = u'{{"key":"{0}:{1}:{2}","ical":"http://tick.ee/"}}'.format(self.get_code(), 
+        info = u'{{"key":"{0}:{1}:{2}","ical":"http://tick.ee/"}}'.format(self.get_signed_code(), 
                                                                           int(calendar.timegm(self.created_at.timetuple())),
                                                                           self.get_owner().id)
         return info
@@ -94,4 +107,29 @@ class Ticket(Base):
         if self.scans:
             return True
         else:
-            return False
\ No newline at end of file
+            return False
+
+# the tickets of an event are listed by their creation
+Index('ix_tickee_tickets_event_id_created_at', Ticket.event_id, Ticket.created_at)
+
+
+class TicketChange(Base):
+    """
+    A change to a ticket of an event. The changes of an event are numbered
+    by a sequence, see ``tickee.tickets.changes``.
+    """
+    
+    __tablename__ = 'tickee_ticketchanges'
+    
+    # Columns
+    
+    id = Column(Integer, primary_key=True)
+    event_id = Column(Integer, ForeignKey('tickee_events.id'), nullable=False)
+    sequence = Column(Integer) # numbered once committed
+    ticket_id = Column(Integer, nullable=False) # the ticket may have been deleted
+    action = Column(String(16), nullable=False)
+    created_at = Column(DateTime)
+
+# the changes of an event are read from a sequence number
+Index('ix_tickee_ticketchanges_event_id_sequence', 
+      TicketChange.event_id, TicketChange.sequence, unique=True)
@@ -1,11 +1,59 @@
+from sqlalchemy.sql.expression import select, func
+from tickee.core.db import execute
+from tickee.tickets import changes, codes
+from tickee.tickets.models import Ticket
 import sqlahelper
 
 Session = sqlahelper.get_session()
 
+tickets = Ticket.__table__
+
 def delete_ticket(ticket):
     """ Removes a ticket from the database """
+    changes.record_changes(ticket.event_id, [ticket.id], changes.DELETED)
     Session.delete(ticket)
 
 
 def code_to_id(code):
-    return int(code, 16)
\ No newline at end of file
+    """
+    Returns the ticket id of a ticket code, either the hexadecimal id or a
+    signed code.
+    
+    Raises:
+        ValueError
+            if the code is invalid or its signature does not match.
+    """
+    if codes.is_signed(code):
+        ticket_id, event_id, tickettype_id = codes.read_code(code)
+        key = codes.lookup_code_key(event_id)
+        if key is None:
+            raise ValueError("event %s has no code key" % event_id)
+        codes.verify_code(code, key)
+        return ticket_id
+    return int(code, 16)
+
+def id_to_code(ticket_id):
+    """ Returns the code of a ticket id, see ``Ticket.get_code``. """
+    return "%09X" % ticket_id
+
+
+def allocate_ticket_ids(amount):
+    """
+    Reserves a range of ticket ids using a single query. Returns None if the
+    database does not use a sequence to generate the ids.
+    """
+    if Session.bind.dialect.name != 'postgresql':
+        return None
+    result = Session.execute(select([func.nextval('tickee_tickets_id_seq')])\
+                                 .select_from(func.generate_series(1, amount)))
+    return [ticket_id for (ticket_id,) in result]
+
+
+def insert_tickets(rows):
+    """
+    Inserts tickets in bulk, bypassing the unit of work. Each row is a
+    dictionary containing the ticket_order_id, user_id, event_id and 
+    created_at of the ticket, and optionally its id.
+    """
+    if rows:
+        execute(tickets.insert(), rows)
@@ -1,11 +1,14 @@
 from celery.task import task
-from jinja2.environment import Environment
-from jinja2.loaders import PackageLoader
 from tickee.core.crm.tasks import log_crm
-from tickee.core.mail import send_email
+from tickee.core.mail.outbox import queue_email
+from tickee.core.mail.templates import render
 from tickee.core.validators import validate_email
-from tickee.tickets.manager import tickets_from_order, get_event_of_ticket, lookup_ticket_by_id
+from tickee.db.models.ticketorder import TicketOrder
+from tickee.tickets.manager import get_event_of_ticket, lookup_ticket_by_id
 from tickee.tickets.models import Ticket
+from tickee.tickets import changes
+from tickee.tickets.processing import allocate_ticket_ids, insert_tickets
+import datetime
 import logging
 import sqlahelper
 import tickee.exceptions as ex
@@ -20,32 +23,30 @@ tlogger = logging.getLogger('technical')
 
 @task
 def mail_ticket(ticket_id, fake=False):
-    """ Sends a ticket to the user. """   
+    """ Queues a mail containing the ticket to the user. """   
     try:
         ticket = lookup_ticket_by_id(ticket_id)
         event = get_event_of_ticket(ticket)
         order = ticket.ticket_order.order
         
-        env = Environment(loader=PackageLoader('tickee', 'templates'),
-                          extensions=['jinja2.ext.with_'])
-        body = env.get_template('mail_ticket.html')\
-                  .render(ticket=ticket, 
-                          account=order.account,
-                          event=event, 
-                          order=order, 
-                          as_guest=False)
+        body = render('mail_ticket.html',
+                      ticket=ticket, 
+                      account=order.account,
+                      event=event, 
+                      order=order, 
+                      as_guest=False)
         
-        body_plain = env.get_template('mail_ticket.txt')\
-                        .render(ticket=ticket, 
-                                account=order.account,
-                                event=event, 
-                                order=order, 
-                                as_guest=False)
+        body_plain = render('mail_ticket.txt',
+                            ticket=ticket, 
+                            account=order.account,
+                            event=event, 
+                            order=order, 
+                            as_guest=False)
         
-        # send generated mail
-        blogger.info('sending mail for ticket %s to user %s (%s)' % (ticket.id, 
-                                                                     ticket.user.id, 
-                                                                     ticket.user.email))
+        # queue generated mail
+        blogger.info('queueing mail for ticket %s to user %s (%s)' % (ticket.id, 
+                                                                      ticket.user.id, 
+                                                                      ticket.user.email))
         
         validate_email(ticket.user.email)
         
@@ -53,14 +54,14 @@ def mail_ticket(ticket_id, fake=False):
             raise ex.OrderError("user has no email.")
                
         if not fake:
-            send_email("Tickee Ticketing <tickets@tick.ee>", 
-                       ticket.user.email, 
-                       "Your ticket for '%s' is here!" % event.name, 
-                       body,
-                       body_plain)
+            queue_email("Tickee Ticketing <tickets@tick.ee>", 
+                        ticket.user.email, 
+                        "Your ticket for '%s' is here!" % event.name, 
+                        body,
+                        body_plain,
+                        object_name="ticket",
+                        object_id=ticket.id)
         
-        log_crm("ticket", ticket.id, dict(action="mailed",
-                                          addressee=ticket.user.email))
         transaction.commit()
         return True
         
@@ -81,33 +82,59 @@ def mail_ticket(ticket_id, fake=False):
 
 
 def create_tickets(order):
-    """Creates tickets for an order."""
+    """
+    Creates tickets for an order. All tickets are inserted at once, using a
+    single query to reserve their ids if the database supports it.
+    """
     if has_created_tickets(order):
         return # no need to create tickets
     
     if order.meta.get('users_allocate'):
-        multi_users = order.meta.get('users_allocate')
-        multi_users = multi_users.get('ids')
-        multi_users.insert(0, order.user_id)
+        multi_users = [order.user_id] + list(order.meta.get('users_allocate').get('ids'))
     else:
         multi_users = None
     
-    amount = 0
-    for ticketorder in order.get_ticketorders():
+    ticketorders = order.get_ticketorders()
+    created_at = datetime.datetime.utcnow()
+    rows = []
+    for ticketorder in ticketorders:
         for i in range(ticketorder.amount):
-            if multi_users and multi_users[amount] :
-                ticket = Ticket(ticketorder.id, multi_users[amount])
-            else :
-                ticket = Ticket(ticketorder.id, order.user_id)
-            ticketorder.tickets.append(ticket)
-            Session.flush()
-            blogger.info("created ticket %s, code %s." % (ticket.id, ticket.get_code()))
-            amount += 1
+            amount = len(rows)
+            if multi_users and amount < len(multi_users) and multi_users[amount]:
+                user_id = multi_users[amount]
+            else:
+                user_id = order.user_id
+            rows.append(dict(ticket_order_id=ticketorder.id,
+                             user_id=user_id,
+                             event_id=ticketorder.event_id,
+                             created_at=created_at))
     
+    ticket_ids = allocate_ticket_ids(len(rows)) if rows else None
+    if ticket_ids:
+        for row, ticket_id in zip(rows, ticket_ids):
+            row['id'] = ticket_id
+    Session.flush()
+    insert_tickets(rows)
+    # the tickets were inserted outside of the session
+    for ticketorder in ticketorders:
+        Session.expire(ticketorder, ['tickets'])
+    if ticket_ids:
+        created = [(row['id'], row['event_id']) for row in rows]
+    else:
+        created = Session.query(Ticket.id, Ticket.event_id).join(TicketOrder)\
+                         .filter(TicketOrder.order_id==order.id).order_by(Ticket.id).all()
+    changes.record_changes_per_event(created, changes.CREATED)
+    
+    if ticket_ids:
+        blogger.info("created %s tickets for order %s, codes %09X to %09X." \
+                     % (len(rows), order.id, ticket_ids[0], ticket_ids[-1]))
+    else:
+        blogger.info("created %s tickets for order %s." % (len(rows), order.id))
     log_crm("order", order.id, dict(action="created tickets",
-                                    amount=amount))
-    return amount
+                                    amount=len(rows)))
+    return len(rows)
 
 def has_created_tickets(order):
     """Checks if tickets have already been created"""
-    return len(tickets_from_order(order)) > 0
\ No newline at end of file
+    return Session.query(Ticket.id).join(TicketOrder)\
+                  .filter(TicketOrder.order_id==order.id).first() is not None
@@ -0,0 +1,82 @@
+from tickee.accounts.processing import create_account
+from tickee.core.currency.processing import create_currency
+from tickee.events.eventparts.processing import add_eventpart
+from tickee.events.processing import start_event
+from tickee.orders.processing import start_order, add_tickets
+from tickee.scanning.processing import scan_ticket
+from tickee.scanning.tasks import reset_scans
+from tickee.subscriptions.models import Subscription, FREE
+from tickee.tests import BaseTestCase
+from tickee.tickets import changes
+from tickee.tickets.manager import tickets_from_order
+from tickee.tickets.processing import delete_ticket
+from tickee.tickets.tasks import create_tickets
+from tickee.tickettypes.processing import create_tickettype, link_tickettype_to_event
+from tickee.users.processing import create_user
+import datetime
+import sqlahelper
+
+Session = sqlahelper.get_session()
+
+
+class TicketChangesTestCase(BaseTestCase):
+    
+    def setUp(self):
+        super(TicketChangesTestCase, self).setUp()
+        self.user = create_user("user@example.com")
+        create_currency("EUR", "Euro")
+        self.account = create_account("accountname", "email")
+        self.account.subscription = Subscription(FREE)
+        self.event = start_event(self.account.id, "event_name")
+        add_eventpart(self.event.id)
+        self.tickettype = create_tickettype(0, 100)
+        self.tickettype.is_active = True
+        link_tickettype_to_event(self.tickettype, self.event)
+        Session.flush()
+        
+    def order_tickets(self, amount):
+        order = start_order(self.user, self.account)
+        add_tickets(order, self.tickettype.id, amount)
+        Session.flush()
+        create_tickets(order)
+        return sorted(tickets_from_order(order), key=lambda t: t.id)
+    
+    def actions_since(self, sequence):
+        return [(change.sequence, change.ticket_id, change.action) 
+                for change in changes.poll_changes(self.event.id, sequence)]
+    
+    # record_changes
+    
+    def test_changes_of_tickets(self):
+        tickets = self.order_tickets(2)
+        self.assertEqual(changes.sequence_changes(self.event.id), 2)
+        scan_ticket(tickets[0].get_code(), datetime.datetime.utcnow(), dict())
+        delete_ticket(tickets[1])
+        self.assertEqual(self.actions_since(0),
+                         [(1, tickets[0].id, changes.CREATED),
+                          (2, tickets[1].id, changes.CREATED),
+                          (3, tickets[0].id, changes.SCANNED),
+                          (4, tickets[1].id, changes.DELETED)])
+        self.assertEqual(self.actions_since(3), [(4, tickets[1].id, changes.DELETED)])
+    
+    def test_reset_scans(self):
+        tickets = self.order_tickets(1)
+        scan_ticket(tickets[0].get_code(), datetime.datetime.utcnow(), dict())
+        reset_scans(event_id=self.event.id)
+        self.assertEqual(self.actions_since(2), [(3, tickets[0].id, changes.UNSCANNED)])
+    
+    def test_no_changes(self):
+        self.assertEqual(changes.sequence_changes(self.event.id), 0)
+        self.assertEqual(changes.poll_changes(self.event.id, 0), [])
+    
+    # sequence_changes
+    
+    def test_changes_numbered_when_polled(self):
+        tickets = self.order_tickets(2)
+        self.assertEqual(self.actions_since(0),
+                         [(1, tickets[0].id, changes.CREATED),
+                          (2, tickets[1].id, changes.CREATED)])
+        # a change committed after the last poll follows the numbered ones
+        changes.record_changes(self.event.id, [tickets[0].id], changes.UPDATED)
+        self.assertEqual(self.actions_since(2), [(3, tickets[0].id, changes.UPDATED)])
+        self.assertEqual(changes.sequence_changes(self.event.id), 3)
@@ -0,0 +1,72 @@
+from tickee.accounts.processing import create_account
+from tickee.core.currency.processing import create_currency
+from tickee.events.eventparts.processing import add_eventpart
+from tickee.events.processing import start_event
+from tickee.orders.processing import start_order, add_tickets
+from tickee.subscriptions.models import Subscription, FREE
+from tickee.tests import BaseTestCase
+from tickee.tickets.codes import sign_code, verify_code, get_code_key, compare_digest
+from tickee.tickets.manager import tickets_from_order, lookup_ticket_by_code
+from tickee.tickets.processing import code_to_id
+from tickee.tickets.tasks import create_tickets
+from tickee.tickettypes.processing import create_tickettype, link_tickettype_to_event
+from tickee.users.processing import create_user
+import sqlahelper
+
+Session = sqlahelper.get_session()
+
+
+class TicketCodesTestCase(BaseTestCase):
+    
+    def setUp(self):
+        super(TicketCodesTestCase, self).setUp()
+        self.user = create_user("user@example.com")
+        create_currency("EUR", "Euro")
+        self.account = create_account("accountname", "email")
+        self.account.subscription = Subscription(FREE)
+        self.event = start_event(self.account.id, "event_name")
+        add_eventpart(self.event.id)
+        self.tickettype = create_tickettype(0, 100)
+        self.tickettype.is_active = True
+        link_tickettype_to_event(self.tickettype, self.event)
+        order = start_order(self.user, self.account)
+        add_tickets(order, self.tickettype.id, 1)
+        Session.flush()
+        create_tickets(order)
+        self.ticket = tickets_from_order(order)[0]
+    
+    # sign_code
+    
+    def test_verify_signed_code(self):
+        code = self.ticket.get_signed_code()
+        self.assertEqual(verify_code(code, self.event.code_key),
+                         (self.ticket.id, self.event.id, self.tickettype.id))
+        self.assertEqual(get_code_key(self.event.id), self.event.code_key)
+    
+    def test_forged_code(self):
+        forged = sign_code(self.ticket.id, self.event.id, self.tickettype.id, "00" * 16)
+        self.assertRaises(ValueError, verify_code, forged, self.event.code_key)
+        self.assertRaises(ValueError, code_to_id, forged)
+    
+    def test_compare_digest(self):
+        self.assertTrue(compare_digest("abc", "abc"))
+        self.assertFalse(compare_digest("abc", "abd"))
+        self.assertFalse(compare_digest("abc", "ab"))
+    
+    # code_to_id
+    
+    def test_code_of_event_without_key(self):
+        event = start_event(self.account.id, "event_name2")
+        event.code_key = None
+        Session.flush()
+        forged = sign_code(self.ticket.id, event.id, self.tickettype.id, "00" * 16)
+        self.assertRaises(ValueError, code_to_id, forged)
+        Session.refresh(event)
+        self.assertEqual(event.code_key, None)
+        unknown = sign_code(self.ticket.id, event.id + 1000, self.tickettype.id, "00" * 16)
+        self.assertRaises(ValueError, code_to_id, unknown)
+    
+    def test_both_codes_accepted(self):
+        self.assertEqual(code_to_id(self.ticket.get_code()), self.ticket.id)
+        self.assertEqual(code_to_id(self.ticket.get_signed_code()), self.ticket.id)
+        self.assertEqual(lookup_ticket_by_code(self.ticket.get_signed_code()), self.ticket)
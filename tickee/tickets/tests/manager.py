@@ -1,9 +1,20 @@
 
+from tickee.accounts.processing import create_account
+from tickee.core.currency.processing import create_currency
 from tickee.db.models.order import Order
 from tickee.db.models.ticketorder import TicketOrder
+from tickee.events.eventparts.processing import add_eventpart
+from tickee.events.processing import start_event
+from tickee.orders.processing import start_order, add_tickets
+from tickee.scanning.models import TicketScan
+from tickee.subscriptions.models import Subscription, FREE
 from tickee.tests import BaseTestCase
-from tickee.tickets.manager import tickets_from_order
+from tickee.tickets.manager import tickets_from_order, list_tickets, query_attendees
+from tickee.tickets.marshalling import ticket_to_dict, tickets_to_dicts, attendee_to_dict
+from tickee.tickets.models import Ticket
 from tickee.tickets.tasks import create_tickets
+from tickee.tickettypes.processing import create_tickettype, link_tickettype_to_event
+from tickee.users.processing import create_user
 import sqlahelper
 
 Session = sqlahelper.get_session()
@@ -33,4 +44,90 @@ class TicketManagerTestCase(BaseTestCase):
     def test_created_double_tickets_from_order(self):
         create_tickets(self.order)
         self.assertEqual(len(tickets_from_order(self.order)),
-                         5)
\ No newline at end of file
+                         5)
+
+
+class EventTicketsTestCase(BaseTestCase):
+    
+    def setUp(self):
+        super(EventTicketsTestCase, self).setUp()
+        self.user = create_user("user@example.com")
+        create_currency("EUR", "Euro")
+        self.account = create_account("accountname", "email")
+        self.account.subscription = Subscription(FREE)
+        self.event = start_event(self.account.id, "event_name")
+        self.eventpart = add_eventpart(self.event.id)
+        self.event2 = start_event(self.account.id, "event_name2")
+        self.eventpart2 = add_eventpart(self.event2.id)
+        self.tickettype = create_tickettype(0, 100)
+        self.tickettype.is_active = True
+        link_tickettype_to_event(self.tickettype, self.event)
+        self.tickettype2 = create_tickettype(0, 100)
+        self.tickettype2.is_active = True
+        link_tickettype_to_event(self.tickettype2, self.event2)
+        
+    def order_tickets(self, tickettype, amount, user=None):
+        order = start_order(user or self.user, self.account)
+        add_tickets(order, tickettype.id, amount)
+        Session.flush()
+        create_tickets(order)
+        return order
+    
+    # event_id
+    
+    def test_event_of_ordered_tickets(self):
+        order = self.order_tickets(self.tickettype, 2)
+        self.assertEqual([to.event_id for to in order.get_ticketorders()], [self.event.id])
+        self.assertEqual([t.event_id for t in tickets_from_order(order)], [self.event.id] * 2)
+    
+    # list_tickets
+    
+    def test_list_tickets_of_event(self):
+        self.order_tickets(self.tickettype, 2)
+        self.order_tickets(self.tickettype2, 3, create_user("other@example.com"))
+        self.assertEqual(len(list_tickets(self.event.id)), 2)
+        self.assertEqual(len(list_tickets(self.event2.id)), 3)
+        self.assertEqual(len(list_tickets(self.event.id, eventpart_id=self.eventpart.id)), 2)
+        self.assertEqual(len(list_tickets(self.event2.id, tickettype_id=self.tickettype2.id,
+                                          eventpart_id=self.eventpart2.id)), 3)
+    
+    # query_attendees
+    
+    def test_attendees(self):
+        order = self.order_tickets(self.tickettype, 2)
+        self.order_tickets(self.tickettype2, 1)
+        tickets = sorted(tickets_from_order(order), key=lambda t: t.id)
+        scan = TicketScan()
+        scan.ticket_id = tickets[0].id
+        Session.add(scan)
+        Session.flush()
+        attendees = query_attendees(self.event.id).order_by(Ticket.id).all()
+        self.assertEqual([attendee.scanned for attendee in attendees], [True, False])
+        for ticket, attendee in zip(tickets, attendees):
+            expected = ticket_to_dict(ticket, include_scanned=True, include_event=False)
+            expected['event_id'] = self.event.id
+            self.assertEqual(attendee_to_dict(attendee), expected)
+    
+    # tickets_to_dicts
+    
+    def test_tickets_to_dicts(self):
+        order = self.order_tickets(self.tickettype, 2)
+        order2 = self.order_tickets(self.tickettype2, 1)
+        tickets = tickets_from_order(order) + tickets_from_order(order2)
+        options = dict(include_scanned=True, include_user=True, include_event=True,
+                       include_tickettype=True, include_venues=True)
+        expected = [ticket_to_dict(ticket, **options) for ticket in tickets]
+        self.assertEqual(tickets_to_dicts(tickets, **options), expected)
+    
+    # link_tickettype_to_event
+    
+    def test_relinked_tickettype(self):
+        order = self.order_tickets(self.tickettype, 2)
+        for assoc in list(self.tickettype.assocs):
+            Session.delete(assoc)
+        Session.flush()
+        Session.expire(self.tickettype, ['assocs'])
+        link_tickettype_to_event(self.tickettype, self.event2)
+        self.assertEqual([t.event_id for t in tickets_from_order(order)], [self.event2.id] * 2)
+        self.assertEqual(len(list_tickets(self.event.id)), 0)
+        self.assertEqual(len(list_tickets(self.event2.id)), 2)
@@ -8,7 +8,7 @@ from tickee.orders.processing import start_order, add_tickets
 from tickee.subscriptions.models import Subscription, FREE
 from tickee.tests import BaseTestCase
 from tickee.tickets.manager import tickets_from_order
-from tickee.tickets.tasks import create_tickets, mail_ticket
+from tickee.tickets.tasks import create_tickets, mail_ticket, has_created_tickets
 from tickee.tickettypes.processing import create_tickettype, link_tickettype_to_event
 from tickee.users.processing import create_user
 import sqlahelper
@@ -43,8 +43,20 @@ class TaskTestCase(BaseTestCase):
         self.assertEqual(len(tickets_from_order(self.order)),
                          5)
     
+    def test_created_tickets_for_allocated_users(self):
+        self.order.user_id = 1
+        self.order.meta['users_allocate'] = dict(ids=[2, None, 4])
+        create_tickets(self.order)
+        self.assertEqual(sorted(ticket.user_id for ticket in tickets_from_order(self.order)),
+                         [1, 1, 1, 2, 4])
+        self.assertEqual(self.order.meta['users_allocate'], dict(ids=[2, None, 4]))
+    
     # has_created_ticket
     
+    def test_has_created_tickets(self):
+        self.assertFalse(has_created_tickets(self.order))
+        create_tickets(self.order)
+        self.assertTrue(has_created_tickets(self.order))
     
     
 class TicketMailingTestCase(BaseTestCase):
@@ -0,0 +1,105 @@
+"""
+Availability Recomputation
+==========================
+
+    Every change to the orders of a tickettype may change its availability
+    (AVAILABLE, CLAIMED or SOLD). Instead of recomputing the availability
+    for every change, ``tickee.tickettypes.tasks.request_availability_update``
+    appends an ``AvailabilityRequest`` and, once the transaction commits,
+    schedules a flush at most once per ``AVAILABILITY_FLUSH_WINDOW`` seconds
+    per process.
+
+    A flush collapses all pending requests per tickettype and recomputes the
+    availability of every requested tickettype using a single grouped query
+    over the inventory counters. Each flush reports the amount of requests
+    and how many of them were collapsed on the technical log.
+"""
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql.expression import func
+from sqlalchemy.sql.functions import coalesce
+from tickee.core.db import execute
+from tickee.db.models.tickettype import TicketType, next_availability
+from tickee.tickettypes import inventory
+from tickee.tickettypes.defaults import AVAILABILITY_FLUSH_LIMIT
+from tickee.tickettypes.models import AvailabilityRequest, TicketTypeInventory
+import logging
+import sqlahelper
+
+Session = sqlahelper.get_session()
+
+blogger = logging.getLogger('blm.tickettypes')
+tlogger = logging.getLogger('technical')
+
+requests = AvailabilityRequest.__table__
+tickettypes = TicketType.__table__
+
+
+def flush(limit=AVAILABILITY_FLUSH_LIMIT):
+    """
+    Recomputes the availability of the tickettypes with pending requests.
+
+    Returns:
+        A tuple containing the amount of handled requests and the amount of
+        tickettypes that were recomputed.
+    """
+    Session.flush()
+    last_id = Session.query(func.max(AvailabilityRequest.id)).scalar()
+    if last_id is None:
+        return 0, 0
+    pending = Session.query(AvailabilityRequest.tickettype_id, func.count(AvailabilityRequest.id))\
+                     .filter(AvailabilityRequest.id <= last_id)\
+                     .group_by(AvailabilityRequest.tickettype_id)\
+                     .order_by(AvailabilityRequest.tickettype_id)\
+                     .limit(limit).all()
+    tickettype_ids = [tickettype_id for tickettype_id, count in pending]
+    execute(requests.delete().where(requests.c.id <= last_id)\
+                             .where(requests.c.tickettype_id.in_(tickettype_ids)))
+    changes = recompute(tickettype_ids)
+    total = sum(count for tickettype_id, count in pending)
+    tlogger.info("availability flush: %s requests for %s tickettypes (%s collapsed), %s changed"\
+                 % (total, len(tickettype_ids), total - len(tickettype_ids), len(changes)))
+    return total, len(tickettype_ids)
+
+
+def recompute(tickettype_ids):
+    """
+    Recomputes the availability of the tickettypes and returns a dictionary
+    containing the new availability of the tickettypes that changed.
+    """
+    if not tickettype_ids:
+        return dict()
+    counts = Session.query(TicketType.id, TicketType.units, TicketType.availability,
+                           func.count(TicketTypeInventory.shard),
+                           coalesce(func.sum(TicketTypeInventory.held), 0),
+                           coalesce(func.sum(TicketTypeInventory.purchased), 0))\
+                    .outerjoin(TicketTypeInventory,
+                               TicketTypeInventory.tickettype_id==TicketType.id)\
+                    .filter(TicketType.id.in_(tickettype_ids))\
+                    .group_by(TicketType.id, TicketType.units, TicketType.availability).all()
+    changes = dict()
+    for tickettype_id, units, availability, shards, held, purchased in counts:
+        if not shards:
+            # counters of the tickettype do not exist yet
+            tickettype = Session.query(TicketType).get(tickettype_id)
+            held, purchased = inventory.get_counts(tickettype)
+        new_availability = next_availability(availability, units, int(held), int(purchased))
+        if new_availability != availability:
+            blogger.info("tickettype %s is now %s.", tickettype_id, new_availability.upper())
+            changes[tickettype_id] = new_availability
+    # update the tickettypes per availability
+    for availability in set(changes.values()):
+        changed_ids = [changed_id for changed_id, changed_availability in changes.iteritems()
+                       if changed_availability == availability]
+        execute(tickettypes.update().where(tickettypes.c.id.in_(changed_ids))\
+                                    .values(availability=availability))
+    _refresh_loaded_tickettypes(changes)
+    return changes
+
+
+# -- Internal -----------------------------------------------------------------
+
+def _refresh_loaded_tickettypes(changes):
+    """ Sets the availability of changed tickettypes loaded in the session. """
+    for obj in Session.identity_map.values():
+        if isinstance(obj, TicketType) and obj.id in changes:
+            set_committed_value(obj, 'availability', changes[obj.id])
@@ -4,4 +4,13 @@ TICKETTYPE_AMOUNT = 100
 TICKETTYPE_CURRENCY = "EUR"
 TICKETTYPE_HANDLING_FEE = 50 # cents
 TICKETTYPE_MIN_ORDER = 1
-TICKETTYPE_MAX_ORDER = 10
\ No newline at end of file
+TICKETTYPE_MAX_ORDER = 10
+
+# sharded inventories count all shards exactly once a shard would keep fewer
+# units to spare than this threshold.
+INVENTORY_EXACT_THRESHOLD = 10
+
+# availability recomputations requested within this amount of seconds are
+# collapsed into a single flush.
+AVAILABILITY_FLUSH_WINDOW = 2
+AVAILABILITY_FLUSH_LIMIT = 1000
@@ -6,9 +6,9 @@ from tickee.events.permissions import require_event_owner, \
     require_eventpart_owner
 from tickee.orders.manager import has_orders_for_tickettype
 from tickee.tickets.permissions import require_tickettype_owner
-from tickee.tickettypes import defaults
+from tickee.tickettypes import defaults, inventory
 from tickee.tickettypes.manager import lookup_tickettype_by_id
-from tickee.tickettypes.marshalling import tickettype_to_dict, \
+from tickee.tickettypes.marshalling import tickettypes_to_dicts, \
     tickettype_to_dict2
 from tickee.tickettypes.processing import create_tickettype, \
     link_tickettype_to_eventpart, link_tickettype_to_event, delete_tickettype
@@ -27,8 +27,8 @@ def from_event(client_id, event_id, include_private=False):
     tickettypes = event.get_ticket_types(include_inactive=include_private,
                                          include_if_sales_finished=include_private)
     
-    return map(lambda tt: tickettype_to_dict(tt, include_availability=True), 
-               sorted(tickettypes, key=lambda tt: tt.id))
+    return tickettypes_to_dicts(sorted(tickettypes, key=lambda tt: tt.id),
+                                include_availability=True)
 
 
 @task(name="tickettypes.from_eventpart")
@@ -41,7 +41,7 @@ def from_eventpart(client_id, eventpart_id, include_private=False):
     
     tickettypes = eventpart.get_ticket_types(include_inactive=include_private,
                                              include_if_sales_finished=include_private)
-    return map(lambda tt: tickettype_to_dict(tt, include_availability=True), tickettypes)
+    return tickettypes_to_dicts(tickettypes, include_availability=True)
 
 
 
@@ -77,6 +77,7 @@ def tickettype_update(client_id, tickettype_id, tickettype_info):
             tickettype.price = value
         elif key == "units":
             tickettype.units = value
+            inventory.rebalance(tickettype)
         elif key == "handling_fee":
             tickettype.handling_fee = value
         elif key == "description":
@@ -107,7 +108,7 @@ def tickettype_delete(client_id, tickettype_id):
     """ Deletes a tickettype ONLY IF no tickets have been purchased from it """
     tickettype = lookup_tickettype_by_id(tickettype_id)
     # remove ticket type
-    delete_tickettype(tickettype)
+    return delete_tickettype(tickettype)
 
 
 @task(name="tickettypes.create")
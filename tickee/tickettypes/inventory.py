@@ -0,0 +1,290 @@
+"""
+Inventory Ledger
+================
+
+    Every ``TicketType`` keeps ``TicketTypeInventory`` rows counting the
+    units that are held by started orders and the units that were sold to
+    purchased orders. Timed out and cancelled orders do not count.
+
+    The counters are changed with single conditional ``UPDATE`` statements,
+    so reserving units is atomic and never exceeds the units of the
+    tickettype, while reading the availability is a primary key lookup
+    instead of a ``SUM`` over all ticketorders.
+
+    The ledger has to be informed *before* a change to an order or
+    ticketorder is applied: if the row of a tickettype does not exist yet it
+    is rebuilt from its ticketorders, after which the change is applied on
+    top of it.
+
+Sharded counters
+----------------
+
+    All reservations of a tickettype update the same row, which serializes
+    them during an on-sale rush. A hot tickettype can therefore be split into
+    several shards using ``shard``. The units are divided over the shards as
+    capacity and a reservation updates a randomly picked shard, as long as
+    that shard keeps at least ``INVENTORY_EXACT_THRESHOLD`` units to spare.
+
+    Otherwise the reservation takes the exact path: all shards of the
+    tickettype are locked, the remaining units are counted and capacity is
+    moved between shards to make room. Since no shard ever claims more than
+    its capacity and the capacities add up to the units of the tickettype,
+    the tickettype is never oversold.
+"""
+from sqlalchemy.sql.expression import func, and_, or_
+from sqlalchemy.sql.functions import coalesce
+from tickee.core.db import execute
+from tickee.orders.states import STARTED, PURCHASED
+from tickee.tickettypes.defaults import INVENTORY_EXACT_THRESHOLD
+from tickee.tickettypes.models import TicketTypeInventory
+import logging
+import random
+import sqlahelper
+
+Session = sqlahelper.get_session()
+
+blogger = logging.getLogger('blm.tickettypes')
+
+inventory = TicketTypeInventory.__table__
+
+# column counting the units of orders in a given state
+COUNTERS = {STARTED: 'held',
+            PURCHASED: 'purchased'}
+
+# amount of shards per tickettype as last seen by this process
+_shard_counts = dict()
+
+
+def get_counts(tickettype):
+    """ Returns a tuple containing the amount of held and purchased units. """
+    shards, held, purchased = Session.query(func.count(TicketTypeInventory.shard),
+                                            coalesce(func.sum(TicketTypeInventory.held), 0),
+                                            coalesce(func.sum(TicketTypeInventory.purchased), 0))\
+                                     .filter(TicketTypeInventory.tickettype_id==tickettype.id).one()
+    if not shards:
+        return rebuild(tickettype)
+    _shard_counts[tickettype.id] = shards
+    return int(held), int(purchased)
+
+
+def reserve(tickettype, amount, status=STARTED, force=False):
+    """
+    Claims an amount of units for an order in a given state. Returns ``True``
+    if the units were claimed. Unless forced, units are only claimed if the
+    tickettype still has enough available.
+    """
+    column = COUNTERS.get(status)
+    # orders that are not started or purchased do not claim units.
+    if column is None:
+        return force or tickettype.amount_available_tickets() >= amount
+    if force:
+        _increment(tickettype, {column: amount})
+        return True
+    # fast path: claim the units on a single shard
+    claimed = inventory.c.held + inventory.c.purchased + amount
+    statement = _update_shard(tickettype, _pick_shard(tickettype), {column: amount})\
+                    .where(or_(and_(inventory.c.capacity==None,
+                                    claimed <= tickettype.units),
+                               claimed + INVENTORY_EXACT_THRESHOLD <= inventory.c.capacity))
+    if execute(statement).rowcount:
+        return True
+    # slow path: count all shards
+    return _reserve_exact(tickettype, column, amount)
+
+
+def release(tickettype, amount, status=STARTED, applied=False):
+    """
+    Gives back an amount of units claimed by an order in a given state. Set
+    ``applied`` if the orders were already changed, so missing counters are
+    rebuilt without withdrawing the units a second time.
+    """
+    column = COUNTERS.get(status)
+    if column is not None:
+        _withdraw(tickettype, column, amount, applied=applied)
+
+
+def transfer(tickettype, amount, from_status, to_status):
+    """ Moves an amount of units when an order changes state. """
+    from_column = COUNTERS.get(from_status)
+    to_column = COUNTERS.get(to_status)
+    if from_column == to_column or not amount:
+        return
+    elif from_column is None:
+        _increment(tickettype, {to_column: amount})
+    else:
+        _withdraw(tickettype, from_column, amount, to_column)
+
+
+def rebuild(tickettype, shards=None):
+    """
+    Recalculates the counters of the tickettype from its ticketorders and
+    returns a tuple containing the amount of held and purchased units. The
+    amount of shards is kept unless specified.
+    """
+    held, purchased = tickettype.count_ordered_units()
+    if shards is None:
+        shards = len(_lock_shards(tickettype)) or 1
+    _layout(tickettype, held, purchased, shards)
+    blogger.debug("rebuilt inventory of tickettype %s: %s held, %s purchased",
+                  tickettype.id, held, purchased)
+    return held, purchased
+
+
+def shard(tickettype, shards):
+    """ Divides the counters of the tickettype over an amount of shards. """
+    if shards < 1:
+        raise ValueError("a tickettype needs at least one inventory shard")
+    rows = _lock_shards(tickettype)
+    if not rows:
+        return rebuild(tickettype, shards)
+    held = sum(row.held for row in rows)
+    purchased = sum(row.purchased for row in rows)
+    _layout(tickettype, held, purchased, shards)
+    blogger.info("divided inventory of tickettype %s over %s shards", tickettype.id, shards)
+    return held, purchased
+
+
+def rebalance(tickettype):
+    """ Divides the units of a sharded tickettype over its shards again, e.g.
+    after the units were changed. """
+    rows = _lock_shards(tickettype)
+    if len(rows) > 1:
+        shard(tickettype, len(rows))
+
+
+def remove(tickettype):
+    """ Removes the counters of the tickettype. """
+    execute(inventory.delete().where(inventory.c.tickettype_id==tickettype.id))
+    _shard_counts.pop(tickettype.id, None)
+
+
+# -- Internal -----------------------------------------------------------------
+
+def _pick_shard(tickettype):
+    """ Returns a random shard of the tickettype. """
+    return random.randrange(_shard_counts.get(tickettype.id, 1))
+
+
+def _update_shard(tickettype, shard, changes):
+    """ Returns an update statement applying the changes to a shard. """
+    return inventory.update()\
+                    .where(inventory.c.tickettype_id==tickettype.id)\
+                    .where(inventory.c.shard==shard)\
+                    .values(dict((column, inventory.c[column] + delta)
+                                 for column, delta in changes.iteritems()))
+
+
+def _lock_shards(tickettype):
+    """ Locks and returns all shards of the tickettype. """
+    rows = Session.query(TicketTypeInventory.shard,
+                         TicketTypeInventory.held,
+                         TicketTypeInventory.purchased,
+                         TicketTypeInventory.capacity)\
+                  .filter(TicketTypeInventory.tickettype_id==tickettype.id)\
+                  .order_by(TicketTypeInventory.shard)\
+                  .with_lockmode('update').all()
+    if rows:
+        _shard_counts[tickettype.id] = len(rows)
+    return rows
+
+
+def _increment(tickettype, changes):
+    """ Applies the changes to a random shard without checking availability. """
+    if not execute(_update_shard(tickettype, _pick_shard(tickettype), changes)).rowcount:
+        # the shards of the tickettype changed or do not exist yet.
+        if not _lock_shards(tickettype):
+            rebuild(tickettype)
+        execute(_update_shard(tickettype, 0, changes))
+
+
+def _withdraw(tickettype, column, amount, to_column=None, applied=False):
+    """ Removes an amount of units from a counter, optionally adding them to
+    another counter of the same shard. """
+    changes = {column: -amount}
+    if to_column is not None:
+        changes[to_column] = amount
+    # fast path: a single shard contains all units
+    statement = _update_shard(tickettype, _pick_shard(tickettype), changes)\
+                    .where(inventory.c[column] >= amount)
+    if execute(statement).rowcount:
+        return
+    # slow path: spread the withdrawal over the shards
+    rows = _lock_shards(tickettype)
+    if not rows:
+        rebuild(tickettype)
+        if applied:
+            return
+        rows = _lock_shards(tickettype)
+    remaining = amount
+    for row in sorted(rows, key=lambda row: getattr(row, column), reverse=True):
+        taken = min(getattr(row, column), remaining)
+        if taken <= 0:
+            break
+        changes = {column: -taken}
+        if to_column is not None:
+            changes[to_column] = taken
+        execute(_update_shard(tickettype, row.shard, changes))
+        remaining -= taken
+    if remaining > 0:
+        blogger.error("inventory of tickettype %s is missing %s %s units, reconciliation required" \
+                      % (tickettype.id, remaining, column))
+        if to_column is not None:
+            execute(_update_shard(tickettype, rows[0].shard, {to_column: remaining}))
+
+
+def _reserve_exact(tickettype, column, amount):
+    """ Claims units after locking and counting all shards of the tickettype. """
+    rows = _lock_shards(tickettype)
+    if not rows:
+        rebuild(tickettype)
+        rows = _lock_shards(tickettype)
+    used = sum(row.held + row.purchased for row in rows)
+    if tickettype.units - used < amount:
+        return False
+    # unsharded tickettypes are limited by the units of the tickettype
+    if len(rows) == 1 and rows[0].capacity is None:
+        execute(_update_shard(tickettype, rows[0].shard, {column: amount}))
+        return True
+    # make room on the shard with the most spare capacity
+    spare = dict((row.shard, row.capacity - row.held - row.purchased) for row in rows)
+    target = max(spare, key=spare.get)
+    missing = amount - spare[target]
+    for row in sorted(rows, key=lambda row: spare[row.shard], reverse=True):
+        if missing <= 0 or spare[row.shard] <= 0:
+            break
+        if row.shard == target:
+            continue
+        moved = min(spare[row.shard], missing)
+        execute(_update_shard(tickettype, row.shard, {'capacity': -moved}))
+        execute(_update_shard(tickettype, target, {'capacity': moved}))
+        missing -= moved
+    execute(_update_shard(tickettype, target, {column: amount}))
+    blogger.debug("claimed %s units of tickettype %s on shard %s using the exact path",
+                  amount, tickettype.id, target)
+    return True
+
+
+def _layout(tickettype, held, purchased, shards):
+    """ Replaces the counters of the tickettype by an amount of shards. The
+    first shard receives all claimed units and the units that are still
+    available are divided over the shards as capacity. """
+    execute(inventory.delete().where(inventory.c.tickettype_id==tickettype.id))
+    if shards == 1:
+        spares = [None]
+    else:
+        available = tickettype.units - held - purchased
+        if available < 0:
+            spares = [available] + [0] * (shards - 1)
+        else:
+            spares = [available / shards + (1 if i < available % shards else 0)
+                      for i in range(shards)]
+    rows = list()
+    for i, spare in enumerate(spares):
+        row = dict(tickettype_id=tickettype.id, shard=i, held=0, purchased=0, capacity=None)
+        if i == 0:
+            row.update(held=held, purchased=purchased)
+        if spare is not None:
+            row['capacity'] = row['held'] + row['purchased'] + spare
+        rows.append(row)
+    execute(inventory.insert(), rows)
+    _shard_counts[tickettype.id] = shards
@@ -1,13 +1,19 @@
+from tickee.core import l10n
+from tickee.core.marshalling import Memo, prime_descriptions
+
+
 def tickettype_to_dict(tickettype, 
-                       include_availability=False):
+                       include_availability=False,
+                       memo=None):
     """
     Transform a ``TicketType`` object into a dictionary.
     """
+    memo = memo or Memo()
     result = dict(id=tickettype.id,
                   name=tickettype.name,
-                  description=tickettype.get_description(),
+                  description=memo(l10n.get_translation, tickettype.description_ref, 'en'),
                   price=tickettype.price / 100.00,
-                  handling_fee=tickettype.get_handling_fee() / 100.00,
+                  handling_fee=memo(tickettype.get_handling_fee) / 100.00,
                   active=tickettype.is_active,
                   currency=tickettype.currency_id)
     if include_availability:
@@ -15,6 +21,18 @@ def tickettype_to_dict(tickettype,
     return result
 
 
+def tickettypes_to_dicts(tickettypes, include_availability=False, memo=None):
+    """
+    Transforms a list of ``TicketType`` objects like ``tickettype_to_dict``,
+    looking up their descriptions in a single query.
+    """
+    memo = memo or Memo()
+    tickettypes = list(tickettypes)
+    prime_descriptions(memo, tickettypes)
+    return [tickettype_to_dict(tickettype, include_availability, memo)
+            for tickettype in tickettypes]
+
+
 
 def tickettype_to_dict2(tickettype, short=False):
     result = dict(id=tickettype.id,
@@ -0,0 +1,67 @@
+from sqlalchemy.schema import Column, ForeignKey
+from sqlalchemy.types import Integer, DateTime
+import datetime
+import sqlahelper
+
+Base = sqlahelper.get_base()
+
+
+class TicketTypeInventory(Base):
+    """
+    Running count of the units of a ``TicketType`` that are held by started
+    orders or sold to purchased orders. The counter is maintained by
+    ``tickee.tickettypes.inventory`` so the availability of a tickettype can
+    be read without aggregating all of its ``TicketOrder``s.
+
+    A tickettype normally has a single row without a capacity, limited by the
+    units of the tickettype. Tickettypes under heavy load can be split into
+    several shards, each row then receives a part of the units as capacity.
+    """
+
+    __tablename__ = 'tickee_tickettype_inventory'
+
+    # Columns
+
+    tickettype_id = Column(Integer, ForeignKey('tickee_tickettypes.id'), primary_key=True)
+    shard = Column(Integer, primary_key=True, autoincrement=False, default=0)
+    held = Column(Integer, nullable=False, default=0)
+    purchased = Column(Integer, nullable=False, default=0)
+    capacity = Column(Integer)
+
+    # Constructor
+
+    def __init__(self, tickettype_id, shard=0, held=0, purchased=0, capacity=None):
+        self.tickettype_id = tickettype_id
+        self.shard = shard
+        self.held = held
+        self.purchased = purchased
+        self.capacity = capacity
+
+    def __repr__(self):
+        return "<TicketTypeInventory: TicketType %s shard %s (%s held, %s purchased)>"\
+               % (self.tickettype_id, self.shard, self.held, self.purchased)
+
+
+class AvailabilityRequest(Base):
+    """
+    Pending request to recompute the availability of a ``TicketType``.
+    Requests are only appended, ``tickee.tickettypes.availability`` collapses
+    all requests of a tickettype into a single recomputation.
+    """
+
+    __tablename__ = 'tickee_tickettype_availability_requests'
+
+    # Columns
+
+    id = Column(Integer, primary_key=True)
+    tickettype_id = Column(Integer, ForeignKey('tickee_tickettypes.id'), index=True)
+    requested_at = Column(DateTime)
+
+    # Constructor
+
+    def __init__(self, tickettype_id):
+        self.tickettype_id = tickettype_id
+        self.requested_at = datetime.datetime.utcnow()
+
+    def __repr__(self):
+        return "<AvailabilityRequest %s: TicketType %s>" % (self.id, self.tickettype_id)
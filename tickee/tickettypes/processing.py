@@ -1,7 +1,14 @@
+from sqlalchemy.sql.expression import select, or_
 from tickee.core.currency.manager import lookup_currency_by_iso_code
+from tickee.core.db import execute, forget_deleted
+from tickee.db.models.ticketorder import TicketOrder
 from tickee.db.models.tickettype import TicketType, \
     TicketTypeEventPartAssociation
 from tickee.orders.manager import has_orders_for_tickettype
+from tickee.tickettypes import inventory
+from tickee.tickettypes.models import AvailabilityRequest
+from tickee.tickets.models import Ticket
+from tickee.tickettypes.manager import lookup_tickettype_by_id
 import logging
 import sqlahelper
 import tickee.exceptions as ex
@@ -10,19 +17,47 @@ Session = sqlahelper.get_session()
 
 blogger = logging.getLogger('blm.tickettypes')
 
+assocs = TicketTypeEventPartAssociation.__table__
+requests = AvailabilityRequest.__table__
+
 
 def delete_tickettype(tickettype):
     """ Handles deletion of a tickettype by removing the associations to eventparts and
-    finally deletes the tickettype itself. """
+    finally deletes the tickettype itself.
+    
+    Returns:
+        A dictionary with the amount of removed ``tickettypes`` and their
+        eventpart ``associations``.
+    """
     # fail if orders for ticket type exist
     if has_orders_for_tickettype(tickettype):
         raise ex.TickeeError("Tickettypes with orders connected to it can't be deleted. Try deactivating it instead.")
-    # delete all connections of tickettype to eventpart
-    for assoc in tickettype.assocs:
-        Session.delete(assoc)
-    # delete tickettype
-    blogger.debug('delete tickettype %s' % tickettype.id)
-    Session.delete(tickettype)
+    return delete_tickettypes([tickettype])
+
+
+def delete_tickettypes(tickettypes):
+    """ Removes tickettypes without orders together with their associations to
+    eventparts, inventory counters and availability requests, with a single
+    statement per table. """
+    tickettype_ids = [tickettype.id for tickettype in tickettypes]
+    if not tickettype_ids:
+        return dict(tickettypes=0, associations=0)
+    Session.flush()
+    # delete all connections of tickettypes to eventparts
+    result = execute(assocs.delete().where(assocs.c.tickettype_id.in_(tickettype_ids)))
+    counts = dict(associations=result.rowcount)
+    execute(requests.delete().where(requests.c.tickettype_id.in_(tickettype_ids)))
+    # delete inventory counters
+    for tickettype in tickettypes:
+        inventory.remove(tickettype)
+    forget_deleted(TicketTypeEventPartAssociation, 'tickettype_id', tickettype_ids)
+    forget_deleted(AvailabilityRequest, 'tickettype_id', tickettype_ids)
+    # delete tickettypes
+    result = execute(TicketType.__table__.delete().where(TicketType.__table__.c.id.in_(tickettype_ids)))
+    counts['tickettypes'] = result.rowcount
+    forget_deleted(TicketType, 'id', tickettype_ids)
+    blogger.debug('deleted tickettypes %s' % tickettype_ids)
+    return counts
 
 
 def create_tickettype(price, units, currency="EUR",
@@ -55,6 +90,7 @@ def create_tickettype(price, units, currency="EUR",
     ticket_type.sales_end = sales_end
     Session.add(ticket_type)
     Session.flush()
+    inventory.rebuild(ticket_type)
     return ticket_type
 
 def link_tickettype_to_eventpart(tickettype, eventpart):
@@ -64,8 +100,61 @@ def link_tickettype_to_eventpart(tickettype, eventpart):
     assoc.tickettype = tickettype
     assoc.eventpart_id = eventpart.id
     eventpart.tickettypes.append(assoc)
+    # keep the event of already ordered tickets consistent
+    if has_orders_for_tickettype(tickettype):
+        update_event_of_tickettype(tickettype.id, eventpart.event_id)
     
 def link_tickettype_to_event(tickettype, event):
     """Links a tickettype to all eventparts of an event"""
     for eventpart in event.parts:
-        link_tickettype_to_eventpart(tickettype, eventpart)
\ No newline at end of file
+        link_tickettype_to_eventpart(tickettype, eventpart)
+
+def update_event_of_tickettype(tickettype_id, event_id):
+    """Stores the event of a tickettype on its ticketorders and their tickets.
+    Returns the amount of updated tickets."""
+    ticketorders = TicketOrder.__table__
+    tickets = Ticket.__table__
+    Session.flush()
+    execute(ticketorders.update().where(ticketorders.c.ticket_type_id==tickettype_id)\
+                                 .where(or_(ticketorders.c.event_id==None,
+                                            ticketorders.c.event_id!=event_id))\
+                                 .values(event_id=event_id))
+    ticketorder_ids = select([ticketorders.c.id]).where(ticketorders.c.ticket_type_id==tickettype_id)
+    result = execute(tickets.update().where(tickets.c.ticket_order_id.in_(ticketorder_ids))\
+                                     .where(or_(tickets.c.event_id==None,
+                                                tickets.c.event_id!=event_id))\
+                                     .values(event_id=event_id))
+    # the rows were updated outside of the session
+    for instance in Session.identity_map.values():
+        if isinstance(instance, (TicketOrder, Ticket)):
+            Session.expire(instance, ['event_id'])
+    blogger.info("moved %s tickets of tickettype %s to event %s" \
+                 % (result.rowcount, tickettype_id, event_id))
+    return result.rowcount
+
+
+def reconcile_inventory(tickettype_id=None):
+    """Rebuilds the inventory counters of a tickettype, or of all tickettypes
+    if none is given, from the ticketorders. Returns the amount of tickettypes
+    that were reconciled."""
+    tickettypes = Session.query(TicketType)
+    if tickettype_id is not None:
+        tickettypes = tickettypes.filter(TicketType.id==int(tickettype_id))
+    total = 0
+    for tickettype in tickettypes:
+        held, purchased = inventory.rebuild(tickettype)
+        blogger.info("reconciled inventory of tickettype %s: %s held, %s purchased" \
+                     % (tickettype.id, held, purchased))
+        total += 1
+    return total
+
+
+def shard_inventory(tickettype_id, shards):
+    """Divides the inventory counters of a tickettype over an amount of shards 
+    to spread the load of reservations during an on-sale rush. One shard 
+    turns sharding off again."""
+    tickettype = lookup_tickettype_by_id(int(tickettype_id))
+    held, purchased = inventory.shard(tickettype, int(shards))
+    blogger.info("sharded inventory of tickettype %s over %s shards: %s held, %s purchased" \
+                 % (tickettype.id, shards, held, purchased))
+    return int(shards)
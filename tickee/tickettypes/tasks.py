@@ -1,14 +1,23 @@
+from celery import current_app
 from celery.task import task
 from tickee.db.models.tickettype import TicketTypeEventPartAssociation
+from tickee.tickettypes import availability
+from tickee.tickettypes.defaults import AVAILABILITY_FLUSH_WINDOW
 from tickee.tickettypes.manager import lookup_tickettype_by_id
+from tickee.tickettypes.models import AvailabilityRequest
 import logging
 import sqlahelper
 import tickee.exceptions as ex
+import time
 import transaction
 
 Session = sqlahelper.get_session()
 
 blogger = logging.getLogger('blm.tickettypes')
+tlogger = logging.getLogger('technical')
+
+# time at which this process last scheduled a flush of availability requests
+_last_scheduled = [0]
 
 # Asynchronous Tasks
 
@@ -24,11 +33,37 @@ def update_availability(tickettype_id):
         tickettype.update_availability()
         transaction.commit()
 
-# Synchronous Tasks
-
-
+@task(ignore_result=True)
+def flush_availability():
+    """Recomputes the availability of all tickettypes with pending requests."""
+    try:
+        availability.flush()
+        transaction.commit()
+    except Exception:
+        transaction.abort()
+        tlogger.exception("failed flushing availability requests")
 
+# Synchronous Tasks
 
-    
+def request_availability_update(tickettype_id):
+    """
+    Requests the availability of the tickettype to be recomputed. Requests
+    are collapsed by ``flush_availability``, which is scheduled once the
+    current transaction commits and at most once per
+    ``AVAILABILITY_FLUSH_WINDOW`` seconds. Tasks that are executed eagerly
+    recompute the availability immediately, inside the current transaction.
+    """
+    Session.add(AvailabilityRequest(tickettype_id))
+    if current_app.conf.CELERY_ALWAYS_EAGER:
+        availability.flush()
+        return
+    current = transaction.get()
+    if _schedule_flush not in [hook for hook, args, kws in current.getAfterCommitHooks()]:
+        current.addAfterCommitHook(_schedule_flush)
 
-    
\ No newline at end of file
+def _schedule_flush(committed):
+    """ Schedules a flush of the requests of a committed transaction. """
+    now = time.time()
+    if committed and now - _last_scheduled[0] >= AVAILABILITY_FLUSH_WINDOW:
+        _last_scheduled[0] = now
+        flush_availability.apply_async(countdown=AVAILABILITY_FLUSH_WINDOW)
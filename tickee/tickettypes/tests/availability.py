@@ -0,0 +1,58 @@
+from tickee.accounts.processing import create_account
+from tickee.core.currency.processing import create_currency
+from tickee.db.models.tickettype import next_availability
+from tickee.events.eventparts.processing import add_eventpart
+from tickee.events.processing import start_event
+from tickee.orders.processing import start_order, add_tickets
+from tickee.subscriptions.models import Subscription, FREE
+from tickee.tests import BaseTestCase
+from tickee.tickettypes import availability
+from tickee.tickettypes.models import AvailabilityRequest
+from tickee.tickettypes.processing import create_tickettype, link_tickettype_to_event
+from tickee.tickettypes.states import AVAILABLE, CLAIMED, SOLD
+from tickee.users.processing import create_user
+import sqlahelper
+
+Session = sqlahelper.get_session()
+
+
+class AvailabilityTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(AvailabilityTestCase, self).setUp()
+        create_currency("EUR", "Euro")
+        self.account = create_account("accountname", "email")
+        self.account.subscription = Subscription(FREE)
+        self.event = start_event(self.account.id, "event name")
+        add_eventpart(self.event.id)
+        self.tickettype = create_tickettype(50, 10)
+        self.tickettype.is_active = True
+        link_tickettype_to_event(self.tickettype, self.event)
+        availability.flush()
+
+    # -- next_availability
+
+    def test_claimed_when_all_units_held(self):
+        self.assertEqual(next_availability(AVAILABLE, 10, 10, 0), CLAIMED)
+        self.assertEqual(next_availability(AVAILABLE, 10, 5, 0), AVAILABLE)
+
+    def test_sold_when_all_units_purchased(self):
+        self.assertEqual(next_availability(CLAIMED, 10, 0, 10), SOLD)
+        self.assertEqual(next_availability(SOLD, 10, 0, 9), AVAILABLE)
+
+    # -- flush
+
+    def test_flush_collapses_requests(self):
+        for i in range(5):
+            Session.add(AvailabilityRequest(self.tickettype.id))
+        self.assertEqual(availability.flush(), (5, 1))
+        self.assertEqual(availability.flush(), (0, 0))
+
+    def test_flush_updates_availability(self):
+        order = start_order(create_user("user@example.com"), self.account)
+        add_tickets(order, self.tickettype.id, 10)
+        availability.flush()
+        self.assertEqual(self.tickettype.availability, CLAIMED)
+        add_tickets(order, self.tickettype.id, 5)
+        availability.flush()
+        self.assertEqual(self.tickettype.availability, AVAILABLE)
@@ -0,0 +1,99 @@
+from tickee.accounts.processing import create_account
+from tickee.core.currency.processing import create_currency
+from tickee.events.eventparts.processing import add_eventpart
+from tickee.events.processing import start_event
+from tickee.orders.processing import start_order, add_tickets, delete_order
+from tickee.subscriptions.models import Subscription, FREE
+from tickee.tests import BaseTestCase
+from tickee.tickettypes import inventory
+from tickee.tickettypes.processing import create_tickettype, link_tickettype_to_event, \
+    reconcile_inventory
+from tickee.users.processing import create_user
+import tickee.exceptions as ex
+
+
+class InventoryTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(InventoryTestCase, self).setUp()
+        create_currency("EUR", "Euro")
+        self.user = create_user("user@example.com")
+        self.account = create_account("accountname", "email")
+        self.account.subscription = Subscription(FREE)
+        self.event = start_event(self.account.id, "event name")
+        add_eventpart(self.event.id)
+        self.tickettype = create_tickettype(50, 10)
+        self.tickettype.is_active = True
+        link_tickettype_to_event(self.tickettype, self.event)
+
+    # -- counters
+
+    def test_new_tickettype_is_empty(self):
+        self.assertEqual(inventory.get_counts(self.tickettype), (0, 0))
+        self.assertEqual(self.tickettype.amount_available_tickets(), 10)
+
+    def test_add_tickets_holds_units(self):
+        order = start_order(self.user, self.account)
+        add_tickets(order, self.tickettype.id, 4)
+        self.assertEqual(inventory.get_counts(self.tickettype), (4, 0))
+        add_tickets(order, self.tickettype.id, 2)
+        self.assertEqual(inventory.get_counts(self.tickettype), (2, 0))
+        add_tickets(order, self.tickettype.id, 0)
+        self.assertEqual(inventory.get_counts(self.tickettype), (0, 0))
+
+    def test_purchase_moves_units(self):
+        order = start_order(self.user, self.account)
+        add_tickets(order, self.tickettype.id, 4)
+        order.checkout()
+        order.purchase()
+        self.assertEqual(inventory.get_counts(self.tickettype), (0, 4))
+        self.assertEqual(self.tickettype.amount_purchased_tickets(), 4)
+
+    def test_timeout_releases_units(self):
+        order = start_order(self.user, self.account)
+        add_tickets(order, self.tickettype.id, 4)
+        order.timeout()
+        self.assertEqual(inventory.get_counts(self.tickettype), (0, 0))
+
+    def test_delete_order_releases_units(self):
+        order = start_order(self.user, self.account)
+        add_tickets(order, self.tickettype.id, 4)
+        delete_order(order)
+        self.assertEqual(inventory.get_counts(self.tickettype), (0, 0))
+
+    def test_reserve_never_exceeds_units(self):
+        self.assertTrue(inventory.reserve(self.tickettype, 10))
+        self.assertFalse(inventory.reserve(self.tickettype, 1))
+        self.assertEqual(inventory.get_counts(self.tickettype), (10, 0))
+
+    def test_sold_out_tickettype_refuses_orders(self):
+        order = start_order(self.user, self.account)
+        add_tickets(order, self.tickettype.id, 10)
+        other_order = start_order(create_user("other@example.com"), self.account)
+        self.assertRaises(ex.AmountNotAvailableError, add_tickets, other_order, self.tickettype.id, 1)
+
+    # -- reconciliation
+
+    def test_reconcile_inventory(self):
+        order = start_order(self.user, self.account)
+        add_tickets(order, self.tickettype.id, 4)
+        inventory.remove(self.tickettype)
+        reconcile_inventory(self.tickettype.id)
+        self.assertEqual(inventory.get_counts(self.tickettype), (4, 0))
+
+    # -- shards
+
+    def test_sharded_tickettype_never_oversells(self):
+        inventory.shard(self.tickettype, 4)
+        for i in range(10):
+            self.assertTrue(inventory.reserve(self.tickettype, 1))
+        self.assertFalse(inventory.reserve(self.tickettype, 1))
+        self.assertEqual(inventory.get_counts(self.tickettype), (10, 0))
+
+    def test_shard_keeps_counts(self):
+        order = start_order(self.user, self.account)
+        add_tickets(order, self.tickettype.id, 4)
+        inventory.shard(self.tickettype, 3)
+        self.assertEqual(inventory.get_counts(self.tickettype), (4, 0))
+        order.timeout()
+        self.assertEqual(inventory.get_counts(self.tickettype), (0, 0))
@@ -1,38 +1,36 @@
 from celery.task import task
-from jinja2.environment import Environment
-from jinja2.loaders import PackageLoader
-from tickee.core.mail import send_email
+from tickee.core.mail.outbox import queue_email
+from tickee.core.mail.templates import render
 from tickee.db.models.user import User
 from tickee.users.manager import lookup_user_by_id
 import datetime
 import logging
 import sqlahelper
+import transaction
 
 Session = sqlahelper.get_session()
 
-env = Environment(loader=PackageLoader('tickee', 'templates'))
-
 blogger = logging.getLogger("blm.user")
 
 @task
 def mail_user(user_id, subject, html_content, plain_content="", fake=False):
-    """ Sends the user a templated mail with a specific content. """
+    """ Queues a templated mail with a specific content to the user, it is 
+    sent by the outbox once the transaction is committed. """
     try:
         user = lookup_user_by_id(user_id)
-        html_template = env.get_template('base.html').render(user=user,
-                                                             content=html_content)
-        plain_template = env.get_template('base.txt').render(user=user,
-                                                             plain_content=plain_content)
+        html_template = render('base.html', user=user, content=html_content)
+        plain_template = render('base.txt', user=user, plain_content=plain_content)
         
         if user.email is None:
             raise Exception('user has no email address')
         
-        blogger.info('sending mail to user %s (%s)' % (user.id, user.email))
+        blogger.info('queueing mail to user %s (%s)' % (user.id, user.email))
         
         sender = "Tickee <noreply@tick.ee>"
         
         if not fake:
-            send_email(sender, user.email, subject, html_template, plain_template, noreply=True)
+            queue_email(sender, user.email, subject, html_template, plain_template,
+                        object_name="user", object_id=user.id)
             
     except:
         blogger.exception('failed sending user mail to user %s' % user_id)
@@ -60,10 +58,8 @@ def send_recovery_mail(user_id, fake=False):
         return
     
     # Create template
-    html_content = env.get_template('recovery_mail.html').render(user=user,
-                                                                 date=datetime.datetime.utcnow())
-    plain_content = env.get_template('recovery_mail.txt').render(user=user,
-                                                                 date=datetime.datetime.utcnow())
+    html_content = render('recovery_mail.html', user=user, date=datetime.datetime.utcnow())
+    plain_content = render('recovery_mail.txt', user=user, date=datetime.datetime.utcnow())
     
     mail_user(user_id, "Recover your tickee password", html_content, plain_content, fake)
 
@@ -90,9 +86,8 @@ def send_activation_mail(user_id, fake=False):
         return
     
     # Create template
-    html_content = env.get_template('activation_mail.html').render(user=user,
-                                                                   date=datetime.datetime.utcnow())
-    plain_content = env.get_template('activation_mail.txt').render(user=user,
-                                                                   date=datetime.datetime.utcnow())
+    html_content = render('activation_mail.html', user=user, date=datetime.datetime.utcnow())
+    plain_content = render('activation_mail.txt', user=user, date=datetime.datetime.utcnow())
     
-    mail_user(user_id, "Activate your tickee account", html_content, plain_content, fake)
\ No newline at end of file
+    mail_user(user_id, "Activate your tickee account", html_content, plain_content, fake)
+    transaction.commit()
\ No newline at end of file
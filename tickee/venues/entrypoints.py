@@ -1,10 +1,12 @@
 from celery.task import task
 from tickee.accounts.manager import lookup_account_by_name
 from tickee.core import marshalling, entrypoint
+from tickee.core.pagination import list_or_page
 from tickee.core.security.oauth2.manager import lookup_account_for_client
 from tickee.events.manager import lookup_event_by_id
 from tickee.venues.manager import lookup_venue_by_id, lookup_venues_by_name, \
-    list_venues, list_venues_of_event
+    query_venues, list_venues_of_event
+from tickee.venues.models import Venue
 from tickee.venues.marshalling import venue_to_dict
 from tickee.venues.processing import create_address, create_venue, delete_venue
 import tickee.exceptions as ex
@@ -12,13 +14,14 @@ import tickee.exceptions as ex
 
 @task(name="venues.from_account")
 @entrypoint()
-def from_account(client_id, account_name=None):
-    """ Returns a list of venues connected to the account"""
+def from_account(client_id, account_name=None, cursor=None, limit=None):
+    """ Returns a list of venues connected to the account. If a cursor or a
+    limit is given, returns a page of them as dict(venues=[...], next=<cursor or None>). """
     if client_id is not None:
         account = lookup_account_for_client(client_id)
     elif account_name is not None:
         account = lookup_account_by_name(account_name)
-    return map(venue_to_dict, list_venues(account))
+    return list_or_page(query_venues(account), (Venue.id,), venue_to_dict, 'venues', cursor, limit)
 
 
 @task(name="venues.from_event")
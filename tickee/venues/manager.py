@@ -26,8 +26,11 @@ def lookup_venues_by_name(name_filter=None, limit=10):
 
 def list_venues(account):
     """ Returns a list of venues of the account """
-    venues = Session.query(Venue).filter(Venue.creator==account).all()
-    return venues
+    return query_venues(account).all()
+
+def query_venues(account):
+    """ Returns the query of the venues of the account """
+    return Session.query(Venue).filter(Venue.creator==account)
 
 def list_venues_of_event(event):
     """ Returns a list of all venues connected to an event """